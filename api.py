@@ -0,0 +1,409 @@
+"""JSON API for the mobile client, mounted at /api/v1.
+
+Covers what the HTML pages do (listing, searching and reading destinations
+and their reviews, posting a review, listing and building itineraries) but
+shaped so an app launch needs only a few requests:
+
+* `?fields=id,name,rating_avg` returns only those fields (sparse fieldsets),
+  and only the matching columns are loaded;
+* `GET /destinations?facets=1` adds region/category counts for the filters;
+* `GET /destinations?ids=3,8,21` fetches several destinations at once and
+  `GET /destinations/<id>?include=reviews` adds the first page of reviews;
+* `POST /itineraries/<id>/items` adds a list of stops in one transaction,
+  and `POST /itineraries` can create an itinerary with its stops;
+* `POST /itineraries/<id>/edit` applies a batch of add/remove/move/notes
+  operations (see itinerary_edits.py) if the itinerary is still at the
+  `version` sent, and answers 409 otherwise.
+
+Lists are keyset-paginated like the HTML pages: pass the response's `next`
+back as `?after=`. GETs honour If-None-Match. The API authenticates with
+the same session cookie as the site (`POST /api/v1/login`); errors are
+`{"error": {"status": ..., "message": ...}}`.
+
+Responses are serialised with orjson when it is installed.
+"""
+from datetime import date
+from decimal import Decimal
+from functools import wraps
+
+from flask import Blueprint, current_app, jsonify, request, url_for
+from flask.json.provider import DefaultJSONProvider
+from flask_login import current_user, login_user, logout_user
+from sqlalchemy.orm import joinedload, load_only, selectinload
+from werkzeug.exceptions import BadRequest, Forbidden, HTTPException, ServiceUnavailable, Unauthorized
+
+import auth
+import database
+import facets
+import images
+import itinerary_edits
+import loaders
+import pagination
+import ratelimit
+import search
+import versioning
+from models import db, Category, Destination, DestinationImage, Itinerary, ItineraryItem, Region, Review
+
+try:
+    import orjson
+except ImportError:  # optional: fall back to the standard library encoder
+    orjson = None
+
+bp = Blueprint("api", __name__, url_prefix="/api/v1")
+
+
+class JSONProvider(DefaultJSONProvider):
+    """Compact JSON for every response, through orjson when available."""
+
+    sort_keys = False
+    compact = True
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=orjson.OPT_NON_STR_KEYS).decode()
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+
+@bp.errorhandler(HTTPException)
+def _error(exc):
+    error = {"status": exc.code, "message": exc.description}
+    if getattr(exc, "errors", None):
+        error["errors"] = exc.errors
+    if isinstance(exc, itinerary_edits.VersionConflict):
+        error["version"] = exc.version
+    response = jsonify(error=error)
+    response.status_code = exc.code
+    retry_after = getattr(exc, "retry_after", None) or (2 if exc.code == 503 else None)
+    if retry_after:
+        response.headers["Retry-After"] = str(retry_after)
+    return response
+
+
+def api_login_required(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not current_user.is_authenticated:
+            raise Unauthorized("Log in first: POST /api/v1/login.")
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def _json_body(types=dict):
+    body = request.get_json(silent=True)
+    if not isinstance(body, types):
+        raise BadRequest("Expected a JSON object as the request body.")
+    return body
+
+
+# -- fields ----------------------------------------------------------------------
+
+DESTINATION_COLUMNS = ("id", "name", "region", "category", "description", "latitude", "longitude",
+                       "image_url", "highlights", "rating_avg", "rating_count")
+DESTINATION_FIELDS = DESTINATION_COLUMNS + ("url", "rating_histogram", "images")
+DESTINATION_LIST_DEFAULT = ("id", "name", "region", "category", "image_url",
+                            "rating_avg", "rating_count")
+STARS = ("stars_1", "stars_2", "stars_3", "stars_4", "stars_5")
+
+ITINERARY_FIELDS = ("id", "title", "start_date", "end_date", "version", "items")
+
+
+def requested_fields(allowed, default=None):
+    """Fields named in `?fields=`, in the order given; `id` is always included."""
+    raw = request.args.get("fields")
+    if not raw:
+        return list(default or allowed)
+    fields = ["id"] + [f for f in dict.fromkeys(f.strip() for f in raw.split(",")) if f and f != "id"]
+    unknown = [f for f in fields if f not in allowed]
+    if unknown:
+        raise BadRequest(f"Unknown field(s): {', '.join(unknown)}. Choose from: {', '.join(allowed)}.")
+    return fields
+
+
+def _destination_options(fields, keys=()):
+    columns = {f for f in fields if f in DESTINATION_COLUMNS} | {k.attr for k in keys}
+    if "rating_histogram" in fields:
+        columns.update(STARS)
+    options = [load_only(*(getattr(Destination, c) for c in columns | {"id"}))]
+    if "images" in fields:
+        options.append(selectinload(Destination.images).selectinload(DestinationImage.variants))
+    return options
+
+
+def _value(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+def _image(img):
+    return {
+        "id": img.id,
+        "url": url_for("static", filename=f"img/{img.filename}"),
+        "is_primary": bool(img.is_primary),
+        "variants": [
+            {"url": url_for("static", filename=f"img/{images.VARIANT_DIR}/{v.filename}"),
+             "width": v.width, "height": v.height, "format": v.format}
+            for v in img.variants
+        ],
+    }
+
+
+def destination_json(d, fields):
+    out = {}
+    for field in fields:
+        if field == "url":
+            out["url"] = url_for("destination_detail", dest_id=d.id)
+        elif field == "rating_histogram":
+            out["rating_histogram"] = d.rating_histogram
+        elif field == "images":
+            out["images"] = [_image(img) for img in d.images]
+        else:
+            out[field] = _value(getattr(d, field))
+    return out
+
+
+def review_json(r):
+    return {
+        "id": r.id,
+        "rating": r.rating,
+        "comment": r.comment,
+        "created_at": _value(r.created_at),
+        "user": {"id": r.user.id, "name": r.user.name},
+    }
+
+
+def item_json(item):
+    return {
+        "id": item.id,
+        "day_number": item.day_number,
+        "destination_id": item.destination_id,
+        "destination_name": item.destination.name,
+        "notes": item.notes,
+    }
+
+
+def itinerary_json(it, fields):
+    out = {}
+    for field in fields:
+        if field == "items":
+            items = sorted(it.items, key=lambda i: (i.day_number, i.id))
+            out["items"] = [item_json(i) for i in items]
+        else:
+            out[field] = _value(getattr(it, field))
+    return out
+
+
+def _page(rows, serialise, page):
+    return {"data": [serialise(row) for row in rows], "next": page.next_cursor if page else None}
+
+
+# -- auth ------------------------------------------------------------------------
+
+def _user_json(user):
+    return {"id": user.id, "name": user.name, "email": user.email, "is_admin": user.is_admin}
+
+
+@bp.route("/login", methods=["POST"])
+@ratelimit.limit("login")
+def login():
+    body = _json_body()
+    email = str(body.get("email") or "").strip().lower()
+    try:
+        user = auth.authenticate(email, body.get("password"))
+    except auth.HashingBusy:
+        raise ServiceUnavailable("Too many sign-ins right now; retry shortly.")
+    if user is None:
+        raise Unauthorized("Invalid email or password.")
+    identity = auth.session_user(user)
+    login_user(identity)
+    return jsonify(data=_user_json(identity))
+
+
+@bp.route("/logout", methods=["POST"])
+def logout():
+    logout_user()
+    return "", 204
+
+
+@bp.route("/me")
+@api_login_required
+def me():
+    return jsonify(data=_user_json(current_user))
+
+
+# -- destinations --------------------------------------------------------------
+
+@bp.route("/destinations")
+@database.read_replica
+@versioning.conditional(versioning.destination_list_stamp)
+def destinations():
+    fields = requested_fields(DESTINATION_FIELDS, DESTINATION_LIST_DEFAULT)
+    serialise = lambda d: destination_json(d, fields)  # noqa: E731
+    after, limit, _ = pagination.page_args()
+
+    ids = request.args.get("ids")
+    if ids:
+        try:
+            wanted = [int(i) for i in ids.split(",") if i.strip()][:current_app.config["MAX_PAGE_SIZE"]]
+        except ValueError:
+            raise BadRequest("ids must be a comma-separated list of integers.")
+        found = {d.id: d for d in Destination.query.options(*_destination_options(fields))
+                 .filter(Destination.id.in_(wanted))}
+        return jsonify(data=[serialise(found[i]) for i in wanted if i in found], next=None)
+
+    region_ids = facets.selected_ids(Region, request.args.get("region"))
+    category_ids = facets.selected_ids(Category, request.args.get("category"))
+    query = facets.filter_query(Destination.query, region_ids, category_ids)
+    q = request.args.get("q", "")
+    if q:
+        # Ranked, so a single page of the best matches, as on the HTML page.
+        results = search.search(query.options(*_destination_options(fields)), q).limit(limit).all()
+        body = _page(results, serialise, None)
+    else:
+        if request.args.get("sort") == "rating":
+            order = loaders.BY_RATING
+        elif region_ids is not None and len(region_ids) == 1:
+            order = loaders.BY_NAME
+        else:
+            order = loaders.BY_REGION
+        page = pagination.KeysetPage(query.options(*_destination_options(fields, order)), order, after, limit)
+        body = _page(page, serialise, page)
+    if request.args.get("facets") == "1":
+        counts = facets.counts(region_ids, category_ids, q)
+        body["facets"] = {name: [v._asdict() for v in values]
+                          for name, values in counts._asdict().items()}
+    return jsonify(body)
+
+
+@bp.route("/destinations/<int:dest_id>")
+@database.read_replica
+@versioning.conditional(versioning.destination_stamp)
+def destination(dest_id):
+    fields = requested_fields(DESTINATION_FIELDS)
+    d = (Destination.query.options(*_destination_options(fields))
+         .filter_by(id=dest_id).first_or_404())
+    body = {"data": destination_json(d, fields)}
+    if "reviews" in request.args.get("include", "").split(","):
+        _, limit, _ = pagination.page_args()
+        reviews = loaders.destination_reviews(dest_id, None, limit)
+        body["reviews"] = _page(reviews, review_json, reviews)
+    return jsonify(body)
+
+
+@bp.route("/destinations/<int:dest_id>/reviews")
+@database.read_replica
+@versioning.conditional(versioning.destination_stamp)
+def destination_reviews(dest_id):
+    db.get_or_404(Destination, dest_id)
+    after, limit, _ = pagination.page_args()
+    reviews = loaders.destination_reviews(dest_id, after, limit)
+    return jsonify(_page(reviews, review_json, reviews))
+
+
+@bp.route("/destinations/<int:dest_id>/reviews", methods=["POST"])
+@api_login_required
+@ratelimit.limit("review")
+def add_review(dest_id):
+    db.get_or_404(Destination, dest_id)
+    body = _json_body()
+    try:
+        rating = int(body.get("rating"))
+    except (TypeError, ValueError):
+        rating = None
+    if rating not in range(1, 6):
+        raise BadRequest("rating must be an integer from 1 to 5.")
+    review = Review(user_id=current_user.id, destination_id=dest_id, rating=rating,
+                    comment=str(body.get("comment") or "").strip())
+    db.session.add(review)
+    db.session.commit()
+    review = db.session.get(Review, review.id, options=[joinedload(Review.user)])
+    return jsonify(data=review_json(review)), 201
+
+
+# -- itineraries ---------------------------------------------------------------
+
+def _owned_itinerary(it_id):
+    itinerary = db.get_or_404(Itinerary, it_id)
+    if itinerary.user_id != current_user.id:
+        raise Forbidden("That itinerary belongs to someone else.")
+    return itinerary
+
+
+def _parse_date(value, name):
+    if value in (None, ""):
+        return None
+    try:
+        return date.fromisoformat(str(value))
+    except ValueError:
+        raise BadRequest(f"{name} must be an ISO date (YYYY-MM-DD).")
+
+
+def _load_items(ids):
+    return (ItineraryItem.query.options(joinedload(ItineraryItem.destination).load_only(Destination.name))
+            .filter(ItineraryItem.id.in_(ids)).order_by(ItineraryItem.day_number, ItineraryItem.id).all())
+
+
+@bp.route("/itineraries")
+@api_login_required
+@versioning.conditional(versioning.user_itineraries_stamp)
+def itineraries():
+    fields = requested_fields(ITINERARY_FIELDS)
+    query = Itinerary.query.filter_by(user_id=current_user.id).order_by(Itinerary.id)
+    if "items" in fields:
+        query = query.options(selectinload(Itinerary.items).joinedload(ItineraryItem.destination)
+                              .load_only(Destination.name))
+    return jsonify(data=[itinerary_json(it, fields) for it in query])
+
+
+@bp.route("/itineraries", methods=["POST"])
+@api_login_required
+def create_itinerary():
+    body = _json_body()
+    title = str(body.get("title") or "").strip()
+    if not title:
+        raise BadRequest("title is required.")
+    items = itinerary_edits.parse_items(body["items"]) if body.get("items") else []
+    itinerary = Itinerary(user_id=current_user.id, title=title,
+                          start_date=_parse_date(body.get("start_date"), "start_date"),
+                          end_date=_parse_date(body.get("end_date"), "end_date"))
+    itinerary.items = [ItineraryItem(**item) for item in items]
+    db.session.add(itinerary)
+    db.session.commit()
+    itinerary = loaders.user_itinerary(itinerary.id)
+    return jsonify(data=itinerary_json(itinerary, ITINERARY_FIELDS)), 201
+
+
+@bp.route("/itineraries/<int:it_id>/items", methods=["POST"])
+@api_login_required
+def add_items(it_id):
+    itinerary = _owned_itinerary(it_id)
+    body = _json_body((dict, list))
+    items = itinerary_edits.parse_items(body.get("items") if isinstance(body, dict) else body)
+    new = [ItineraryItem(itinerary_id=itinerary.id, **item) for item in items]
+    db.session.add_all(new)
+    db.session.commit()
+    return jsonify(data=[item_json(i) for i in _load_items([i.id for i in new])]), 201
+
+
+@bp.route("/itineraries/<int:it_id>/edit", methods=["POST"])
+@api_login_required
+def edit_itinerary(it_id):
+    itinerary = _owned_itinerary(it_id)
+    body = _json_body()
+    version = itinerary_edits.parse_version(body.get("version"))
+    ops = itinerary_edits.parse_ops(body.get("ops"), itinerary)
+    itinerary_edits.apply(itinerary, ops, version)
+    itinerary = loaders.user_itinerary(it_id)
+    return jsonify(data=itinerary_json(itinerary, ITINERARY_FIELDS))
+
+
+def init_app(app):
+    app.json = JSONProvider(app)
+    app.register_blueprint(bp)
@@ -1,76 +1,288 @@
-from flask import Flask, render_template, redirect, url_for, request, flash
+from flask import Flask, render_template, stream_template, redirect, url_for, request, flash, jsonify, make_response
 from flask_login import LoginManager, login_user, login_required, logout_user, current_user
-from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
+import math
 import os
+import click
 from config import Config
-from models import db, User, Destination, Itinerary, ItineraryItem, Review
+from models import db, User, Destination, Itinerary, ItineraryItem, Review, Region, Category
+import search
+import loaders
+import ratings
+import instrumentation
+import pagination
+import cache
+import versioning
+import images
+import jobs
+import assets
+import geo
+import routing
+import bulk
+import database
+import migrations
+import auth
+import facets
+import itinerary_edits
+import recommend
+import ratelimit
+import preflight
+import api
 from flask import abort, flash
+from werkzeug.exceptions import BadRequest
 
 app = Flask(__name__)
 app.config.from_object(Config)
 
-UPLOAD_FOLDER = os.path.join("static", "img")
+UPLOAD_FOLDER = os.path.join(app.root_path, "static", "img")
 ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "gif"}
 app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
 
 def allowed_file(filename):
     return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
 
-db.init_app(app)
+
+def render_listing(template, stream, **context):
+    """Render a listing page, streamed (rows fetched while sending) if asked to."""
+    if stream:
+        return stream_template(template, **context)
+    return render_template(template, **context)
+
+
+app.jinja_env.globals["next_page_url"] = pagination.next_page_url
+app.jinja_env.globals["srcset"] = images.srcset
+database.init_app(app, db)
+instrumentation.init_app(app)
+cache.init_app(app)
+assets.init_app(app)
+preflight.init_app(app)
 
 login_manager = LoginManager(app)
 login_manager.login_view = "login"
-
-@login_manager.user_loader
-def load_user(user_id):
-    return User.query.get(int(user_id))
+auth.init_app(app, login_manager)
+api.init_app(app)
 
 
 @app.cli.command("init-db")
 def init_db_command():
-    """Initialize the database"""
+    """Create the database or apply pending migrations"""
+    with app.app_context():
+        ran = migrations.upgrade()
+    for migration in ran:
+        print(f"Applied {migration.version}: {migration.description}")
+    print("Database is up to date.")
+
+
+@app.cli.command("db-status")
+def db_status_command():
+    """List pending migrations and differences between models and database"""
+    with app.app_context():
+        todo = migrations.pending()
+        problems = migrations.drift()
+    for migration in todo:
+        print(f"Pending {migration.version}: {migration.description}")
+    for problem in problems:
+        print(f"Drift: {problem}")
+    if not todo and not problems:
+        print("Database matches the models.")
+
+
+@app.cli.command("process-images")
+@click.option("--workers", type=int, default=None, help="Worker processes (default: one per core).")
+def process_images_command(workers):
+    """Regenerate resized/WebP/AVIF variants for every destination image"""
+    with app.app_context():
+        done, missing = images.reprocess_all(app.config["UPLOAD_FOLDER"], workers)
+    print(f"Processed {done} images ({missing} missing on disk).")
+
+
+@app.cli.command("build-assets")
+def build_assets_command():
+    """Fingerprint and precompress static files, writing static/dist/manifest.json"""
+    manifest = assets.build(app.static_folder)
+    app.extensions["asset_manifest"] = manifest
+    print(f"Fingerprinted {len(manifest)} static files.")
+
+
+@app.cli.command("preflight")
+def preflight_command():
+    """Compile templates and warm caches before a worker takes traffic"""
+    with app.app_context():
+        todo = migrations.pending()
+    if todo:
+        raise SystemExit(f"{len(todo)} pending migration(s); run `flask init-db` first.")
+    failed = False
+    for name, detail, seconds in preflight.run(app):
+        print(f"{name:<28} {detail!s:<14} {seconds * 1000:>8.1f} ms")
+        failed = failed or (isinstance(detail, int) and detail >= 500)
+    if failed:
+        raise SystemExit(1)
+
+
+@app.cli.command("run-worker")
+@click.option("--processes", type=int, default=1, help="Number of worker processes.")
+@click.option("--once", is_flag=True, help="Run the jobs that are due now, then exit.")
+def run_worker_command(processes, once):
+    """Run background jobs (image processing, file cleanup, ...)"""
+    if once:
+        with app.app_context():
+            count = jobs.run_pending()
+        print(f"Ran {count} jobs.")
+        return
+    jobs.run_workers(processes, app.config["JOBS_POLL_INTERVAL"])
+
+
+@app.cli.command("rebuild-search-index")
+def rebuild_search_index_command():
+    """Rebuild the destination full-text search index"""
+    with app.app_context():
+        count = search.rebuild_index()
+    print(f"Indexed {count} destinations.")
+
+
+@app.cli.command("rebuild-geo-index")
+def rebuild_geo_index_command():
+    """Rebuild the destination spatial (R*Tree) index"""
+    with app.app_context():
+        count = geo.rebuild_index()
+    print(f"Indexed {count} destination coordinates.")
+
+
+@app.cli.command("rebuild-facets")
+def rebuild_facets_command():
+    """Rebuild region/category lookups and their destination counts"""
+    with app.app_context():
+        count = facets.rebuild()
+    print(f"Rebuilt {count} regions and categories.")
+
+
+@app.cli.command("recommend")
+@click.option("--full", is_flag=True, help="recompute every destination, not just changed ones")
+def recommend_command(full):
+    """Refresh the stored "travellers also visited" neighbours"""
+    with app.app_context():
+        changed, rows = recommend.refresh(full)
+    print(f"Stored {rows} neighbours; {changed} destinations changed.")
+
+
+@app.cli.command("reconcile-ratings")
+def reconcile_ratings_command():
+    """Recompute stored destination rating aggregates from reviews"""
+    with app.app_context():
+        fixed = ratings.reconcile()
+    print(f"Corrected rating aggregates for {fixed} destinations.")
+
+
+def _report_import(result, errors):
+    for line, message in errors[:20]:
+        click.echo(f"record {line}: {message}", err=True)
+    if len(errors) > 20:
+        click.echo(f"... and {len(errors) - 20} more invalid records", err=True)
+    print(f"Inserted {result.inserted}, updated {result.updated}, skipped {result.skipped}.")
+
+
+@app.cli.command("import-destinations")
+@click.argument("path")
+@click.option("--format", "fmt", type=click.Choice(["csv", "jsonl"]), help="Default: from the extension.")
+@click.option("--chunk-size", type=int, default=bulk.CHUNK_SIZE, show_default=True)
+def import_destinations_command(path, fmt, chunk_size):
+    """Upsert destinations and image filenames from CSV or JSON Lines (by name)"""
+    with app.app_context():
+        _report_import(*bulk.import_destinations(bulk.read_records(path, fmt), chunk_size))
+
+
+@app.cli.command("export-destinations")
+@click.argument("path", default="-")
+@click.option("--format", "fmt", type=click.Choice(["csv", "jsonl"]), default=None)
+def export_destinations_command(path, fmt):
+    """Write every destination to CSV or JSON Lines (stdout by default)"""
+    with app.app_context():
+        count = bulk.write_records(bulk.export_destinations(), path, bulk.DESTINATION_FIELDS,
+                                   fmt or ("jsonl" if path == "-" else None))
+    click.echo(f"Exported {count} destinations.", err=True)
+
+
+@app.cli.command("import-reviews")
+@click.argument("path")
+@click.option("--format", "fmt", type=click.Choice(["csv", "jsonl"]), help="Default: from the extension.")
+@click.option("--chunk-size", type=int, default=bulk.CHUNK_SIZE, show_default=True)
+def import_reviews_command(path, fmt, chunk_size):
+    """Upsert reviews from CSV or JSON Lines (by user email, destination name, created_at)"""
+    with app.app_context():
+        _report_import(*bulk.import_reviews(bulk.read_records(path, fmt), chunk_size))
+
+
+@app.cli.command("export-reviews")
+@click.argument("path", default="-")
+@click.option("--format", "fmt", type=click.Choice(["csv", "jsonl"]), default=None)
+def export_reviews_command(path, fmt):
+    """Write every review to CSV or JSON Lines (stdout by default)"""
     with app.app_context():
-        db.create_all()
-    print("Initialized the database.")
+        count = bulk.write_records(bulk.export_reviews(), path, bulk.REVIEW_FIELDS,
+                                   fmt or ("jsonl" if path == "-" else None))
+    click.echo(f"Exported {count} reviews.", err=True)
+
+
+@app.cli.command("seed-db")
+def seed_db_command():
+    """Load the sample destinations in seed/"""
+    path = os.path.join(app.root_path, "seed", "destinations.jsonl")
+    with app.app_context():
+        migrations.upgrade()
+        _report_import(*bulk.import_destinations(bulk.read_records(path)))
 
 
 @app.route("/")
+@database.read_replica
+@cache.cached_page
 def index():
     from models import Destination
-    featured = Destination.query.order_by(Destination.id).limit(6).all()
-    print("HOME featured count:", len(featured))
+    # Left as a query: the template only runs it when the fragment cache misses.
+    featured = Destination.query.order_by(Destination.id).limit(6)
     return render_template("index.html", destinations=featured)
 
 
 
 @app.route("/destinations")
+@database.read_replica
+@versioning.conditional(versioning.destination_list_stamp)
+@cache.cached_page
 def destinations():
     region = request.args.get("region", "")
     category = request.args.get("category", "")
     q = request.args.get("q", "")
+    sort = request.args.get("sort", "")
 
-    query = Destination.query
-    if region:
-        query = query.filter(Destination.region.ilike(f"%{region}%"))
-    if category:
-        query = query.filter(Destination.category.ilike(f"%{category}%"))
+    region_ids = facets.selected_ids(Region, region)
+    category_ids = facets.selected_ids(Category, category)
+    query = facets.filter_query(Destination.query, region_ids, category_ids)
+    after, limit, stream = pagination.page_args()
     if q:
-        like = f"%{q}%"
-        query = query.filter(
-            (Destination.name.ilike(like)) |
-            (Destination.description.ilike(like)) |
-            (Destination.region.ilike(like))
-        )
+        # Ranked results: only the best `limit` matches are shown.
+        page = None
+        results = search.search(query, q).limit(limit)
+        results = results.yield_per(100) if stream else results.all()
+    else:
+        if sort == "rating":
+            order = loaders.BY_RATING
+        elif region_ids is not None and len(region_ids) == 1:
+            order = loaders.BY_NAME
+        else:
+            order = loaders.BY_REGION
+        page = results = pagination.KeysetPage(query, order, after, limit, stream)
 
-    all_destinations = query.order_by(Destination.region, Destination.name).all()
-    return render_template("destinations.html", destinations=all_destinations, q=q)
+    return render_listing("destinations.html", stream, destinations=results, page=page, q=q,
+                          facets=facets.counts(region_ids, category_ids, q))
 
 
 
 @app.route("/destinations/<int:dest_id>", methods=["GET", "POST"])
+@ratelimit.limit("review")
+@database.read_replica
+@versioning.conditional(versioning.destination_stamp)
+@cache.cached_page
 def destination_detail(dest_id):
-    destination = Destination.query.get_or_404(dest_id)
+    destination = loaders.destination_detail(dest_id)
 
     if request.method == "POST":
         if not current_user.is_authenticated:
@@ -94,8 +306,55 @@ def destination_detail(dest_id):
             flash("Review submitted.", "success")
             return redirect(url_for("destination_detail", dest_id=dest_id))
 
-    reviews = Review.query.filter_by(destination_id=dest_id).order_by(Review.created_at.desc()).all()
-    return render_template("destination_detail.html", destination=destination, reviews=reviews)
+    after, limit, stream = pagination.page_args()
+    reviews = loaders.destination_reviews(dest_id, after, limit, stream)
+    similar = loaders.similar_destinations(dest_id, app.config["RECOMMEND_SHOWN"])
+    return render_listing("destination_detail.html", stream, destination=destination, reviews=reviews,
+                          similar=similar)
+
+def _nearby_response(lat, lon, exclude_id=None):
+    radius = request.args.get("km", 50, type=float)
+    if not (math.isfinite(radius) and radius > 0):
+        abort(400)
+    radius = min(radius, app.config["NEARBY_MAX_KM"])
+    limit = max(1, min(request.args.get("limit", 10, type=int), app.config["MAX_PAGE_SIZE"]))
+    results = geo.nearby(lat, lon, radius, limit=limit, exclude_id=exclude_id)
+    return jsonify(
+        origin={"latitude": lat, "longitude": lon},
+        radius_km=radius,
+        destinations=[
+            {
+                "id": d.id,
+                "name": d.name,
+                "region": d.region,
+                "latitude": float(d.latitude),
+                "longitude": float(d.longitude),
+                "distance_km": round(km, 3),
+                "url": url_for("destination_detail", dest_id=d.id),
+            }
+            for d, km in results
+        ],
+    )
+
+
+@app.route("/destinations/<int:dest_id>/nearby")
+@database.read_replica
+def destination_nearby(dest_id):
+    destination = db.get_or_404(Destination, dest_id)
+    if destination.latitude is None or destination.longitude is None:
+        abort(404)
+    return _nearby_response(float(destination.latitude), float(destination.longitude), dest_id)
+
+
+@app.route("/nearby")
+@database.read_replica
+def nearby():
+    lat = request.args.get("lat", type=float)
+    lon = request.args.get("lon", type=float)
+    if lat is None or lon is None or not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        abort(400)
+    return _nearby_response(lat, lon)
+
 
 @app.route("/reviews/<int:review_id>/delete", methods=["POST"])
 @login_required
@@ -113,6 +372,7 @@ def delete_review(review_id):
     return redirect(url_for("destination_detail", dest_id=dest_id))
 
 @app.route("/register", methods=["GET", "POST"])
+@ratelimit.limit("register")
 def register():
     if current_user.is_authenticated:
         return redirect(url_for("index"))
@@ -135,10 +395,14 @@ def register():
             flash("Email already registered.", "warning")
             return redirect(url_for("register"))
 
+        try:
+            password_hash = auth.hash_password(password)
+        except auth.HashingBusy:
+            return _hashing_busy("register.html")
         user = User(
             name=name,
             email=email,
-            password_hash=generate_password_hash(password)
+            password_hash=password_hash
         )
         db.session.add(user)
         db.session.commit()
@@ -149,6 +413,7 @@ def register():
 
 
 @app.route("/login", methods=["GET", "POST"])
+@ratelimit.limit("login")
 def login():
     if current_user.is_authenticated:
         return redirect(url_for("index"))
@@ -157,9 +422,12 @@ def login():
         email = request.form.get("email", "").strip().lower()
         password = request.form.get("password")
 
-        user = User.query.filter_by(email=email).first()
-        if user and check_password_hash(user.password_hash, password):
-            login_user(user)
+        try:
+            user = auth.authenticate(email, password)
+        except auth.HashingBusy:
+            return _hashing_busy("login.html")
+        if user:
+            login_user(auth.session_user(user))
             flash("Logged in successfully.", "success")
             next_page = request.args.get("next")
             return redirect(next_page or url_for("index"))
@@ -169,6 +437,13 @@ def login():
     return render_template("login.html")
 
 
+def _hashing_busy(template):
+    flash("We're handling a lot of sign-ins right now. Please try again in a moment.", "warning")
+    response = make_response(render_template(template), 503)
+    response.headers["Retry-After"] = "2"
+    return response
+
+
 @app.route("/logout")
 @login_required
 def logout():
@@ -179,6 +454,7 @@ def logout():
 
 @app.route("/itineraries", methods=["GET", "POST"])
 @login_required
+@versioning.conditional(versioning.user_itineraries_stamp)
 def itineraries():
     if request.method == "POST":
         title = request.form.get("title", "").strip()
@@ -200,8 +476,8 @@ def itineraries():
         flash("Itinerary created.", "success")
         return redirect(url_for("itineraries"))
 
-    user_itineraries = Itinerary.query.filter_by(user_id=current_user.id).all()
-    all_destinations = Destination.query.order_by(Destination.name).all()
+    user_itineraries = loaders.user_itineraries(current_user.id)
+    all_destinations = loaders.destination_choices()
     return render_template("itinerary.html", itineraries=user_itineraries, destinations=all_destinations)
 
 
@@ -243,36 +519,122 @@ def delete_itinerary_item(it_id, item_id):
     flash("Day removed.", "info")
     return redirect(url_for("itineraries"))
 
+@app.route("/itineraries/<int:it_id>/edit", methods=["POST"])
+@login_required
+def edit_itinerary(it_id):
+    """Apply a JSON batch of edits (see itinerary_edits.py); responds with the day list.
+
+    A stale `version` gets a 409 with the current day list; invalid edits a
+    JSON 400 and nothing is changed.
+    """
+    itinerary = db.get_or_404(Itinerary, it_id)
+    if itinerary.user_id != current_user.id:
+        abort(403)
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        body = {}
+    status = 200
+    try:
+        version = itinerary_edits.parse_version(body.get("version"))
+        ops = itinerary_edits.parse_ops(body.get("ops"), itinerary)
+        itinerary_edits.apply(itinerary, ops, version)
+    except itinerary_edits.VersionConflict:
+        status = 409
+    except BadRequest as exc:
+        return jsonify(error={"message": exc.description, "errors": getattr(exc, "errors", [])}), 400
+    return render_template("_itinerary_days.html", it=loaders.user_itinerary(it_id)), status
+
+
+@app.route("/itineraries/<int:it_id>/optimize", methods=["GET", "POST"])
+@login_required
+def optimize_itinerary(it_id):
+    itinerary = loaders.user_itinerary(it_id)
+    if itinerary.user_id != current_user.id:
+        if request.method == "GET":
+            abort(403)
+        flash("Not authorized.", "danger")
+        return redirect(url_for("itineraries"))
+
+    proposal = routing.propose(itinerary, app.config["ROUTE_TIME_BUDGET"])
+    if request.method == "GET":
+        return jsonify(
+            itinerary_id=itinerary.id,
+            km_before=round(proposal.km_before, 1),
+            km_after=round(proposal.km_after, 1),
+            items=[
+                {"item_id": item.id, "destination": item.destination.name,
+                 "day_number": item.day_number, "proposed_day_number": day}
+                for item, day in proposal.assignments
+            ],
+        )
+
+    for item, day in proposal.assignments:
+        item.day_number = day
+    db.session.commit()
+    flash(f"Route optimized: {proposal.km_before:.0f} km → {proposal.km_after:.0f} km.", "success")
+    return redirect(url_for("itineraries"))
+
+
 @app.route("/admin/destinations")
 @login_required
 def admin_destinations():
     admin_required()
     # VERY SIMPLE "admin": all logged-in users see this
-    all_destinations = Destination.query.order_by(Destination.id).all()
-    return render_template("admin_destinations.html", destinations=all_destinations)
+    after, limit, stream = pagination.page_args()
+    page = loaders.admin_destinations(after, limit, stream)
+    return render_listing("admin_destinations.html", stream, destinations=page)
+
+
+@app.route("/admin/cache")
+@login_required
+def admin_cache_stats():
+    admin_required()
+    backend = cache.get_cache()
+    return jsonify(backend=type(backend).__name__, **backend.stats())
+
+
+@app.route("/metrics")
+def metrics():
+    token = app.config["METRICS_TOKEN"]
+    if token and request.headers.get("Authorization") != f"Bearer {token}":
+        abort(401)
+    extra = [(f"yatra_page_cache_{name}_total", f"Page cache {name} in this process.", "counter", value)
+             for name, value in cache.get_cache().stats().items()]
+    body = instrumentation.get_metrics().render(extra)
+    return body, 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+
+
+@app.route("/admin/jobs/<int:job_id>")
+@login_required
+def admin_job_status(job_id):
+    admin_required()
+    from models import Job
+    return jsonify(jobs.status(db.get_or_404(Job, job_id)))
 
 
 @app.route("/admin/destinations/<int:dest_id>/images", methods=["GET", "POST"])
 @login_required
+@ratelimit.limit("upload")
 def admin_destination_images(dest_id):
     admin_required()
-    destination = Destination.query.get_or_404(dest_id)
+    destination = loaders.destination_detail(dest_id)
 
     # 🚀 HANDLE UPLOAD
     if request.method == "POST":
         if "file" in request.files:
             file = request.files["file"]
             if file and allowed_file(file.filename):
-                filename = file.filename
-                filepath = os.path.join(app.config["UPLOAD_FOLDER"], filename)
-                file.save(filepath)  # save physically
+                folder = app.config["UPLOAD_FOLDER"]
+                filename = images.store_original(file.read(), file.filename, folder)
 
                 from models import DestinationImage
                 img = DestinationImage(destination_id=destination.id, filename=filename)
                 db.session.add(img)
+                db.session.flush()
+                jobs.enqueue("process_image", image_id=img.id)
                 db.session.commit()
 
-                flash("Image uploaded successfully!", "success")
+                flash("Image uploaded successfully! Resized versions are being generated.", "success")
                 return redirect(url_for("admin_destination_images", dest_id=dest_id))
             else:
                 flash("Invalid file type.", "danger")
@@ -302,13 +664,12 @@ def delete_destination_image(dest_id, img_id):
     img = DestinationImage.query.get_or_404(img_id)
     admin_required()
 
-    # 🧹 Remove file from static/img folder
-    filepath = os.path.join(app.config["UPLOAD_FOLDER"], img.filename)
-    if os.path.exists(filepath):
-        os.remove(filepath)
+    filename = img.filename
+    variant_names = [v.filename for v in img.variants]
 
-    # 🗑 Remove image record from DB
+    # 🗑 Remove image record from DB, 🧹 files from static/img in the background
     db.session.delete(img)
+    jobs.enqueue("delete_image_files", filename=filename, variants=variant_names)
     db.session.commit()
 
     flash("Image deleted.", "info")
@@ -0,0 +1,134 @@
+"""Fingerprinted static assets.
+
+`flask build-assets` copies every file under static/ to static/dist/ with a
+content hash in its name (css/style.css -> dist/css/style.1a2b3c4d.css),
+writes gzip and, when the `brotli` package is installed, brotli versions of
+text assets next to them, and records the mapping in static/dist/manifest.json.
+
+At runtime `url_for('static', filename=...)` is rewritten through the
+manifest, and fingerprinted files are served with a year-long immutable
+Cache-Control, picking a precompressed variant when the client accepts it.
+Image variants (static/img/variants/) are content-addressed already and get
+the same treatment without being copied.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+
+from flask import current_app, request, send_from_directory
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+DIST_DIR = "dist"
+MANIFEST = "manifest.json"
+IMMUTABLE_PREFIXES = (DIST_DIR + "/", "img/variants/")
+COMPRESSIBLE = {".css", ".js", ".svg", ".json", ".txt", ".html", ".map"}
+ONE_YEAR = 365 * 24 * 3600
+
+
+def _fingerprint(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:8]
+
+
+def _source_files(static_folder):
+    for root, dirs, files in os.walk(static_folder):
+        rel_root = os.path.relpath(root, static_folder).replace(os.sep, "/")
+        rel_root = "" if rel_root == "." else rel_root + "/"
+        dirs[:] = sorted(d for d in dirs if not (rel_root + d + "/").startswith(IMMUTABLE_PREFIXES))
+        for name in sorted(files):
+            yield rel_root + name
+
+
+def _compress(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    with open(path + ".gz", "wb") as f:
+        f.write(gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli is not None:
+        with open(path + ".br", "wb") as f:
+            f.write(brotli.compress(data, quality=11))
+
+
+def build(static_folder):
+    """Fingerprint every static file; returns the manifest.
+
+    Files from earlier builds are left in place so that pages (or CDN copies
+    of pages) rendered before a deploy keep working.
+    """
+    dist = os.path.join(static_folder, DIST_DIR)
+    manifest = {}
+    for rel in _source_files(static_folder):
+        source = os.path.join(static_folder, rel)
+        stem, ext = os.path.splitext(rel)
+        hashed = f"{DIST_DIR}/{stem}.{_fingerprint(source)}{ext}"
+        target = os.path.join(static_folder, hashed)
+        if not os.path.exists(target):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copy2(source, target)
+            if ext.lower() in COMPRESSIBLE:
+                _compress(target)
+        manifest[rel] = hashed
+
+    with open(os.path.join(dist, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def load_manifest(static_folder):
+    try:
+        with open(os.path.join(static_folder, DIST_DIR, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _encodings():
+    accepted = request.accept_encodings
+    if brotli is not None and accepted["br"]:
+        yield "br", ".br"
+    if accepted["gzip"]:
+        yield "gzip", ".gz"
+
+
+def serve_static(filename):
+    app = current_app
+    if not filename.startswith(IMMUTABLE_PREFIXES):
+        return app.send_static_file(filename)
+
+    mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    response = None
+    for encoding, suffix in _encodings():
+        if os.path.isfile(os.path.join(app.static_folder, filename + suffix)):
+            response = send_from_directory(app.static_folder, filename + suffix,
+                                           mimetype=mimetype, max_age=ONE_YEAR)
+            response.content_encoding = encoding
+            break
+    if response is None:
+        response = send_from_directory(app.static_folder, filename, max_age=ONE_YEAR)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+def init_app(app):
+    app.extensions["asset_manifest"] = load_manifest(app.static_folder)
+
+    @app.url_defaults
+    def _fingerprinted_static(endpoint, values):
+        if endpoint == "static":
+            hashed = app.extensions["asset_manifest"].get(values.get("filename"))
+            if hashed:
+                values["filename"] = hashed
+
+    app.view_functions["static"] = serve_static
@@ -0,0 +1,217 @@
+"""Login support: cached user identities and password hashing.
+
+`load_user` serves `current_user` from a small in-process cache of
+`SessionUser`s (id, name, email, is_admin) for AUTH_USER_CACHE_TTL seconds,
+so an authenticated request costs no user query. Committing a change to a
+User evicts it from this worker's cache; other workers pick the change up
+when their entry expires, which bounds how long e.g. a revoked admin flag
+can linger. The identity never carries the password hash.
+
+Passwords are hashed with PASSWORD_HASH_METHOD (any Werkzeug method string,
+e.g. "scrypt:32768:8:1" or "pbkdf2:sha256:600000"). Hashes made with other
+parameters are re-hashed on the next successful login. Hashing runs on a
+pool of PASSWORD_HASH_WORKERS threads with at most PASSWORD_HASH_QUEUE
+callers waiting, so a burst of logins queues behind a fixed amount of CPU
+instead of tying up every request thread; callers beyond that get
+`HashingBusy`.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+from flask_login import UserMixin
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from models import db, User
+
+
+class HashingBusy(Exception):
+    """Too many password hashes are already queued."""
+
+
+class SessionUser(UserMixin):
+    """What a request needs to know about the logged-in user."""
+
+    __slots__ = ("id", "name", "email", "is_admin")
+
+    def __init__(self, id, name, email, is_admin):
+        self.id = id
+        self.name = name
+        self.email = email
+        self.is_admin = bool(is_admin)
+
+    def __repr__(self):
+        return f"<SessionUser {self.id} {self.email}>"
+
+
+# -- identity cache --------------------------------------------------------------
+
+_caches = []  # one per app, for the commit hook
+
+
+class IdentityCache:
+    def __init__(self, ttl, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = {}  # id -> (expires, SessionUser)
+
+    def get(self, user_id):
+        entry = self._entries.get(user_id)
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return entry[1]
+
+    def put(self, user):
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                now = time.monotonic()
+                self._entries = {k: v for k, v in self._entries.items() if v[0] >= now}
+                if len(self._entries) >= self.max_entries:
+                    self._entries.clear()
+            self._entries[user.id] = (time.monotonic() + self.ttl, user)
+
+    def evict(self, *user_ids):
+        with self._lock:
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def get_identity_cache(app=None):
+    app = app or current_app
+    return app.extensions["identity_cache"]
+
+
+def _identity(user_id):
+    row = db.session.execute(
+        select(User.id, User.name, User.email, User.is_admin).where(User.id == user_id)
+    ).one_or_none()
+    return SessionUser(*row) if row else None
+
+
+def load_user(user_id):
+    """Flask-Login user loader."""
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        return None
+    cache = get_identity_cache()
+    user = cache.get(user_id)
+    if user is None:
+        user = _identity(user_id)
+        if user is not None:
+            cache.put(user)
+    return user
+
+
+def session_user(user):
+    """The cached identity for an ORM `user`, e.g. right after login."""
+    identity = SessionUser(user.id, user.name, user.email, user.is_admin)
+    get_identity_cache().put(identity)
+    return identity
+
+
+@event.listens_for(Session, "after_flush")
+def _note_user_changes(session, flush_context):
+    ids = {obj.id for obj in (*session.dirty, *session.deleted) if isinstance(obj, User)}
+    if ids:
+        session.info.setdefault("stale_users", set()).update(ids)
+
+
+@event.listens_for(Session, "after_commit")
+def _evict_users(session):
+    ids = session.info.pop("stale_users", None)
+    if ids:
+        # Evict from every app in this process; there is normally just one.
+        for cache in _caches:
+            cache.evict(*ids)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_user_changes(session):
+    session.info.pop("stale_users", None)
+
+
+# -- password hashing ------------------------------------------------------------
+
+class Hasher:
+    """Bounded pool that runs password hashing off the request thread."""
+
+    def __init__(self, method, workers, queue):
+        self.method = method
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._slots = threading.BoundedSemaphore(workers + queue)
+        self._dummy = None
+        self._prefix = None
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HashingBusy()
+        try:
+            return self._pool.submit(fn, *args).result()
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def check(self, password_hash, password):
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        if self._prefix is None:
+            # Werkzeug fills in defaults ("pbkdf2" -> "pbkdf2:sha256:600000"),
+            # so compare with what it actually writes for self.method.
+            self._prefix = self.hash("").split("$", 1)[0]
+        return password_hash.split("$", 1)[0] != self._prefix
+
+    def burn(self, password):
+        """Spend a check's worth of time, so unknown emails aren't answered faster."""
+        if self._dummy is None:
+            self._dummy = self.hash("not a password")
+        self.check(self._dummy, password)
+
+
+def get_hasher(app=None):
+    app = app or current_app
+    return app.extensions["password_hasher"]
+
+
+def hash_password(password):
+    return get_hasher().hash(password)
+
+
+def authenticate(email, password):
+    """The User with this email and password, or None.
+
+    Upgrades the stored hash to PASSWORD_HASH_METHOD when it was made with
+    different parameters. Raises HashingBusy when the hashing pool is full.
+    """
+    hasher = get_hasher()
+    user = User.query.filter_by(email=email).first()
+    if user is None or not password:
+        hasher.burn(password or "")
+        return None
+    if not hasher.check(user.password_hash, password):
+        return None
+    if hasher.needs_rehash(user.password_hash):
+        user.password_hash = hasher.hash(password)
+        db.session.commit()
+    return user
+
+
+def init_app(app, login_manager):
+    config = app.config
+    cache = IdentityCache(config["AUTH_USER_CACHE_TTL"])
+    app.extensions["identity_cache"] = cache
+    _caches.append(cache)
+    app.extensions["password_hasher"] = Hasher(
+        config["PASSWORD_HASH_METHOD"], config["PASSWORD_HASH_WORKERS"], config["PASSWORD_HASH_QUEUE"])
+    login_manager.user_loader(load_user)
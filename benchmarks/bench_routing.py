@@ -0,0 +1,56 @@
+"""Route optimizer timings for large itineraries.
+
+    python benchmarks/bench_routing.py [--stops 50 100 200 400] [--budget 0.5]
+
+Stops are scattered over Nepal's bounding box. For each size the script
+reports the nearest-neighbour and 2-opt route lengths and the solve time;
+an interactive request should stay well under a second at 100+ stops.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import geo  # noqa: E402
+import routing  # noqa: E402
+
+
+def random_points(n, seed):
+    rng = np.random.default_rng(seed)
+    lats = rng.uniform(26.4, 30.4, n)
+    lons = rng.uniform(80.1, 88.2, n)
+    return list(zip(lats.tolist(), lons.tolist()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--stops", type=int, nargs="+", default=[50, 100, 200, 400])
+    parser.add_argument("--budget", type=float, default=None,
+                        help="2-opt time budget in seconds (default: run to convergence)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{'stops':>6} {'nn km':>10} {'2-opt km':>10} {'saved':>7} {'solve ms':>9} {'memo ms':>8}")
+    for n in args.stops:
+        points = random_points(n, args.seed)
+        matrix = geo.pairwise_km(*zip(*points))
+        nn = routing.route_length(matrix, routing.nearest_neighbour(matrix))
+
+        routing._solve.cache_clear()
+        started = time.perf_counter()
+        order = routing.solve(points, args.budget)
+        solve_ms = (time.perf_counter() - started) * 1000
+        started = time.perf_counter()
+        routing.solve(points, args.budget)
+        memo_ms = (time.perf_counter() - started) * 1000
+
+        opt = routing.route_length(matrix, order)
+        print(f"{n:>6} {nn:>10.0f} {opt:>10.0f} {1 - opt / nn:>6.1%} {solve_ms:>9.1f} {memo_ms:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
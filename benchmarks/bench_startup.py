@@ -0,0 +1,92 @@
+"""Worker start-up: import time and the first requests a new process serves.
+
+    python benchmarks/bench_startup.py [--repeat 7] [--update-baseline]
+        [--threshold 1.25] [--regenerate] [volume options]
+
+Each run is a fresh Python process that imports the app and then requests
+PREFLIGHT_PATHS once each, in three set-ups:
+
+* `cold` - empty template bytecode cache, nothing warmed,
+* `bytecode_cache` - templates already compiled on disk by an earlier process,
+* `preflight` - bytecode cache plus `preflight.run()` before the requests
+  (its own time is reported separately as `preflight_ms`).
+
+The report gives medians over `--repeat` processes in milliseconds.
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import harness
+
+SETUPS = ("cold", "bytecode_cache", "preflight")
+
+
+def child(setup):
+    """Runs inside the measured process; prints its timings as JSON."""
+    timings = {}
+    started = time.perf_counter()
+    from app import app
+    timings["import_ms"] = (time.perf_counter() - started) * 1000
+
+    if setup == "preflight":
+        import preflight
+        started = time.perf_counter()
+        preflight.run(app, paths=())  # templates and hasher; the paths are what we time below
+        timings["preflight_ms"] = (time.perf_counter() - started) * 1000
+
+    client = app.test_client()
+    started = time.perf_counter()
+    for path in app.config["PREFLIGHT_PATHS"]:
+        response = client.get(path)
+        response.get_data()
+        assert response.status_code == 200, f"{path}: {response.status_code}"
+    timings["first_requests_ms"] = (time.perf_counter() - started) * 1000
+    print(json.dumps(timings))
+
+
+def run_setup(setup, db_url, repeat, template_dir):
+    env = dict(os.environ, DATABASE_URL=db_url, CACHE_BACKEND="null", TEMPLATE_CACHE_DIR=template_dir)
+    samples = {}
+    for _ in range(repeat):
+        if setup == "cold":
+            shutil.rmtree(template_dir, ignore_errors=True)
+        output = subprocess.run([sys.executable, __file__, "--child", setup], env=env,
+                                check=True, capture_output=True, text=True).stdout
+        for metric, value in json.loads(output.splitlines()[-1]).items():
+            samples.setdefault(metric, []).append(value)
+    return {metric: round(float(np.median(values)), 3) for metric, values in samples.items()}
+
+
+def main():
+    if sys.argv[1:2] == ["--child"]:
+        return child(sys.argv[2])
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=7)
+    harness.add_common_arguments(parser)
+    args = parser.parse_args()
+    harness.prepare(args)  # generate and migrate the database up front
+
+    template_dir = tempfile.mkdtemp(prefix="yatra-templates-")
+    results = {}
+    try:
+        print(f"{'setup':<16} {'import ms':>10} {'preflight ms':>13} {'first requests ms':>18}")
+        for setup in SETUPS:
+            result = results[setup] = run_setup(setup, args.db, args.repeat, template_dir)
+            print(f"{setup:<16} {result['import_ms']:>10.1f} {result.get('preflight_ms', 0):>13.1f} "
+                  f"{result['first_requests_ms']:>18.1f}")
+    finally:
+        shutil.rmtree(template_dir, ignore_errors=True)
+    return harness.finish(args, "startup", results)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,77 @@
+"""Per-view timings through the Flask test client.
+
+    python benchmarks/bench_views.py [--repeat 50] [--only destinations_search ...]
+        [--update-baseline] [--threshold 1.25] [--regenerate] [volume options]
+
+Each scenario is requested `--warmup` times, then `--repeat` times while
+timing the full round trip (routing, view, template, response body). The
+report lists p50/p95 in milliseconds and the SQL statements per request;
+the run exits non-zero if anything regressed against baseline.json.
+"""
+import argparse
+import sys
+import time
+from collections import namedtuple
+
+import harness
+
+# `weight` is the share of traffic in the load test (load.py).
+Scenario = namedtuple("Scenario", "name path login weight")
+
+SCENARIOS = [
+    Scenario("home", "/", False, 10),
+    Scenario("destinations", "/destinations", False, 20),
+    Scenario("destinations_by_rating", "/destinations?sort=rating", False, 5),
+    Scenario("destinations_region", "/destinations?region=Pokhara", False, 5),
+    Scenario("destinations_search", "/destinations?q=monastery+sunrise", False, 15),
+    Scenario("destinations_stream", "/destinations?stream=1&limit=1000", False, 1),
+    Scenario("destination_detail", "/destinations/1", False, 25),
+    Scenario("destination_nearby", "/destinations/1/nearby?km=100", False, 5),
+    Scenario("nearby", "/nearby?lat=27.7&lon=85.3&km=50", False, 5),
+    Scenario("itineraries", "/itineraries", True, 7),
+    Scenario("itinerary_optimize", "/itineraries/1/optimize", True, 2),
+]
+
+
+def run_scenario(client, scenario, repeat, warmup):
+    for _ in range(warmup):
+        client.get(scenario.path).get_data()
+    samples, queries = [], 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = client.get(scenario.path)
+        response.get_data()
+        samples.append((time.perf_counter() - started) * 1000)
+        assert response.status_code == 200, f"{scenario.path}: {response.status_code}"
+        queries = int(response.headers.get("X-Query-Count", 0))
+    result = harness.percentiles(samples, (50, 95))
+    result["queries"] = queries
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--only", nargs="+", metavar="SCENARIO")
+    harness.add_common_arguments(parser)
+    args = parser.parse_args()
+
+    app = harness.prepare(args)
+    anonymous, logged_in = app.test_client(), app.test_client()
+    harness.login(logged_in)
+
+    results = {}
+    print(f"{'scenario':<24} {'p50 ms':>8} {'p95 ms':>8} {'queries':>8}")
+    for scenario in SCENARIOS:
+        if args.only and scenario.name not in args.only:
+            continue
+        client = logged_in if scenario.login else anonymous
+        result = results[scenario.name] = run_scenario(client, scenario, args.repeat, args.warmup)
+        print(f"{scenario.name:<24} {result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} "
+              f"{result['queries']:>8}")
+    return harness.finish(args, "views", results)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,159 @@
+"""Seeded synthetic data for benchmarks.
+
+    python benchmarks/datagen.py [--db sqlite:///benchmarks/bench.db] [--users 500]
+        [--destinations 2000] [--reviews 50000] [--itineraries 1000] [--items 8] [--seed 1]
+
+The same seed always produces the same rows. Destinations and reviews go
+through bulk.py, so the search, spatial and rating indexes are built the
+same way a real import builds them. Users, itineraries and their items are
+inserted directly, and recommendations are computed last. Every user has
+the password BENCH_PASSWORD, and `bench0@example.com` (BENCH_EMAIL) owns at
+least one itinerary.
+"""
+import argparse
+import os
+import sys
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARKS_DIR))
+
+BENCH_EMAIL = "bench0@example.com"
+BENCH_PASSWORD = "benchpass"
+DEFAULT_DB = "sqlite:///" + os.path.join(BENCHMARKS_DIR, "bench.db")
+
+Volumes = namedtuple("Volumes", "users destinations reviews itineraries items")
+DEFAULT_VOLUMES = Volumes(users=500, destinations=2000, reviews=50000, itineraries=1000, items=8)
+
+REGIONS = ["Kathmandu Valley", "Pokhara", "Chitwan", "Everest", "Annapurna", "Langtang",
+           "Mustang", "Lumbini", "Janakpur", "Ilam", "Rara", "Bardiya"]
+CATEGORIES = ["Heritage", "Trekking", "Wildlife", "Lake", "Temple", "Viewpoint", "Village", "Adventure"]
+WORDS = ["ancient", "stupa", "ridge", "valley", "monastery", "sunrise", "river", "forest",
+         "glacier", "bazaar", "pagoda", "terrace", "rhododendron", "festival", "suspension",
+         "bridge", "homestay", "cave", "waterfall", "yak", "prayer", "flags", "himalayan"]
+
+
+def _sentence(rng, n):
+    return " ".join(rng.choice(WORDS, n)).capitalize() + "."
+
+
+def destination_records(n, rng):
+    lats = rng.uniform(26.4, 30.4, n)
+    lons = rng.uniform(80.1, 88.2, n)
+    for i in range(n):
+        yield {
+            "name": f"Destination {i:05d}",
+            "region": REGIONS[i % len(REGIONS)],
+            "category": CATEGORIES[int(rng.integers(len(CATEGORIES)))],
+            "description": " ".join(_sentence(rng, 12) for _ in range(3)),
+            "highlights": _sentence(rng, 6),
+            "latitude": round(float(lats[i]), 6),
+            "longitude": round(float(lons[i]), 6),
+        }
+
+
+def review_records(n, users, destinations, rng):
+    # A few destinations collect most of the reviews, as on the real site.
+    popularity = 1.0 / np.arange(1, destinations + 1) ** 0.8
+    dest_ids = rng.choice(destinations, n, p=popularity / popularity.sum())
+    user_ids = rng.integers(users, size=n)
+    stars = rng.choice([1, 2, 3, 4, 5], n, p=[0.05, 0.07, 0.18, 0.35, 0.35])
+    start = datetime(2022, 1, 1)
+    for i in range(n):
+        yield {
+            "user_email": f"bench{user_ids[i]}@example.com",
+            "destination": f"Destination {dest_ids[i]:05d}",
+            "rating": int(stars[i]),
+            "comment": _sentence(rng, 10),
+            # Distinct timestamps keep every generated review a separate row.
+            "created_at": (start + timedelta(seconds=60 * i)).isoformat(),
+        }
+
+
+def _insert_users(n):
+    from werkzeug.security import generate_password_hash
+    from sqlalchemy import insert
+    from models import db, User
+
+    password_hash = generate_password_hash(BENCH_PASSWORD)
+    created = datetime(2022, 1, 1)
+    rows = [{"name": f"Bench {i}", "email": f"bench{i}@example.com",
+             "password_hash": password_hash, "is_admin": False, "created_at": created}
+            for i in range(n)]
+    db.session.execute(insert(User.__table__), rows)
+    db.session.commit()
+
+
+def _insert_itineraries(n, items, users, rng):
+    from sqlalchemy import insert, select
+    from models import db, Destination, Itinerary, ItineraryItem, User
+
+    user_ids = db.session.execute(select(User.id).order_by(User.id)).scalars().all()[:users]
+    dest_ids = np.array(db.session.execute(select(Destination.id)).scalars().all())
+    now = datetime.utcnow()
+    # The first itinerary belongs to bench0 so logged-in benchmarks have one to open.
+    owners = [user_ids[0]] + [user_ids[int(i)] for i in rng.integers(len(user_ids), size=n - 1)]
+    db.session.execute(insert(Itinerary.__table__), [
+        {"user_id": owner, "title": f"Trip {i}", "start_date": date(2025, 1, 1) + timedelta(days=i % 365),
+         "created_at": now, "updated_at": now, "version": 1}
+        for i, owner in enumerate(owners)
+    ])
+    itinerary_ids = db.session.execute(select(Itinerary.id).order_by(Itinerary.id)).scalars().all()
+    rows = []
+    for it_id in itinerary_ids[-n:]:
+        for day, dest_id in enumerate(rng.choice(dest_ids, items), 1):
+            rows.append({"itinerary_id": it_id, "day_number": day, "destination_id": int(dest_id),
+                         "notes": None, "updated_at": now})
+    if rows:
+        db.session.execute(insert(ItineraryItem.__table__), rows)
+    db.session.commit()
+
+
+def generate(volumes=DEFAULT_VOLUMES, seed=1):
+    """Fill the current app's (empty) database; returns the bulk import results."""
+    import bulk
+    import recommend
+
+    rng = np.random.default_rng(seed)
+    _insert_users(volumes.users)
+    dest_result, errors = bulk.import_destinations(destination_records(volumes.destinations, rng))
+    assert not errors, errors[:5]
+    review_result, errors = bulk.import_reviews(
+        review_records(volumes.reviews, volumes.users, volumes.destinations, rng))
+    assert not errors, errors[:5]
+    if volumes.itineraries:
+        _insert_itineraries(volumes.itineraries, volumes.items, volumes.users, rng)
+    recommend.refresh(full=True)
+    return dest_result, review_result
+
+
+def add_volume_arguments(parser):
+    for field in Volumes._fields:
+        parser.add_argument(f"--{field}", type=int, default=getattr(DEFAULT_VOLUMES, field),
+                            help="items per itinerary" if field == "items" else None)
+    parser.add_argument("--seed", type=int, default=1)
+
+
+def volumes_from(args):
+    return Volumes(*(getattr(args, field) for field in Volumes._fields))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default=DEFAULT_DB, help="database URL (replaced if it exists)")
+    add_volume_arguments(parser)
+    args = parser.parse_args()
+
+    import harness
+    app = harness.fresh_app(args.db)
+    with app.app_context():
+        dest_result, review_result = generate(volumes_from(args), args.seed)
+    print(f"Generated {dest_result.inserted} destinations, {review_result.inserted} reviews "
+          f"into {args.db}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""Shared pieces of the benchmark scripts: app setup, percentiles, baselines.
+
+Benchmarks run against their own database (benchmarks/bench.db by default,
+filled by datagen.py on first use) with the page cache switched off, so
+they time the views rather than cache hits.
+
+Baselines live in benchmarks/baseline.json, one section per script. A run
+fails when a timing grows past `threshold` times its baseline, throughput
+drops below baseline / `threshold`, or a query count grows at all. Timings
+only compare meaningfully on the machine that recorded them; rerun with
+--update-baseline after moving to new hardware or making a page
+deliberately heavier.
+"""
+import json
+import os
+import sys
+
+import numpy as np
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.join(BENCHMARKS_DIR, "baseline.json")
+DEFAULT_THRESHOLD = 1.25
+
+sys.path.insert(0, os.path.dirname(BENCHMARKS_DIR))
+
+
+def _sqlite_path(db_url):
+    prefix = "sqlite:///"
+    return db_url[len(prefix):] if db_url.startswith(prefix) else None
+
+
+def load_app(db_url, page_cache=False):
+    """Import the app bound to `db_url` (must run before anything imports app).
+
+    The database is migrated to the current schema.
+    """
+    os.environ["DATABASE_URL"] = db_url
+    if not page_cache:
+        os.environ["CACHE_BACKEND"] = "null"
+    from app import app
+    import migrations
+    app.config["TESTING"] = True  # X-Query-Count on every response
+    with app.app_context():
+        migrations.upgrade()
+    return app
+
+
+def fresh_app(db_url, page_cache=False):
+    """Like load_app, but on an empty, fully migrated database."""
+    path = _sqlite_path(db_url)
+    if not path:
+        raise ValueError("benchmarks need a SQLite file database they can recreate")
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    return load_app(db_url, page_cache)
+
+
+def prepare(args):
+    """App for a benchmark run, generating data first if needed or asked to."""
+    import datagen
+    if not args.regenerate:
+        path = _sqlite_path(args.db)
+        if path is None or os.path.exists(path):
+            app = load_app(args.db, args.page_cache)
+            from models import Destination
+            with app.app_context():
+                if Destination.query.first() is not None:
+                    return app
+    app = fresh_app(args.db, args.page_cache)
+    with app.app_context():
+        datagen.generate(datagen.volumes_from(args), args.seed)
+    return app
+
+
+def add_common_arguments(parser):
+    import datagen
+    parser.add_argument("--db", default=datagen.DEFAULT_DB)
+    parser.add_argument("--regenerate", action="store_true",
+                        help="rebuild the benchmark database from the volume options")
+    parser.add_argument("--page-cache", action="store_true", help="leave the page cache on")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true")
+    datagen.add_volume_arguments(parser)
+
+
+def login(client):
+    import datagen
+    response = client.post("/login", data={"email": datagen.BENCH_EMAIL,
+                                           "password": datagen.BENCH_PASSWORD})
+    assert response.status_code == 302, "benchmark user could not log in"
+
+
+def percentiles(samples_ms, points=(50, 95, 99)):
+    values = np.percentile(np.asarray(samples_ms, dtype=float), points)
+    return {f"p{p}_ms": round(float(v), 3) for p, v in zip(points, values)}
+
+
+# -- baselines -----------------------------------------------------------------
+
+def load_baseline(path, section):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f).get(section, {})
+
+
+def save_baseline(path, section, results):
+    data = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            data = json.load(f)
+    data[section] = results
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """Regression messages for `results` against `baseline` ({name: {metric: value}})."""
+    problems = []
+    for name, metrics in results.items():
+        expected = baseline.get(name)
+        if not expected:
+            continue
+        for metric, value in metrics.items():
+            before = expected.get(metric)
+            if before is None:
+                continue
+            if metric.endswith("_ms") and value > before * threshold:
+                problems.append(f"{name}: {metric} {value:.2f} > {before:.2f} x {threshold}")
+            elif metric == "queries" and value > before:
+                problems.append(f"{name}: {value} queries, baseline {before}")
+            elif metric == "rps" and value < before / threshold:
+                problems.append(f"{name}: {value:.1f} req/s < {before:.1f} / {threshold}")
+    return problems
+
+
+def finish(args, section, results):
+    """Update or check the baseline; returns the process exit status."""
+    if args.update_baseline:
+        save_baseline(args.baseline, section, results)
+        print(f"Baseline written to {args.baseline} [{section}].")
+        return 0
+    baseline = load_baseline(args.baseline, section)
+    if not baseline:
+        print("No baseline recorded; run with --update-baseline to create one.")
+        return 0
+    problems = compare(results, baseline, args.threshold)
+    for problem in problems:
+        print(f"REGRESSION {problem}")
+    if not problems:
+        print(f"Within {args.threshold}x of baseline.")
+    return 1 if problems else 0
@@ -0,0 +1,133 @@
+"""Concurrent load driver.
+
+    python benchmarks/load.py [--concurrency 8] [--duration 10] [--url http://127.0.0.1:8000]
+        [--update-baseline] [--threshold 1.25] [--regenerate] [volume options]
+
+Workers request the bench_views scenarios in proportion to their weights
+for `--duration` seconds and the report gives p50/p95/p99 latency and
+throughput, overall and per scenario. Without --url the workers share one
+in-process app (threads, so this measures lock and GIL contention as well
+as the views); with --url they drive a running server, which should
+serve the same benchmark database with the page cache off, e.g.
+
+    DATABASE_URL=sqlite:///$PWD/benchmarks/bench.db CACHE_BACKEND=null gunicorn app:app
+
+(the SQLite path must be absolute; relative ones resolve inside instance/).
+"""
+import argparse
+import http.cookiejar
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+
+import harness
+from bench_views import SCENARIOS
+
+
+class TestClientSession:
+    def __init__(self, app):
+        self.client = app.test_client()
+        harness.login(self.client)
+
+    def get(self, path):
+        response = self.client.get(path)
+        response.get_data()
+        return response.status_code
+
+
+class HTTPSession:
+    def __init__(self, base_url):
+        import datagen
+        self.base_url = base_url.rstrip("/")
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+        body = urllib.parse.urlencode({"email": datagen.BENCH_EMAIL,
+                                       "password": datagen.BENCH_PASSWORD}).encode()
+        self.opener.open(self.base_url + "/login", body).read()
+
+    def get(self, path):
+        try:
+            with self.opener.open(self.base_url + path) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as exc:
+            return exc.code
+
+
+def worker(session, scenarios, deadline, seed, samples, errors, lock):
+    rng = random.Random(seed)
+    weights = [s.weight for s in scenarios]
+    local = defaultdict(list)
+    failed = defaultdict(int)
+    while time.perf_counter() < deadline:
+        scenario = rng.choices(scenarios, weights)[0]
+        started = time.perf_counter()
+        status = session.get(scenario.path)
+        local[scenario.name].append((time.perf_counter() - started) * 1000)
+        if status != 200:
+            failed[scenario.name] += 1
+    with lock:
+        for name, values in local.items():
+            samples[name].extend(values)
+        for name, n in failed.items():
+            errors[name] += n
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds")
+    parser.add_argument("--url", help="drive a running server instead of an in-process app")
+    harness.add_common_arguments(parser)
+    args = parser.parse_args()
+
+    if args.url:
+        sessions = [HTTPSession(args.url) for _ in range(args.concurrency)]
+    else:
+        app = harness.prepare(args)
+        sessions = [TestClientSession(app) for _ in range(args.concurrency)]
+
+    samples, errors, lock = defaultdict(list), defaultdict(int), threading.Lock()
+    started = time.perf_counter()
+    deadline = started + args.duration
+    threads = [threading.Thread(target=worker,
+                                args=(s, SCENARIOS, deadline, args.seed + i, samples, errors, lock))
+               for i, s in enumerate(sessions)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    results = {}
+    everything = [ms for values in samples.values() for ms in values]
+    if not everything:
+        print("No requests completed.")
+        return 1
+    results["all"] = dict(harness.percentiles(everything), rps=round(len(everything) / elapsed, 1))
+    for scenario in SCENARIOS:
+        if samples[scenario.name]:
+            results[scenario.name] = harness.percentiles(samples[scenario.name])
+
+    print(f"{args.concurrency} workers, {elapsed:.1f} s, {len(everything)} requests, "
+          f"{results['all']['rps']:.1f} req/s, {sum(errors.values())} errors")
+    print(f"{'scenario':<24} {'n':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name, result in results.items():
+        n = len(everything) if name == "all" else len(samples[name])
+        print(f"{name:<24} {n:>6} {result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} "
+              f"{result['p99_ms']:>8.2f}")
+    for name, n in errors.items():
+        print(f"ERROR {name}: {n} non-200 responses")
+
+    # Per-scenario tails rest on a handful of samples; only the totals are gated.
+    status = harness.finish(args, "load", {"all": results["all"]})
+    return 1 if errors else status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
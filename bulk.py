@@ -0,0 +1,389 @@
+"""Bulk import and export of destinations and reviews.
+
+Records stream through generators in both directions, so memory use depends
+on the chunk size and not on the file size. Imports write each chunk with
+executemany INSERT/UPDATE statements in one transaction and upsert on a
+natural key:
+
+* destinations: `name`;
+* destination images: (destination, `filename`), added but never removed;
+* reviews: (`user_email`, `destination`, `created_at`).
+
+Updating a destination only sets the fields the record has (a JSON key or
+a CSV column, even if empty); the ones it leaves out keep their values.
+
+Core statements skip the mapper events that keep the search and spatial
+indexes, rating aggregates, version stamps and page cache up to date, so
+each import finishes by refreshing those in one pass each.
+
+Files are CSV or JSON Lines, picked by extension (.csv, .jsonl/.ndjson);
+"-" means stdin/stdout. In CSV, a destination's images are one
+`;`-separated column.
+"""
+import csv
+import json
+import os
+import sys
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from itertools import islice
+
+from sqlalchemy import bindparam, insert, select, update
+
+import cache
+import facets
+import geo
+import ratings
+import search
+import versioning
+from models import db, Destination, DestinationImage, Review, User
+
+CHUNK_SIZE = 5000
+
+DESTINATION_FIELDS = ("name", "region", "category", "description", "latitude", "longitude",
+                      "image_url", "highlights", "images", "primary_image")
+REVIEW_FIELDS = ("user_email", "destination", "rating", "comment", "created_at")
+_DESTINATION_COLUMNS = DESTINATION_FIELDS[:-2]
+
+ImportResult = namedtuple("ImportResult", "inserted updated skipped")
+
+
+# -- files ---------------------------------------------------------------
+
+def file_format(path, fmt=None):
+    fmt = fmt or os.path.splitext(path)[1].lstrip(".").lower()
+    if fmt in ("jsonl", "ndjson"):
+        return "jsonl"
+    if fmt == "csv":
+        return "csv"
+    raise ValueError(f"Cannot tell the format of {path!r}; use .csv or .jsonl")
+
+
+@contextmanager
+def _open(path, mode):
+    if path == "-":
+        stream = sys.stdin if "r" in mode else sys.stdout
+        yield stream
+        stream.flush()
+        return
+    with open(path, mode, newline="", encoding="utf-8") as f:
+        yield f
+
+
+class MalformedRecord(ValueError):
+    """Stands in for a line that could not be decoded; the import reports it."""
+
+
+def read_records(path, fmt=None):
+    """Yield one dict per CSV row or JSON line (a MalformedRecord for bad JSON)."""
+    fmt = file_format(path, fmt)
+    with _open(path, "r") as f:
+        if fmt == "csv":
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError as exc:
+                    record = MalformedRecord(f"invalid JSON: {exc}")
+                yield record
+
+
+def write_records(records, path, fields, fmt=None):
+    """Write dicts from the `records` iterable; returns how many were written."""
+    fmt = file_format(path, fmt)
+    count = 0
+    with _open(path, "w") as f:
+        if fmt == "csv":
+            writer = csv.DictWriter(f, fieldnames=fields, extrasaction="ignore")
+            writer.writeheader()
+            for record in records:
+                writer.writerow({k: ";".join(v) if isinstance(v, list) else v
+                                 for k, v in record.items()})
+                count += 1
+        else:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False, default=str))
+                f.write("\n")
+                count += 1
+    return count
+
+
+def chunks(iterable, size=CHUNK_SIZE):
+    it = iter(iterable)
+    while chunk := list(islice(it, size)):
+        yield chunk
+
+
+# -- field parsing -----------------------------------------------------------
+
+def _text(value):
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def _number(value):
+    value = _text(value)
+    return float(value) if value is not None else None
+
+
+def _list(value):
+    if isinstance(value, list):
+        return [v for v in map(_text, value) if v]
+    return [v for v in (_text(p) for p in (value or "").split(";")) if v]
+
+
+def _timestamp(value):
+    value = _text(value)
+    if value is None:
+        raise ValueError("created_at is required")
+    stamp = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if stamp.tzinfo is not None:  # stored as naive UTC, like datetime.utcnow()
+        stamp = stamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return stamp
+
+
+def _destination_row(record):
+    """Only the columns present in `record`; an update leaves the others alone."""
+    row = {col: _text(record[col]) for col in _DESTINATION_COLUMNS if col in record}
+    if not row.get("name"):
+        raise ValueError("name is required")
+    for coord in ("latitude", "longitude"):
+        if coord in row:
+            row[coord] = _number(row[coord])
+    images = _list(record.get("images"))
+    primary = _text(record.get("primary_image"))
+    if primary and primary not in images:
+        images.insert(0, primary)
+    return row, images, primary
+
+
+def _review_row(record):
+    rating = int(record.get("rating"))
+    if rating not in ratings.STARS:
+        raise ValueError(f"rating {rating} is outside 1-5")
+    email, destination = _text(record.get("user_email")), _text(record.get("destination"))
+    if not email or not destination:
+        raise ValueError("user_email and destination are required")
+    return {
+        "user_email": email.lower(),
+        "destination": destination,
+        "rating": rating,
+        "comment": _text(record.get("comment")),
+        "created_at": _timestamp(record.get("created_at")),
+    }
+
+
+# -- import ----------------------------------------------------------------
+
+def _parse(records, parse, errors):
+    for n, record in enumerate(records, 1):
+        try:
+            if isinstance(record, MalformedRecord):
+                raise record
+            if not isinstance(record, dict):
+                raise ValueError("each record must be an object")
+            yield parse(record)
+        except (TypeError, ValueError) as exc:
+            errors.append((n, str(exc)))
+
+
+def _ids_by(column, values):
+    """{value: id} for rows whose `column` is one of `values` (last one wins)."""
+    table = column.table
+    rows = db.session.execute(
+        select(column, table.c.id).where(column.in_(set(values))).order_by(table.c.id)
+    )
+    return dict(rows.all())
+
+
+def _update_many(table, rows, **values):
+    """executemany UPDATE; each row dict holds new column values plus its `_id`."""
+    if rows:
+        db.session.connection().execute(
+            update(table).where(table.c.id == bindparam("_id")).values(**values),
+            rows,
+        )
+
+
+def _upsert_destinations(parsed):
+    table = Destination.__table__
+    # Duplicate names within a chunk are merged, later fields winning, as if
+    # they had been imported one after the other.
+    by_name = {}
+    for row, images, primary in parsed:
+        before, had, had_primary = by_name.get(row["name"], ({}, [], None))
+        by_name[row["name"]] = ({**before, **row}, had + [f for f in images if f not in had],
+                                primary or had_primary)
+    existing = _ids_by(table.c.name, by_name)
+
+    # executemany needs the same columns in every row, so updates are
+    # grouped by the set of columns they set.
+    changed = {}
+    for name, (row, _, _) in by_name.items():
+        if name in existing:
+            changed.setdefault(frozenset(row), []).append(dict(row, _id=existing[name]))
+    new = [dict(dict.fromkeys(_DESTINATION_COLUMNS), **row)
+           for name, (row, _, _) in by_name.items() if name not in existing]
+    if new:
+        db.session.execute(insert(table), new)
+        existing = _ids_by(table.c.name, by_name)
+    for rows in changed.values():
+        _update_many(table, rows, version=table.c.version + 1, updated_at=datetime.utcnow())
+
+    _add_images(
+        (existing[name], images, primary) for name, (_, images, primary) in by_name.items()
+    )
+    return len(new), sum(map(len, changed.values())), 0
+
+
+def _add_images(destinations):
+    table = DestinationImage.__table__
+    wanted = {(dest_id, f): f == primary
+              for dest_id, images, primary in destinations for f in images}
+    if not wanted:
+        return
+    have = set(db.session.execute(
+        select(table.c.destination_id, table.c.filename)
+        .where(table.c.destination_id.in_({d for d, _ in wanted}))
+    ).all())
+    new = [{"destination_id": d, "filename": f, "is_primary": primary}
+           for (d, f), primary in wanted.items() if (d, f) not in have]
+    if new:
+        db.session.execute(insert(table), new)
+
+
+def _upsert_reviews(parsed):
+    table = Review.__table__
+    users = _ids_by(User.__table__.c.email, {r["user_email"] for r in parsed})
+    dests = _ids_by(Destination.__table__.c.name, {r["destination"] for r in parsed})
+
+    rows, skipped = {}, 0
+    for r in parsed:
+        user_id, dest_id = users.get(r["user_email"]), dests.get(r["destination"])
+        if user_id is None or dest_id is None:
+            skipped += 1
+            continue
+        row = {"user_id": user_id, "destination_id": dest_id, "rating": r["rating"],
+               "comment": r["comment"], "created_at": r["created_at"]}
+        rows[(user_id, dest_id, r["created_at"])] = row
+    if not rows:
+        return 0, 0, skipped
+
+    # One index seek per timestamp (ix_reviews_natural_key); the rest of the
+    # key is matched here rather than with more IN lists, which the planner
+    # would expand into their cross product.
+    existing = {}
+    for review_id, u, d, c in db.session.execute(
+        select(table.c.id, table.c.user_id, table.c.destination_id, table.c.created_at)
+        .where(table.c.created_at.in_({k[2] for k in rows}))
+    ):
+        if (u, d, c) in rows:
+            existing[(u, d, c)] = review_id
+    new = [row for key, row in rows.items() if key not in existing]
+    changed = [{"_id": existing[key], "rating": row["rating"], "comment": row["comment"]}
+               for key, row in rows.items() if key in existing]
+    if new:
+        db.session.execute(insert(table), new)
+    _update_many(table, changed, updated_at=datetime.utcnow())
+    # Reviews are part of the destination page, so its version moves too.
+    dest_table = Destination.__table__
+    db.session.execute(
+        update(dest_table)
+        .where(dest_table.c.id.in_({row["destination_id"] for row in rows.values()}))
+        .values(version=dest_table.c.version + 1, updated_at=datetime.utcnow())
+    )
+    return len(new), len(changed), skipped
+
+
+def _run_import(records, parse, upsert, chunk_size, errors):
+    inserted = updated = skipped = 0
+    for chunk in chunks(_parse(records, parse, errors), chunk_size):
+        added, changed, unknown = upsert(chunk)
+        db.session.commit()
+        inserted += added
+        updated += changed
+        skipped += unknown
+    return inserted, updated, skipped
+
+
+def _refresh(refresh_destination_indexes):
+    if refresh_destination_indexes:
+        search.rebuild_index()
+        geo.rebuild_index()
+        facets.rebuild()
+    ratings.reconcile()
+    versioning.bump_table(db.session.connection(), Destination.__tablename__)
+    db.session.commit()
+    cache.invalidate()
+
+
+def import_destinations(records, chunk_size=CHUNK_SIZE):
+    """Upsert destinations (and their image filenames) from dicts."""
+    errors = []
+    inserted, updated, _ = _run_import(
+        records, _destination_row, _upsert_destinations, chunk_size, errors)
+    _refresh(refresh_destination_indexes=True)
+    return ImportResult(inserted, updated, len(errors)), errors
+
+
+def import_reviews(records, chunk_size=CHUNK_SIZE):
+    """Upsert reviews from dicts; rows naming an unknown user or destination are skipped."""
+    errors = []
+    inserted, updated, unknown = _run_import(
+        records, _review_row, _upsert_reviews, chunk_size, errors)
+    _refresh(refresh_destination_indexes=False)
+    return ImportResult(inserted, updated, len(errors) + unknown), errors
+
+
+# -- export ----------------------------------------------------------------
+
+def _stream(stmt, batch_size):
+    result = db.session.execute(stmt.execution_options(yield_per=batch_size))
+    yield from result.mappings().partitions()
+
+
+def export_destinations(batch_size=1000):
+    """Yield destination dicts (with image filenames) in id order."""
+    table, images = Destination.__table__, DestinationImage.__table__
+    stmt = select(table.c.id, *(table.c[col] for col in _DESTINATION_COLUMNS)).order_by(table.c.id)
+    for batch in _stream(stmt, batch_size):
+        files, primary = {}, {}
+        for dest_id, filename, is_primary in db.session.execute(
+            select(images.c.destination_id, images.c.filename, images.c.is_primary)
+            .where(images.c.destination_id.in_([row["id"] for row in batch]))
+            .order_by(images.c.id)
+        ):
+            files.setdefault(dest_id, []).append(filename)
+            if is_primary:
+                primary.setdefault(dest_id, filename)
+        for row in batch:
+            record = {col: row[col] for col in _DESTINATION_COLUMNS}
+            for coord in ("latitude", "longitude"):
+                if record[coord] is not None:
+                    record[coord] = float(record[coord])
+            record["images"] = files.get(row["id"], [])
+            record["primary_image"] = primary.get(row["id"])
+            yield record
+
+
+def export_reviews(batch_size=5000):
+    """Yield review dicts keyed by user email and destination name, in id order."""
+    reviews, users, dests = Review.__table__, User.__table__, Destination.__table__
+    stmt = (
+        select(users.c.email.label("user_email"), dests.c.name.label("destination"),
+               reviews.c.rating, reviews.c.comment, reviews.c.created_at)
+        .join_from(reviews, users, reviews.c.user_id == users.c.id)
+        .join(dests, reviews.c.destination_id == dests.c.id)
+        .order_by(reviews.c.id)
+    )
+    for batch in _stream(stmt, batch_size):
+        for row in batch:
+            record = dict(row)
+            record["created_at"] = record["created_at"].isoformat() if record["created_at"] else None
+            yield record
@@ -0,0 +1,307 @@
+"""Rendered page and template fragment cache.
+
+Entries are keyed by endpoint plus normalised query arguments and a cache
+*generation*. Committing a change to a Destination, DestinationImage (or one
+of its variants) or Review bumps the generation, which orphans every cached page at once; stale
+entries then age out through TTL/LRU. This works the same for the in-process
+backend and for backends shared between workers (filesystem, Redis).
+
+Only anonymous GETs without pending flash messages are served from the page
+cache, since everything else renders per-user navigation or alerts.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, has_app_context, make_response, request, session
+from flask_login import current_user
+from markupsafe import Markup
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import Destination, DestinationImage, ImageVariant, Review
+
+WATCHED_MODELS = (Destination, DestinationImage, ImageVariant, Review)
+
+
+class Backend:
+    """Bytes-in, bytes-out key/value store with per-entry TTL."""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _count(self, value):
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+
+class NullBackend(Backend):
+    def get(self, key):
+        return self._count(None)
+
+    def set(self, key, value, ttl):
+        pass
+
+    def generation(self):
+        return 0
+
+    def bump_generation(self):
+        pass
+
+    def clear(self):
+        pass
+
+
+class MemoryBackend(Backend):
+    """Per-process LRU with TTL."""
+
+    def __init__(self, max_entries=512):
+        super().__init__()
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires < time.monotonic():
+                    del self._entries[key]
+                    self.evictions += 1
+                    value = None
+                else:
+                    self._entries.move_to_end(key)
+            else:
+                value = None
+            return self._count(value)
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def generation(self):
+        return self._generation
+
+    def bump_generation(self):
+        with self._lock:
+            self._generation += 1
+            self.evictions += len(self._entries)
+            self._entries.clear()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class FileSystemBackend(Backend):
+    """One file per entry, shared by every worker on the host."""
+
+    def __init__(self, directory, max_entries=2048):
+        super().__init__()
+        self.directory = directory
+        self.max_entries = max_entries
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest())
+
+    def _write(self, path, data):
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                expires = float(f.readline())
+                value = f.read()
+        except (OSError, ValueError):
+            return self._count(None)
+        if expires < time.time():
+            self._remove(path)
+            return self._count(None)
+        return self._count(value)
+
+    def set(self, key, value, ttl):
+        self._write(self._path(key), b"%f\n" % (time.time() + ttl) + value)
+        self._prune()
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+            self.evictions += 1
+        except OSError:
+            pass
+
+    def _entries(self):
+        with os.scandir(self.directory) as it:
+            return [e for e in it if e.is_file() and len(e.name) == 40]
+
+    def _prune(self):
+        entries = self._entries()
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort(key=lambda e: e.stat().st_mtime)
+        for entry in entries[:len(entries) - self.max_entries]:
+            self._remove(entry.path)
+
+    def generation(self):
+        try:
+            with open(os.path.join(self.directory, "generation")) as f:
+                return f.read().strip()
+        except OSError:
+            return "0"
+
+    def bump_generation(self):
+        # A fresh timestamp rather than read-increment-write, so two workers
+        # bumping at once still both end up with a new generation.
+        self._write(os.path.join(self.directory, "generation"), str(time.time_ns()).encode())
+
+    def clear(self):
+        for entry in self._entries():
+            self._remove(entry.path)
+
+
+class RedisBackend(Backend):
+    """Any server speaking the Redis protocol (Redis, Valkey, KeyDB, ...)."""
+
+    def __init__(self, url, prefix="yatra:cache:"):
+        super().__init__()
+        import redis  # only needed for this backend
+
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        return self._count(self.client.get(self.prefix + key))
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, value, ex=max(1, int(ttl)))
+
+    def generation(self):
+        return int(self.client.get(self.prefix + "generation") or 0)
+
+    def bump_generation(self):
+        self.client.incr(self.prefix + "generation")
+
+    def clear(self):
+        for key in self.client.scan_iter(self.prefix + "page:*"):
+            self.client.delete(key)
+
+
+def make_backend(config):
+    kind = config["CACHE_BACKEND"]
+    if kind == "memory":
+        return MemoryBackend(config["CACHE_MAX_ENTRIES"])
+    if kind == "filesystem":
+        return FileSystemBackend(config["CACHE_DIR"], config["CACHE_MAX_ENTRIES"])
+    if kind == "redis":
+        return RedisBackend(config["CACHE_REDIS_URL"])
+    if kind == "null":
+        return NullBackend()
+    raise ValueError(f"Unknown CACHE_BACKEND {kind!r}")
+
+
+def get_cache(app=None):
+    app = app or current_app
+    backend = app.extensions.get("page_cache")
+    if backend is None:
+        backend = app.extensions["page_cache"] = make_backend(app.config)
+    return backend
+
+
+def _key(kind, name):
+    return f"page:{get_cache().generation()}:{kind}:{name}"
+
+
+def page_key():
+    args = sorted((k, v) for k, v in request.args.items(multi=True) if v)
+    query = "&".join(f"{k}={v}" for k, v in args)
+    return _key("view", f"{request.endpoint}:{request.view_args or {}}?{query}")
+
+
+def _cacheable():
+    return (
+        request.method == "GET"
+        and not current_user.is_authenticated
+        and "_flashes" not in session
+    )
+
+
+def cached_page(view):
+    """Serve the view's HTML from the cache for anonymous visitors."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not _cacheable():
+            return view(*args, **kwargs)
+        cache = get_cache()
+        key = page_key()
+        body = cache.get(key)
+        if body is not None:
+            response = make_response(body)
+            response.headers["X-Cache"] = "HIT"
+            return response
+        response = make_response(view(*args, **kwargs))
+        if response.status_code == 200 and not response.is_streamed:
+            cache.set(key, response.get_data(), current_app.config["CACHE_TTL"])
+            response.headers["X-Cache"] = "MISS"
+        return response
+    return wrapper
+
+
+def cached_fragment(name, *vary, caller=None):
+    """Jinja helper: `{% call cached_fragment("featured") %}...{% endcall %}`."""
+    cache = get_cache()
+    key = _key("fragment", ":".join([name, *map(str, vary)]))
+    html = cache.get(key)
+    if html is None:
+        html = caller().encode()
+        cache.set(key, html, current_app.config["CACHE_TTL"])
+    return Markup(html.decode())
+
+
+@event.listens_for(Session, "after_flush")
+def _note_changes(session, flush_context):
+    changed = (*session.new, *session.dirty, *session.deleted)
+    if any(isinstance(obj, WATCHED_MODELS) for obj in changed):
+        session.info["page_cache_stale"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate(session):
+    if session.info.pop("page_cache_stale", False) and has_app_context():
+        get_cache().bump_generation()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard(session):
+    session.info.pop("page_cache_stale", None)
+
+
+def invalidate():
+    """Drop every cached page, e.g. after writing with Core statements."""
+    get_cache().bump_generation()
+
+
+def init_app(app):
+    app.jinja_env.globals["cached_fragment"] = cached_fragment
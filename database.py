@@ -0,0 +1,114 @@
+"""Database engine configuration.
+
+The primary database comes from DATABASE_URL (SQLite file by default). On
+SQLite every new connection is switched to WAL with `synchronous=NORMAL`, a
+busy timeout and a memory-mapped read window, so readers never block the
+writer and concurrent writers from several gunicorn workers wait for the
+lock instead of failing with "database is locked". PostgreSQL gets a sized
+connection pool with pre-ping and recycling.
+
+When DATABASE_REPLICA_URL is set, views decorated with `@read_replica` run
+their SELECTs against that engine; flushes and Core writes always go to the
+primary, as do requests with pending flash messages (the user has just
+written something and should see it).
+"""
+from functools import wraps
+
+from flask import current_app, request, session as http_session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.sql import Select
+
+REPLICA = "replica"
+
+
+def normalise_url(url):
+    """Accept the `postgres://` scheme many hosting providers still hand out."""
+    if url and url.startswith("postgres://"):
+        return "postgresql://" + url[len("postgres://"):]
+    return url
+
+
+def engine_options(url, config):
+    """Engine keyword arguments for `url`, by backend."""
+    backend = make_url(url).get_backend_name()
+    if backend == "postgresql":
+        return {
+            "pool_size": config["DB_POOL_SIZE"],
+            "max_overflow": config["DB_MAX_OVERFLOW"],
+            "pool_timeout": config["DB_POOL_TIMEOUT"],
+            "pool_recycle": config["DB_POOL_RECYCLE"],
+            "pool_pre_ping": config["DB_POOL_PRE_PING"],
+        }
+    if backend == "sqlite":
+        # The driver's own lock wait; the busy_timeout pragma covers the rest.
+        return {"connect_args": {"timeout": config["SQLITE_BUSY_TIMEOUT_MS"] / 1000}}
+    return {"pool_pre_ping": config["DB_POOL_PRE_PING"]}
+
+
+def _sqlite_pragmas(config):
+    return [
+        f"PRAGMA journal_mode={config['SQLITE_JOURNAL_MODE']}",
+        f"PRAGMA synchronous={config['SQLITE_SYNCHRONOUS']}",
+        f"PRAGMA busy_timeout={int(config['SQLITE_BUSY_TIMEOUT_MS'])}",
+        f"PRAGMA mmap_size={int(config['SQLITE_MMAP_SIZE'])}",
+    ]
+
+
+def _install_pragmas(engine, pragmas):
+    @event.listens_for(engine, "connect")
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+
+class RoutingSession(Session):
+    """Sends SELECTs to the replica engine while `info["use_replica"]` is set."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and self.info.get("use_replica") and not self._flushing
+                and isinstance(clause, Select)):
+            replica = self._db.engines.get(REPLICA)
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def read_replica(view):
+    """Run a GET view's queries against the read replica, if one is configured."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if (request.method not in ("GET", "HEAD") or "_flashes" in http_session
+                or not current_app.config.get("DATABASE_REPLICA_URL")):
+            return view(*args, **kwargs)
+        sess = current_app.extensions["sqlalchemy"].session()
+        sess.info["use_replica"] = True
+        try:
+            return view(*args, **kwargs)
+        finally:
+            sess.info.pop("use_replica", None)
+    return wrapper
+
+
+def init_app(app, db):
+    config = app.config
+    config["SQLALCHEMY_DATABASE_URI"] = normalise_url(config["SQLALCHEMY_DATABASE_URI"])
+    config.setdefault("SQLALCHEMY_ENGINE_OPTIONS",
+                      engine_options(config["SQLALCHEMY_DATABASE_URI"], config))
+
+    replica_url = normalise_url(config.get("DATABASE_REPLICA_URL"))
+    if replica_url:
+        config["DATABASE_REPLICA_URL"] = replica_url
+        binds = config.setdefault("SQLALCHEMY_BINDS", {})
+        binds[REPLICA] = {"url": replica_url, **engine_options(replica_url, config)}
+
+    db.init_app(app)
+
+    pragmas = _sqlite_pragmas(config)
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name == "sqlite":
+                _install_pragmas(engine, pragmas)
@@ -0,0 +1,195 @@
+"""Region and category facets for the destination listing.
+
+Regions and categories live in lookup tables (`regions`, `categories`) that
+destinations reference by integer id. Code keeps writing the `region` and
+`category` names on Destination: mapper events resolve each name to its
+lookup row inside the flush (creating it on first use and normalising the
+name's spelling to the stored one), set `region_id` / `category_id`, and
+adjust the lookup row's `destination_count`. Core writes (bulk.py) bypass
+the events and call `rebuild()` afterwards.
+
+Counts for the unfiltered listing are those materialised columns. Once a
+filter or search is applied, both facets come from one grouped query over
+(region_id, category_id); each facet is counted with the *other* facet's
+filter applied, so the numbers say how many results picking that value
+would give.
+"""
+from collections import Counter, namedtuple
+
+from sqlalchemy import event, func, insert, inspect, literal, select, update, union_all
+
+import search
+from models import db, Category, Destination, Region
+
+FacetValue = namedtuple("FacetValue", "id name count selected")
+Facets = namedtuple("Facets", "regions categories")
+
+# (lookup model, Destination name attribute, Destination id attribute)
+LOOKUPS = ((Region, "region", "region_id"), (Category, "category", "category_id"))
+
+
+def _clean(name):
+    name = (name or "").strip()
+    return name or None
+
+
+# -- maintenance -----------------------------------------------------------------
+
+def _lookup(connection, model, name):
+    """(id, stored name) of the lookup row for `name`, inserting it if new."""
+    table = model.__table__
+    row = connection.execute(
+        select(table.c.id, table.c.name).where(func.lower(table.c.name) == name.lower())
+    ).first()
+    if row is not None:
+        return tuple(row)
+    result = connection.execute(insert(table).values(name=name, destination_count=0))
+    return result.inserted_primary_key[0], name
+
+
+def _count(connection, model, lookup_id, delta):
+    if lookup_id is not None:
+        table = model.__table__
+        connection.execute(update(table).where(table.c.id == lookup_id)
+                           .values(destination_count=table.c.destination_count + delta))
+
+
+def _resolve(connection, target, model, name_attr):
+    name = _clean(getattr(target, name_attr))
+    if name is None:
+        setattr(target, name_attr, None)
+        return None
+    lookup_id, stored = _lookup(connection, model, name)
+    setattr(target, name_attr, stored)
+    return lookup_id
+
+
+def _stored_id(connection, target, id_attr):
+    state = inspect(target)
+    if id_attr in state.dict:
+        return state.committed_state.get(id_attr, state.dict[id_attr])
+    table = Destination.__table__
+    return connection.execute(select(table.c[id_attr]).where(table.c.id == target.id)).scalar()
+
+
+@event.listens_for(Destination, "before_insert")
+def _destination_added(mapper, connection, target):
+    for model, name_attr, id_attr in LOOKUPS:
+        lookup_id = _resolve(connection, target, model, name_attr)
+        setattr(target, id_attr, lookup_id)
+        _count(connection, model, lookup_id, 1)
+
+
+@event.listens_for(Destination, "before_update")
+def _destination_changed(mapper, connection, target):
+    state = inspect(target)
+    for model, name_attr, id_attr in LOOKUPS:
+        if not state.attrs[name_attr].history.has_changes():
+            continue
+        old_id = _stored_id(connection, target, id_attr)
+        new_id = _resolve(connection, target, model, name_attr)
+        if new_id != old_id:
+            setattr(target, id_attr, new_id)
+            _count(connection, model, old_id, -1)
+            _count(connection, model, new_id, 1)
+
+
+@event.listens_for(Destination, "before_delete")
+def _destination_removed(mapper, connection, target):
+    for model, _, id_attr in LOOKUPS:
+        _count(connection, model, _stored_id(connection, target, id_attr), -1)
+
+
+def rebuild():
+    """Re-derive lookup rows, destination ids and counts from the name columns.
+
+    Returns the number of lookup rows.
+    """
+    connection = db.session.connection()
+    dest = Destination.__table__
+    total = 0
+    for model, name_attr, id_attr in LOOKUPS:
+        table = model.__table__
+        known = {name.lower() for name in connection.execute(select(table.c.name)).scalars()}
+        for name in connection.execute(select(dest.c[name_attr]).distinct()).scalars():
+            name = _clean(name)
+            if name and name.lower() not in known:
+                connection.execute(insert(table).values(name=name, destination_count=0))
+                known.add(name.lower())
+
+        match = func.lower(table.c.name) == func.lower(func.trim(dest.c[name_attr]))
+        connection.execute(update(dest).values({
+            dest.c[id_attr]: select(table.c.id).where(match).scalar_subquery(),
+            dest.c[name_attr]: select(table.c.name).where(match).scalar_subquery(),
+        }))
+        connection.execute(update(table).values(destination_count=(
+            select(func.count()).select_from(dest).where(dest.c[id_attr] == table.c.id).scalar_subquery()
+        )))
+        total += len(known)
+    db.session.commit()
+    return total
+
+
+# -- reading -----------------------------------------------------------------------
+
+def selected_ids(model, value):
+    """Lookup ids picked by a `?region=` / `?category=` value, or None for no filter.
+
+    An exact name (any case) picks that row; anything else picks every name
+    containing it, so older free-text links keep working.
+    """
+    value = _clean(value)
+    if value is None:
+        return None
+    rows = db.session.execute(
+        select(model.id, model.name).where(model.name.ilike(f"%{value}%"))
+    ).all()
+    exact = [lookup_id for lookup_id, name in rows if name.lower() == value.lower()]
+    return exact or [lookup_id for lookup_id, _ in rows]
+
+
+def filter_query(query, region_ids=None, category_ids=None):
+    if region_ids is not None:
+        query = query.filter(Destination.region_id.in_(region_ids))
+    if category_ids is not None:
+        query = query.filter(Destination.category_id.in_(category_ids))
+    return query
+
+
+def _lookup_rows(with_counts):
+    """(kind, id, name, count) for both lookup tables in one round trip."""
+    parts = []
+    for kind, model in (("region", Region), ("category", Category)):
+        stmt = select(literal(kind).label("kind"), model.id, model.name, model.destination_count)
+        if with_counts:
+            stmt = stmt.where(model.destination_count > 0)
+        parts.append(stmt)
+    return db.session.execute(union_all(*parts)).all()
+
+
+def counts(region_ids=None, category_ids=None, q=""):
+    """Facets for the listing filtered by `region_ids`, `category_ids` and search `q`."""
+    if region_ids is None and category_ids is None and not q:
+        rows = [(kind, i, name, n) for kind, i, name, n in _lookup_rows(with_counts=True)]
+    else:
+        query = Destination.query
+        if q:
+            query = search.search(query, q).order_by(None)
+        grouped = (query.with_entities(Destination.region_id, Destination.category_id, func.count())
+                   .group_by(Destination.region_id, Destination.category_id))
+        by_region, by_category = Counter(), Counter()
+        for region_id, category_id, n in grouped:
+            if category_ids is None or category_id in category_ids:
+                by_region[region_id] += n
+            if region_ids is None or region_id in region_ids:
+                by_category[category_id] += n
+        totals = {"region": by_region, "category": by_category}
+        rows = [(kind, i, name, totals[kind][i]) for kind, i, name, _ in _lookup_rows(with_counts=False)]
+
+    chosen = {"region": set(region_ids or ()), "category": set(category_ids or ())}
+    values = {"region": [], "category": []}
+    for kind, lookup_id, name, n in rows:
+        selected = lookup_id in chosen[kind]
+        if n or selected:
+            values[kind].append(FacetValue(lookup_id, name, n, selected))
+    return Facets(*(sorted(values[kind], key=lambda v: v.name.lower()) for kind in ("region", "category")))
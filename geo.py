@@ -0,0 +1,163 @@
+"""Nearby-destination search.
+
+On SQLite every destination with coordinates is mirrored as a point in an
+R*Tree virtual table (`destinations_rtree`), kept in sync by mapper events
+like the search index. A radius query first takes the bounding box from the
+R*Tree, which only touches nearby points, then computes exact great-circle
+distances for those candidates in one vectorised NumPy pass.
+
+Other databases fall back to a bounding-box filter on the coordinate columns.
+"""
+import math
+
+import numpy as np
+from sqlalchemy import DDL, event, inspect, text
+
+from models import db, Destination
+
+RTREE_TABLE = "destinations_rtree"
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+_CREATE_RTREE = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {RTREE_TABLE} "
+    "USING rtree(id, min_lat, max_lat, min_lon, max_lon)"
+)
+
+event.listen(Destination.__table__, "after_create", DDL(_CREATE_RTREE).execute_if(dialect="sqlite"))
+event.listen(
+    Destination.__table__,
+    "before_drop",
+    DDL(f"DROP TABLE IF EXISTS {RTREE_TABLE}").execute_if(dialect="sqlite"),
+)
+
+
+def haversine_km(lat, lon, lats, lons):
+    """Distance in km from (lat, lon) to each point of the `lats`/`lons` arrays."""
+    lat1, lon1 = np.radians(lat), np.radians(lon)
+    lat2, lon2 = np.radians(lats), np.radians(lons)
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def pairwise_km(lats, lons):
+    """Symmetric matrix of great-circle distances between all points."""
+    lats = np.radians(np.asarray(lats, dtype=float))
+    lons = np.radians(np.asarray(lons, dtype=float))
+    dlat = lats[:, None] - lats[None, :]
+    dlon = lons[:, None] - lons[None, :]
+    a = (np.sin(dlat / 2) ** 2
+         + np.cos(lats)[:, None] * np.cos(lats)[None, :] * np.sin(dlon / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def bounding_box(lat, lon, radius_km):
+    """(min_lat, max_lat, min_lon, max_lon) enclosing the circle."""
+    dlat = radius_km / KM_PER_DEGREE
+    cos_lat = math.cos(math.radians(lat))
+    dlon = 180.0 if cos_lat < 1e-6 else min(180.0, radius_km / (KM_PER_DEGREE * cos_lat))
+    return (max(-90.0, lat - dlat), min(90.0, lat + dlat),
+            max(-180.0, lon - dlon), min(180.0, lon + dlon))
+
+
+def _has_point(target):
+    return target.latitude is not None and target.longitude is not None
+
+
+def _index_point(connection, target):
+    lat, lon = float(target.latitude), float(target.longitude)
+    connection.execute(
+        text(f"INSERT OR REPLACE INTO {RTREE_TABLE} VALUES (:id, :lat, :lat, :lon, :lon)"),
+        {"id": target.id, "lat": lat, "lon": lon},
+    )
+
+
+def _unindex_point(connection, dest_id):
+    connection.execute(text(f"DELETE FROM {RTREE_TABLE} WHERE id = :id"), {"id": dest_id})
+
+
+@event.listens_for(Destination, "after_insert")
+def _point_inserted(mapper, connection, target):
+    if connection.dialect.name == "sqlite" and _has_point(target):
+        _index_point(connection, target)
+
+
+@event.listens_for(Destination, "after_update")
+def _point_updated(mapper, connection, target):
+    if connection.dialect.name != "sqlite":
+        return
+    state = inspect(target)
+    if not (state.attrs.latitude.history.has_changes() or state.attrs.longitude.history.has_changes()):
+        return
+    if _has_point(target):
+        _index_point(connection, target)
+    else:
+        _unindex_point(connection, target.id)
+
+
+@event.listens_for(Destination, "after_delete")
+def _point_deleted(mapper, connection, target):
+    if connection.dialect.name == "sqlite":
+        _unindex_point(connection, target.id)
+
+
+def _candidates(box):
+    min_lat, max_lat, min_lon, max_lon = box
+    if db.session.get_bind().dialect.name == "sqlite":
+        # Points are stored as degenerate boxes (R*Tree keeps 32-bit floats,
+        # rounded outwards), so an overlap test never loses an edge point.
+        sql = text(
+            f"SELECT id, (min_lat + max_lat) / 2, (min_lon + max_lon) / 2 FROM {RTREE_TABLE} "
+            "WHERE max_lat >= :min_lat AND min_lat <= :max_lat "
+            "AND max_lon >= :min_lon AND min_lon <= :max_lon"
+        )
+        params = dict(min_lat=min_lat, max_lat=max_lat, min_lon=min_lon, max_lon=max_lon)
+        return db.session.execute(sql, params).all()
+    return db.session.execute(
+        db.select(Destination.id, Destination.latitude, Destination.longitude).where(
+            Destination.latitude.between(min_lat, max_lat),
+            Destination.longitude.between(min_lon, max_lon),
+        )
+    ).all()
+
+
+def nearby(lat, lon, radius_km, limit=10, exclude_id=None):
+    """Destinations within `radius_km` of a point, nearest first.
+
+    Returns a list of (Destination, distance_km).
+    """
+    rows = [r for r in _candidates(bounding_box(lat, lon, radius_km)) if r[0] != exclude_id]
+    if not rows:
+        return []
+    ids = np.array([r[0] for r in rows])
+    coords = np.array([(r[1], r[2]) for r in rows], dtype=float)
+    distances = haversine_km(lat, lon, coords[:, 0], coords[:, 1])
+
+    inside = np.flatnonzero(distances <= radius_km)
+    order = inside[np.argsort(distances[inside], kind="stable")][:limit]
+    if not len(order):
+        return []
+
+    wanted = [int(i) for i in ids[order]]
+    by_id = {d.id: d for d in Destination.query.filter(Destination.id.in_(wanted))}
+    return [(by_id[int(ids[i])], float(distances[i])) for i in order if int(ids[i]) in by_id]
+
+
+def rebuild_index():
+    """Recreate the R*Tree from the destinations table. Returns the point count."""
+    connection = db.session.connection()
+    if connection.dialect.name != "sqlite":
+        return 0
+    connection.execute(text(_CREATE_RTREE))
+    connection.execute(text(f"DELETE FROM {RTREE_TABLE}"))
+    connection.execute(
+        text(
+            f"INSERT INTO {RTREE_TABLE} (id, min_lat, max_lat, min_lon, max_lon) "
+            "SELECT id, latitude, latitude, longitude, longitude FROM destinations "
+            "WHERE latitude IS NOT NULL AND longitude IS NOT NULL"
+        )
+    )
+    count = connection.execute(text(f"SELECT count(*) FROM {RTREE_TABLE}")).scalar()
+    db.session.commit()
+    return count
@@ -0,0 +1,144 @@
+"""Destination image pipeline.
+
+Uploads are stored under a content hash (so two files called `photo.jpg`
+no longer overwrite each other) and re-encoded into a ladder of widths in
+JPEG, WebP and, where Pillow supports it, AVIF. Variants are recorded as
+ImageVariant rows and rendered as `<picture>`/`srcset` so browsers download
+the smallest file that fits.
+
+Encoding runs in the background job `process_image`, and file removal in
+`delete_image_files`, so admin requests only write the upload itself.
+`process_file()` is a pure function of the file on disk, which lets
+`reprocess_all()` fan the work out over a process pool.
+
+Pillow is only imported by the functions that encode, so web workers that
+never process an image don't pay for loading it.
+"""
+import hashlib
+import os
+from functools import lru_cache
+
+from flask import current_app, url_for
+
+import jobs
+from models import db, DestinationImage, ImageVariant
+
+WIDTHS = (320, 640, 960, 1280, 1920)
+QUALITY = {"jpeg": 82, "webp": 80, "avif": 55}
+VARIANT_DIR = "variants"
+HASH_LENGTH = 16
+
+
+@lru_cache(maxsize=None)
+def formats():
+    """{Pillow format: file extension} for the variants this Pillow can encode."""
+    from PIL import features
+
+    found = {"jpeg": "jpg", "webp": "webp"}
+    if features.check("avif"):
+        found["avif"] = "avif"
+    return found
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+
+
+def store_original(data, filename, folder):
+    """Write uploaded bytes under a content-hashed name; returns that name."""
+    ext = filename.rsplit(".", 1)[1].lower()
+    name = f"{content_hash(data)}.{ext}"
+    path = os.path.join(folder, name)
+    if not os.path.exists(path):
+        with open(path, "wb") as f:
+            f.write(data)
+    return name
+
+
+def _target_widths(width):
+    widths = [w for w in WIDTHS if w < width]
+    if width <= WIDTHS[-1]:
+        widths.append(width)
+    return widths or [WIDTHS[-1]]
+
+
+def process_file(path):
+    """Generate every variant of the image at `path`.
+
+    Returns a list of dicts (width, height, format, filename), filenames
+    relative to the `variants` directory next to the original.
+    """
+    from PIL import Image, ImageOps
+
+    with open(path, "rb") as f:
+        digest = content_hash(f.read())
+    out_dir = os.path.join(os.path.dirname(path), VARIANT_DIR)
+    os.makedirs(out_dir, exist_ok=True)
+
+    with Image.open(path) as original:
+        image = ImageOps.exif_transpose(original).convert("RGB")
+
+    variants = []
+    for width in _target_widths(image.width):
+        height = round(image.height * width / image.width)
+        resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+        for fmt, ext in formats().items():
+            name = f"{digest}-{width}.{ext}"
+            target = os.path.join(out_dir, name)
+            if not os.path.exists(target):
+                resized.save(target, fmt.upper(), quality=QUALITY[fmt], optimize=fmt == "jpeg")
+            variants.append({"width": width, "height": height, "format": fmt, "filename": name})
+    return variants
+
+
+def record_variants(img, variants):
+    img.variants = [ImageVariant(**v) for v in variants]
+
+
+def remove_files(filename, variant_names, folder):
+    """Delete an original and its variants, unless another row still uses them."""
+    if DestinationImage.query.filter_by(filename=filename).count() > 0:
+        return
+    paths = [os.path.join(folder, filename)]
+    paths += [os.path.join(folder, VARIANT_DIR, name) for name in variant_names]
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+@jobs.task("process_image")
+def process_image_job(image_id):
+    img = db.session.get(DestinationImage, image_id)
+    if img is None:
+        return  # deleted before the job ran
+    folder = current_app.config["UPLOAD_FOLDER"]
+    record_variants(img, process_file(os.path.join(folder, img.filename)))
+    db.session.commit()
+
+
+@jobs.task("delete_image_files")
+def delete_image_files_job(filename, variants):
+    remove_files(filename, variants, current_app.config["UPLOAD_FOLDER"])
+
+
+def reprocess_all(folder, workers=None):
+    """Regenerate variants for every DestinationImage; returns (done, missing)."""
+    from concurrent.futures import ProcessPoolExecutor
+
+    images = DestinationImage.query.order_by(DestinationImage.id).all()
+    present = [img for img in images if os.path.exists(os.path.join(folder, img.filename))]
+    paths = [os.path.join(folder, img.filename) for img in present]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for img, variants in zip(present, pool.map(process_file, paths)):
+            record_variants(img, variants)
+    db.session.commit()
+    return len(present), len(images) - len(present)
+
+
+def srcset(img, fmt):
+    """`srcset` attribute value for one format of an image, or '' if none."""
+    return ", ".join(
+        f"{url_for('static', filename=f'img/{VARIANT_DIR}/{v.filename}')} {v.width}w"
+        for v in img.variants if v.format == fmt
+    )
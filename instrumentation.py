@@ -0,0 +1,316 @@
+"""Per-request performance instrumentation.
+
+Every cursor execution on any engine is counted and timed against the
+current request (`g.query_count`, `g.sql_time`), and template rendering is
+timed through Flask's template signals. After each request the totals are
+
+* sent back in a `Server-Timing` header (visible in browser dev tools),
+* added to per-endpoint counters and a latency histogram that `/metrics`
+  exposes in the Prometheus text format (per process: scrape every worker,
+  or run one worker per container).
+
+Admins can profile a single request by adding `?_profile=stacks` (a
+sampling profiler; the response is folded stacks for flamegraph.pl or
+speedscope) or `?_profile=cprofile` (deterministic; the response is a
+pstats report). Streamed responses are only profiled up to the point the
+view returns.
+
+Tests use `count_queries()` to pin the number of SELECTs a page issues so
+that N+1 regressions fail loudly.
+"""
+import io
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from flask import (before_render_template, current_app, g, has_request_context, make_response,
+                   request, template_rendered)
+from flask_login import current_user
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+_counters = []
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        self.statements = []
+        self.parameters = []
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        g.query_count = g.get("query_count", 0) + 1
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+    for counter in _counters:
+        counter.count += 1
+        counter.statements.append(statement)
+        counter.parameters.append(parameters)
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _time_query(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("query_started")
+    if started and has_request_context():
+        g.sql_time = g.get("sql_time", 0.0) + time.perf_counter() - started.pop()
+
+
+@event.listens_for(Engine, "handle_error")
+def _discard_timer(exception_context):
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("query_started"):
+        conn.info["query_started"].pop()
+
+
+@contextmanager
+def count_queries():
+    """Count the statements executed inside the block, across requests."""
+    counter = QueryCounter()
+    _counters.append(counter)
+    try:
+        yield counter
+    finally:
+        _counters.remove(counter)
+
+
+def query_count():
+    return g.get("query_count", 0)
+
+
+def _template_started(sender, template, context, **extra):
+    g.setdefault("template_started", []).append(time.perf_counter())
+
+
+def _template_finished(sender, template, context, **extra):
+    started = g.get("template_started")
+    if started:
+        g.template_time = g.get("template_time", 0.0) + time.perf_counter() - started.pop()
+
+
+# -- metrics -------------------------------------------------------------------
+
+class Metrics:
+    """Per-endpoint request counters and latency histogram for one process."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self.requests = Counter()        # (endpoint, method, status) -> n
+        self.latency = defaultdict(lambda: [0] * (len(buckets) + 1))
+        self.latency_sum = Counter()
+        self.sql_queries = Counter()
+        self.sql_seconds = Counter()
+        self.template_seconds = Counter()
+        self.response_bytes = Counter()
+
+    def observe(self, endpoint, method, status, seconds, queries, sql, template, size):
+        with self._lock:
+            self.requests[(endpoint, method, str(status))] += 1
+            counts = self.latency[endpoint]
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    counts[i] += 1
+            counts[-1] += 1
+            self.latency_sum[endpoint] += seconds
+            self.sql_queries[endpoint] += queries
+            self.sql_seconds[endpoint] += sql
+            self.template_seconds[endpoint] += template
+            self.response_bytes[endpoint] += size or 0
+
+    def render(self, extra=()):
+        """Prometheus text exposition; `extra` is (name, help, type, value) tuples."""
+        out = []
+
+        def family(name, help_text, kind, samples):
+            out.append(f"# HELP {name} {help_text}")
+            out.append(f"# TYPE {name} {kind}")
+            out.extend(f"{sample_name}{_labels(labels)} {_number(value)}"
+                       for sample_name, labels, value in samples)
+
+        with self._lock:
+            family("yatra_http_requests_total", "Requests handled.", "counter", [
+                ("yatra_http_requests_total", {"endpoint": e, "method": m, "status": s}, n)
+                for (e, m, s), n in sorted(self.requests.items())
+            ])
+            histogram = []
+            for endpoint, counts in sorted(self.latency.items()):
+                name = "yatra_http_request_duration_seconds"
+                bounds = [repr(b) for b in self.buckets] + ["+Inf"]
+                histogram += [(f"{name}_bucket", {"endpoint": endpoint, "le": le}, n)
+                              for le, n in zip(bounds, counts)]
+                histogram.append((f"{name}_sum", {"endpoint": endpoint}, self.latency_sum[endpoint]))
+                histogram.append((f"{name}_count", {"endpoint": endpoint}, counts[-1]))
+            family("yatra_http_request_duration_seconds", "Request wall time.", "histogram", histogram)
+            for name, help_text, values in (
+                ("yatra_sql_queries_total", "SQL statements executed.", self.sql_queries),
+                ("yatra_sql_seconds_total", "Time spent executing SQL.", self.sql_seconds),
+                ("yatra_template_seconds_total", "Time spent rendering templates.", self.template_seconds),
+                ("yatra_response_bytes_total", "Response body bytes (non-streamed).", self.response_bytes),
+            ):
+                family(name, help_text, "counter",
+                       [(name, {"endpoint": e}, v) for e, v in sorted(values.items())])
+        for name, help_text, kind, value in extra:
+            family(name, help_text, kind, [(name, {}, value)])
+        return "\n".join(out) + "\n"
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+               for v in labels.values())
+    return "{" + ",".join(f'{k}="{v}"' for k, v in zip(labels, escaped)) + "}"
+
+
+def _number(value):
+    return f"{value:.6f}" if isinstance(value, float) else str(value)
+
+
+def get_metrics(app=None):
+    app = app or current_app
+    return app.extensions["metrics"]
+
+
+# -- profiling -------------------------------------------------------------------
+
+class StackSampler:
+    """Samples one thread's Python stack at a fixed interval from a helper thread.
+
+    The interpreter only switches threads every `sys.getswitchinterval()`
+    (5 ms by default), so that is lowered to the sampling interval while the
+    sampler runs.
+    """
+
+    def __init__(self, thread_id, interval=0.001):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self._switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(min(self.interval, self._switch_interval))
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        sys.setswitchinterval(self._switch_interval)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[_fold(frame)] += 1
+
+    def folded(self):
+        """Brendan Gregg's collapsed-stack format: `root;...;leaf count` per line."""
+        return "".join(f"{stack} {n}\n" for stack, n in self.stacks.most_common())
+
+
+def _fold(frame):
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{getattr(code, 'co_qualname', code.co_name)} "
+                     f"({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ","))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def _profile_mode():
+    mode = request.args.get("_profile")
+    if mode not in ("stacks", "cprofile"):
+        return None
+    if not (current_user.is_authenticated and current_user.is_admin):
+        return None
+    return mode
+
+
+def _start_profiler(mode):
+    if mode == "stacks":
+        g.profiler = StackSampler(threading.get_ident(),
+                                  current_app.config["PROFILE_SAMPLE_INTERVAL"]).start()
+    else:
+        import cProfile  # admin-only; kept out of start-up
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+
+def _profile_response(mode):
+    profiler = g.pop("profiler")
+    if mode == "stacks":
+        profiler.stop()
+        body = profiler.folded()
+    else:
+        import pstats
+        profiler.disable()
+        report = io.StringIO()
+        pstats.Stats(profiler, stream=report).sort_stats("cumulative").print_stats(60)
+        body = report.getvalue()
+    response = make_response(body)
+    response.mimetype = "text/plain"
+    response.headers["Cache-Control"] = "no-store"
+    return response
+
+
+# -- wiring -------------------------------------------------------------------
+
+def server_timing(total, sql, queries, template):
+    return (f'app;dur={total * 1000:.1f}, db;dur={sql * 1000:.1f};desc="{queries} queries", '
+            f"tpl;dur={template * 1000:.1f}")
+
+
+def init_app(app):
+    app.extensions["metrics"] = Metrics()
+    before_render_template.connect(_template_started, app)
+    template_rendered.connect(_template_finished, app)
+
+    @app.before_request
+    def _start_request():
+        g.request_started = time.perf_counter()
+        g.query_count = 0
+        g.sql_time = 0.0
+        g.template_time = 0.0
+        mode = _profile_mode()
+        if mode:
+            g.profile_mode = mode
+            _start_profiler(mode)
+
+    @app.after_request
+    def _finish_request(response):
+        if g.get("profiler") is not None:
+            response = _profile_response(g.profile_mode)
+        started = g.get("request_started")
+        if started is None:
+            return response
+        total = time.perf_counter() - started
+        sql, template = g.get("sql_time", 0.0), g.get("template_time", 0.0)
+        get_metrics(app).observe(
+            request.endpoint or "unmatched", request.method, response.status_code,
+            total, query_count(), sql, template,
+            None if response.is_streamed else response.calculate_content_length(),
+        )
+        if app.config["SERVER_TIMING"]:
+            response.headers["Server-Timing"] = server_timing(total, sql, query_count(), template)
+        if app.debug or app.testing:
+            response.headers["X-Query-Count"] = str(query_count())
+        return response
+
+    @app.teardown_request
+    def _stop_profiler(exc):
+        # after_request is skipped when the view raises; don't leave a sampler running.
+        profiler = g.pop("profiler", None)
+        if isinstance(profiler, StackSampler):
+            profiler.stop()
+        elif profiler is not None:
+            profiler.disable()
@@ -0,0 +1,190 @@
+"""Batched itinerary edits, shared by the itinerary page and the JSON API.
+
+A batch is a list of operations on one itinerary's stops:
+
+* `{"op": "add", "destination_id": 3, "day_number": 2, "notes": "..."}`
+* `{"op": "remove", "item_id": 7}`
+* `{"op": "move", "item_id": 7, "day_number": 4}`
+* `{"op": "notes", "item_id": 7, "notes": "..."}`
+
+`parse_ops()` checks the whole batch (with one query for the itinerary's
+stops and one for the destinations it names) before anything is written,
+so a bad operation rejects the batch. `apply()` writes it in one
+transaction, guarded by the itinerary's `version`: the client sends the
+version it last saw, and a conditional UPDATE claims it, so a batch built
+on a stale copy (another tab, another device) gets a 409 instead of
+silently overwriting someone else's change.
+"""
+from collections import namedtuple
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import delete, insert, select, update
+from werkzeug.exceptions import BadRequest, Conflict
+
+import versioning
+from models import db, Destination, Itinerary, ItineraryItem
+
+Op = namedtuple("Op", "kind item_id destination_id day_number notes")
+
+# op -> fields it requires (notes is optional for "add")
+OPS = {
+    "add": ("destination_id", "day_number"),
+    "remove": ("item_id",),
+    "move": ("item_id", "day_number"),
+    "notes": ("item_id", "notes"),
+}
+
+
+class ValidationFailed(BadRequest):
+    """A 400 carrying per-item `errors` for batch requests."""
+
+    def __init__(self, description, errors=None):
+        super().__init__(description)
+        self.errors = errors or []
+
+
+class VersionConflict(Conflict):
+    """The itinerary changed since the client loaded it."""
+
+    def __init__(self, version):
+        super().__init__(f"The itinerary was changed elsewhere; it is now at version {version}.")
+        self.version = version
+
+
+def _check_batch_size(raw, name):
+    if not isinstance(raw, list) or not raw:
+        raise BadRequest(f"{name} must be a non-empty list.")
+    if len(raw) > current_app.config["MAX_PAGE_SIZE"]:
+        raise BadRequest(f"At most {current_app.config['MAX_PAGE_SIZE']} {name} per request.")
+
+
+def _unknown_destinations(ids):
+    ids = set(ids)
+    if not ids:
+        return ids
+    return ids - set(db.session.execute(select(Destination.id).where(Destination.id.in_(ids))).scalars())
+
+
+def _day(value):
+    day = int(value)
+    if day < 1:
+        raise ValueError("day_number must be 1 or more")
+    return day
+
+
+def parse_items(raw):
+    """Validate a list of `{day_number, destination_id, notes}`; all or nothing."""
+    _check_batch_size(raw, "items")
+    items, errors = [], []
+    for n, entry in enumerate(raw):
+        try:
+            day = _day(entry.get("day_number", 1))
+            dest_id = int(entry["destination_id"])
+        except (AttributeError, KeyError, TypeError, ValueError) as exc:
+            errors.append({"index": n, "message": str(exc) if isinstance(exc, ValueError)
+                           else "day_number and destination_id are required integers"})
+            continue
+        items.append({"day_number": day, "destination_id": dest_id,
+                      "notes": str(entry.get("notes") or "")})
+    unknown = _unknown_destinations(i["destination_id"] for i in items)
+    errors += [{"index": n, "message": f"unknown destination {i['destination_id']}"}
+               for n, i in enumerate(items) if i["destination_id"] in unknown]
+    if errors:
+        raise ValidationFailed("Some items are invalid; nothing was added.",
+                               sorted(errors, key=lambda e: e["index"]))
+    return items
+
+
+def _parse_op(entry):
+    kind = entry.get("op")
+    if not isinstance(kind, str) or kind not in OPS:
+        raise ValueError(f"op must be one of {', '.join(OPS)}")
+    missing = [field for field in OPS[kind] if entry.get(field) is None]
+    if missing:
+        raise ValueError(f"{kind} needs {' and '.join(missing)}")
+    try:
+        item_id = int(entry["item_id"]) if "item_id" in OPS[kind] else None
+        destination_id = int(entry["destination_id"]) if kind == "add" else None
+        day = int(entry["day_number"]) if "day_number" in OPS[kind] else None
+    except (TypeError, ValueError):
+        raise ValueError("item_id, destination_id and day_number must be integers") from None
+    if day is not None and day < 1:
+        raise ValueError("day_number must be 1 or more")
+    notes = str(entry.get("notes") or "") if kind in ("add", "notes") else None
+    return Op(kind, item_id, destination_id, day, notes)
+
+
+def parse_ops(raw, itinerary):
+    """Validate a batch of operations against `itinerary`; all or nothing."""
+    _check_batch_size(raw, "ops")
+    ops, errors = [], []
+    for n, entry in enumerate(raw):
+        try:
+            if not isinstance(entry, dict):
+                raise ValueError("each op must be an object")
+            ops.append((n, _parse_op(entry)))
+        except ValueError as exc:
+            errors.append({"index": n, "message": str(exc)})
+
+    item_ids = set(db.session.execute(
+        select(ItineraryItem.id).where(ItineraryItem.itinerary_id == itinerary.id)).scalars())
+    unknown = _unknown_destinations(op.destination_id for _, op in ops if op.kind == "add")
+    removed = set()
+    for n, op in ops:
+        if op.item_id is not None and (op.item_id not in item_ids or op.item_id in removed):
+            errors.append({"index": n, "message": f"item {op.item_id} is not a stop of this itinerary"})
+        elif op.destination_id in unknown:
+            errors.append({"index": n, "message": f"unknown destination {op.destination_id}"})
+        if op.kind == "remove":
+            removed.add(op.item_id)
+    if errors:
+        raise ValidationFailed("Some operations are invalid; nothing was changed.",
+                               sorted(errors, key=lambda e: e["index"]))
+    return [op for _, op in ops]
+
+
+def parse_version(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise BadRequest("version (the itinerary version the edits are based on) is required.") from None
+
+
+def apply(itinerary, ops, version):
+    """Apply parsed `ops` in one transaction if `itinerary` is still at `version`.
+
+    Raises VersionConflict (409) otherwise. Every write, including the
+    version claim, is rolled back if any operation fails. The stops are
+    written with Core statements, so the per-item version bumps in
+    versioning.py don't fire and the whole batch is one version step.
+    """
+    table = Itinerary.__table__
+    claimed = db.session.execute(
+        update(table)
+        .where(table.c.id == itinerary.id, table.c.version == version)
+        .values(version=table.c.version + 1, updated_at=datetime.utcnow())
+    ).rowcount
+    if not claimed:
+        db.session.rollback()
+        raise VersionConflict(db.session.scalar(select(table.c.version).where(table.c.id == itinerary.id)))
+    items = ItineraryItem.__table__
+    try:
+        connection = db.session.connection()
+        removed = [op.item_id for op in ops if op.kind == "remove"]
+        if removed:
+            connection.execute(delete(items).where(items.c.id.in_(removed)))
+        for op in ops:
+            if op.kind in ("move", "notes"):
+                values = {"day_number": op.day_number} if op.kind == "move" else {"notes": op.notes}
+                connection.execute(update(items).where(items.c.id == op.item_id).values(**values))
+        added = [{"itinerary_id": itinerary.id, "day_number": op.day_number,
+                  "destination_id": op.destination_id, "notes": op.notes}
+                 for op in ops if op.kind == "add"]
+        if added:
+            connection.execute(insert(items), added)
+        versioning.bump_table(connection, Itinerary.__tablename__)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
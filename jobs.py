@@ -0,0 +1,203 @@
+"""Background jobs backed by the application database.
+
+Request handlers call `enqueue()` inside their own transaction, so a job
+exists if and only if the change that needed it was committed. Worker
+processes (`flask run-worker`) claim due jobs with a conditional UPDATE,
+which is safe with several workers on SQLite or PostgreSQL, and retry
+failures with exponential backoff until `max_attempts` is reached. A job
+whose worker died counts as failed once its lease expires, and is retried
+or given up on the same way.
+"""
+import json
+import logging
+import multiprocessing
+import os
+import random
+import signal
+import socket
+import time
+import traceback
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import update
+
+from models import db, Job
+
+log = logging.getLogger(__name__)
+
+_handlers = {}
+
+
+def task(kind):
+    """Register a function as the handler for jobs of `kind`."""
+    def decorator(fn):
+        _handlers[kind] = fn
+        return fn
+    return decorator
+
+
+def enqueue(kind, **payload):
+    """Add a job to the current session; it is queued when the caller commits."""
+    if kind not in _handlers:
+        raise KeyError(f"No handler registered for job kind {kind!r}")
+    job = Job(
+        kind=kind,
+        payload=json.dumps(payload),
+        max_attempts=current_app.config["JOBS_MAX_ATTEMPTS"],
+        run_at=datetime.utcnow(),
+    )
+    db.session.add(job)
+    return job
+
+
+def backoff(attempts):
+    """Seconds to wait before retry number `attempts` (1-based), with jitter."""
+    config = current_app.config
+    delay = min(config["JOBS_BACKOFF_BASE"] * 2 ** (attempts - 1), config["JOBS_BACKOFF_MAX"])
+    return delay * random.uniform(0.8, 1.2)
+
+
+def _requeue_expired_leases(now):
+    """Retry jobs whose worker died, with backoff, or fail them after `max_attempts`.
+
+    A crash counts as a failed attempt, so a job that kills its worker is
+    not handed out forever.
+    """
+    cutoff = now - timedelta(seconds=current_app.config["JOBS_LEASE_SECONDS"])
+    expired = db.session.execute(
+        db.select(Job.id, Job.kind, Job.attempts, Job.max_attempts)
+        .where(Job.status == "running", Job.locked_at < cutoff)
+    ).all()
+    for job_id, kind, attempts, max_attempts in expired:
+        error = f"Lease expired during attempt {attempts}; the worker probably died."
+        if attempts >= max_attempts:
+            values = {"status": "failed", "finished_at": now}
+            log.error("Job %s (%s) lost its worker and failed permanently", job_id, kind)
+        else:
+            values = {"status": "queued", "run_at": now + timedelta(seconds=backoff(attempts))}
+            log.warning("Job %s (%s) lost its worker, retrying at %s", job_id, kind, values["run_at"])
+        # Conditional, in case another worker handled this lease meanwhile.
+        db.session.execute(
+            update(Job)
+            .where(Job.id == job_id, Job.status == "running", Job.locked_at < cutoff)
+            .values(locked_by=None, locked_at=None, last_error=error, **values)
+        )
+
+
+def claim(worker_id):
+    """Take the next due job for this worker, or return None."""
+    now = datetime.utcnow()
+    _requeue_expired_leases(now)
+    while True:
+        job_id = db.session.execute(
+            db.select(Job.id)
+            .where(Job.status == "queued", Job.run_at <= now)
+            .order_by(Job.run_at, Job.id)
+            .limit(1)
+        ).scalar()
+        if job_id is None:
+            db.session.commit()
+            return None
+        claimed = db.session.execute(
+            update(Job)
+            .where(Job.id == job_id, Job.status == "queued")
+            .values(status="running", locked_by=worker_id, locked_at=now,
+                    attempts=Job.attempts + 1)
+        ).rowcount
+        db.session.commit()
+        if claimed:
+            return db.session.get(Job, job_id)
+        # Another worker got there first; look again.
+
+
+def run(job):
+    try:
+        _handlers[job.kind](**json.loads(job.payload))
+    except Exception:
+        db.session.rollback()
+        job = db.session.get(Job, job.id)
+        job.last_error = traceback.format_exc(limit=20)
+        if job.attempts >= job.max_attempts:
+            job.status = "failed"
+            job.finished_at = datetime.utcnow()
+            log.error("Job %s (%s) failed permanently", job.id, job.kind)
+        else:
+            job.status = "queued"
+            job.run_at = datetime.utcnow() + timedelta(seconds=backoff(job.attempts))
+            log.warning("Job %s (%s) failed, retrying at %s", job.id, job.kind, job.run_at)
+    else:
+        job.status = "done"
+        job.last_error = None
+        job.finished_at = datetime.utcnow()
+    job.locked_by = job.locked_at = None
+    db.session.commit()
+    return job
+
+
+def run_pending(worker_id="inline", limit=None):
+    """Run due jobs in this process until none are left; returns how many ran."""
+    count = 0
+    while limit is None or count < limit:
+        job = claim(worker_id)
+        if job is None:
+            break
+        run(job)
+        count += 1
+    return count
+
+
+def work(worker_id, poll_interval, should_stop):
+    log.info("Worker %s started", worker_id)
+    while not should_stop():
+        if run_pending(worker_id) == 0:
+            time.sleep(poll_interval)
+    log.info("Worker %s stopped", worker_id)
+
+
+def _worker_main(worker_id, poll_interval):
+    from app import app
+
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda *_: stopping.append(True))
+    signal.signal(signal.SIGINT, lambda *_: stopping.append(True))
+    with app.app_context():
+        # Connections inherited from the parent must not be shared.
+        db.engine.dispose(close=False)
+        work(worker_id, poll_interval, lambda: bool(stopping))
+
+
+def run_workers(processes, poll_interval):
+    """Start `processes` worker processes and wait for them to exit."""
+    host = socket.gethostname()
+    workers = [
+        multiprocessing.Process(
+            target=_worker_main,
+            args=(f"{host}:{os.getpid()}:{n}", poll_interval),
+            name=f"yatra-worker-{n}",
+        )
+        for n in range(processes)
+    ]
+    for proc in workers:
+        proc.start()
+    try:
+        for proc in workers:
+            proc.join()
+    except KeyboardInterrupt:
+        for proc in workers:
+            proc.terminate()
+        for proc in workers:
+            proc.join()
+
+
+def status(job):
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts,
+        "run_at": job.run_at.isoformat(),
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        "last_error": job.last_error,
+    }
@@ -0,0 +1,88 @@
+"""Per-view loaders that fetch a page's whole object graph up front.
+
+Relationships in models.py are lazy, so a template that walks them issues one
+SELECT per row. Each function here picks an eager-loading strategy for the
+shape of one view: `joinedload` for many-to-one hops (one JOIN, no row
+explosion) and `selectinload` for collections (one extra IN query).
+
+Listings are returned as keyset pages (see pagination.py) over the orderings
+below.
+"""
+from datetime import datetime
+
+from sqlalchemy.orm import joinedload, load_only, selectinload
+
+from models import Destination, DestinationImage, DestinationNeighbour, Itinerary, ItineraryItem, Review
+from pagination import KeysetPage, key
+
+BY_REGION = [key(Destination.region), key(Destination.name), key(Destination.id)]
+BY_NAME = [key(Destination.name), key(Destination.id)]  # within one region
+BY_RATING = [key(Destination.rating_avg, desc=True), key(Destination.name), key(Destination.id)]
+BY_ID = [key(Destination.id)]
+NEWEST_FIRST = [
+    key(Review.created_at, desc=True, load=datetime.fromisoformat),
+    key(Review.id, desc=True),
+]
+
+
+def destination_detail(dest_id):
+    return (
+        Destination.query
+        .options(selectinload(Destination.images).selectinload(DestinationImage.variants))
+        .filter_by(id=dest_id)
+        .first_or_404()
+    )
+
+
+def similar_destinations(dest_id, limit):
+    """Precomputed "travellers also visited" neighbours (recommend.py), most similar first."""
+    return (
+        Destination.query
+        .join(DestinationNeighbour, DestinationNeighbour.neighbour_id == Destination.id)
+        .filter(DestinationNeighbour.destination_id == dest_id)
+        .order_by(DestinationNeighbour.rank)
+        .options(load_only(Destination.id, Destination.name, Destination.region,
+                           Destination.rating_avg, Destination.rating_count))
+        .limit(limit)
+        .all()
+    )
+
+
+def destination_reviews(dest_id, after=None, limit=20, stream=False):
+    query = Review.query.options(joinedload(Review.user)).filter_by(destination_id=dest_id)
+    return KeysetPage(query, NEWEST_FIRST, after, limit, stream)
+
+
+def admin_destinations(after=None, limit=20, stream=False):
+    query = Destination.query.options(selectinload(Destination.images))
+    return KeysetPage(query, BY_ID, after, limit, stream)
+
+
+def user_itineraries(user_id):
+    return (
+        Itinerary.query
+        .options(selectinload(Itinerary.items).joinedload(ItineraryItem.destination))
+        .filter_by(user_id=user_id)
+        .order_by(Itinerary.id)
+        .all()
+    )
+
+
+def user_itinerary(it_id):
+    """One itinerary with its stops and their destinations, or 404."""
+    return (
+        Itinerary.query
+        .options(selectinload(Itinerary.items).joinedload(ItineraryItem.destination))
+        .filter_by(id=it_id)
+        .first_or_404()
+    )
+
+
+def destination_choices():
+    """Id and name only, for the "add a day" dropdowns."""
+    return (
+        Destination.query
+        .options(load_only(Destination.id, Destination.name))
+        .order_by(Destination.name)
+        .all()
+    )
@@ -0,0 +1,195 @@
+"""Versioned schema migrations.
+
+models.py is the single source of truth for the schema. A fresh database is
+created straight from the models; an existing one is brought up to date by
+the numbered steps below, each of which is recorded in `schema_migrations`
+once applied. Steps are written against the models too (create what is
+missing, add missing columns, then backfill), so running them on any older
+database ends in exactly the schema `db.create_all()` would produce, and
+`drift()` reports anything that does not.
+
+Derived data that Core DDL cannot create (search and spatial indexes, rating
+aggregates) is rebuilt by the step that introduced it.
+"""
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import inspect, select, text
+
+import facets
+import geo
+import ratings
+import recommend
+import search
+from models import db, SchemaMigration
+
+Migration = namedtuple("Migration", "version description upgrade")
+
+# Indexes replaced by better-shaped ones and dropped by a later step.
+OBSOLETE_INDEXES = {"destinations": ["ix_destinations_rating_avg"]}
+
+
+# -- helpers -----------------------------------------------------------------
+
+def _literal(value):
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _column_ddl(connection, column):
+    dialect = connection.dialect
+    ddl = f"{dialect.identifier_preparer.format_column(column)} {column.type.compile(dialect)}"
+    default = column.default
+    if default is not None and default.is_scalar:
+        ddl += f" DEFAULT {_literal(default.arg)}"
+        if not column.nullable:
+            ddl += " NOT NULL"
+    return ddl
+
+
+def create_missing_tables(connection):
+    db.metadata.create_all(connection, checkfirst=True)
+
+
+def add_missing_columns(connection, *tables):
+    """ALTER TABLE ... ADD COLUMN for model columns the database lacks.
+
+    NOT NULL columns need a scalar default to be added to existing rows.
+    """
+    inspector = inspect(connection)
+    added = []
+    for table in tables:
+        have = {c["name"] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in have:
+                connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {_column_ddl(connection, column)}"))
+                added.append(f"{table.name}.{column.name}")
+    return added
+
+
+def create_missing_indexes(connection, *tables):
+    for table in tables:
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+
+
+def drop_obsolete_indexes(connection):
+    inspector = inspect(connection)
+    for table, names in OBSOLETE_INDEXES.items():
+        existing = {ix["name"] for ix in inspector.get_indexes(table)}
+        for name in names:
+            if name in existing:
+                connection.execute(text(f"DROP INDEX {name}"))
+
+
+def _tables(*names):
+    return [db.metadata.tables[name] for name in names]
+
+
+# -- steps -----------------------------------------------------------------
+
+def _0001_initial(connection):
+    create_missing_tables(connection)
+
+
+def _0002_derived_columns(connection):
+    """Version stamps, timestamps and rating aggregates on existing tables."""
+    add_missing_columns(connection, *_tables(
+        "users", "destinations", "destination_images", "itineraries", "itinerary_items", "reviews"))
+    search.rebuild_index()
+    geo.rebuild_index()
+    ratings.reconcile()
+
+
+def _0003_query_indexes(connection):
+    """Composite indexes matching the listing, detail and itinerary queries."""
+    drop_obsolete_indexes(connection)
+    create_missing_indexes(connection, *db.metadata.sorted_tables)
+
+
+def _0004_facet_lookups(connection):
+    """Region/category lookup tables with counts, referenced from destinations."""
+    create_missing_tables(connection)
+    add_missing_columns(connection, *_tables("destinations"))
+    create_missing_indexes(connection, *_tables("destinations"))
+    facets.rebuild()
+
+
+def _0005_rate_limit_buckets(connection):
+    """Shared token buckets for RATELIMIT_STORAGE=sql."""
+    create_missing_tables(connection)
+
+
+def _0006_destination_neighbours(connection):
+    """Top-K similar destinations per destination, refreshed by `flask recommend`."""
+    create_missing_tables(connection)
+    recommend.refresh(full=True)
+
+
+MIGRATIONS = [
+    Migration("0001", "create tables", _0001_initial),
+    Migration("0002", "derived columns and search/spatial indexes", _0002_derived_columns),
+    Migration("0003", "indexes for hot queries", _0003_query_indexes),
+    Migration("0004", "region and category facets", _0004_facet_lookups),
+    Migration("0005", "rate limit buckets", _0005_rate_limit_buckets),
+    Migration("0006", "destination neighbours", _0006_destination_neighbours),
+]
+
+
+# -- runner ----------------------------------------------------------------
+
+def applied():
+    connection = db.session.connection()
+    SchemaMigration.__table__.create(connection, checkfirst=True)
+    return set(connection.execute(select(SchemaMigration.version)).scalars())
+
+
+def pending():
+    done = applied()
+    return [m for m in MIGRATIONS if m.version not in done]
+
+
+def _record(migration):
+    db.session.add(SchemaMigration(version=migration.version, description=migration.description,
+                                   applied_at=datetime.utcnow()))
+
+
+def upgrade():
+    """Apply pending migrations in order; returns the ones that ran.
+
+    An empty database is created from the models directly and every step is
+    marked as applied.
+    """
+    fresh = not inspect(db.session.connection()).has_table("destinations")
+    todo = pending()
+    if fresh:
+        create_missing_tables(db.session.connection())
+        for migration in todo:
+            _record(migration)
+        db.session.commit()
+        return todo
+    for migration in todo:
+        migration.upgrade(db.session.connection())
+        _record(migration)
+        db.session.commit()
+    return todo
+
+
+def drift():
+    """Differences between the models and the connected database, as strings."""
+    inspector = inspect(db.session.connection())
+    problems = []
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            problems.append(f"missing table {table.name}")
+            continue
+        have = {c["name"] for c in inspector.get_columns(table.name)}
+        problems += [f"missing column {table.name}.{c.name}" for c in table.columns if c.name not in have]
+        indexes = {ix["name"] for ix in inspector.get_indexes(table.name)}
+        problems += [f"missing index {ix.name}" for ix in table.indexes if ix.name not in indexes]
+        problems += [f"obsolete index {name}" for name in OBSOLETE_INDEXES.get(table.name, [])
+                     if name in indexes]
+    return problems
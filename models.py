@@ -2,7 +2,9 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 from datetime import datetime
 
-db = SQLAlchemy()
+from database import RoutingSession
+
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 
 class User(UserMixin, db.Model):
     __tablename__ = "users"
@@ -18,6 +20,14 @@ class User(UserMixin, db.Model):
 
 class Destination(db.Model):
     __tablename__ = "destinations"
+    # Listing orders (loaders.BY_REGION / BY_RATING), so pages are index range scans
+    __table_args__ = (
+        db.Index("ix_destinations_region_name", "region", "name", "id"),
+        db.Index("ix_destinations_rating", db.text("rating_avg DESC"), "name", "id"),
+        # One region's page in name order, and the grouped facet counts (facets.py)
+        db.Index("ix_destinations_region_id_name", "region_id", "name", "id"),
+        db.Index("ix_destinations_category_region", "category_id", "region_id"),
+    )
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(150), nullable=False)
     region = db.Column(db.String(100))
@@ -27,44 +37,161 @@ class Destination(db.Model):
     longitude = db.Column(db.Numeric(9, 6))
     image_url = db.Column(db.String(255))
     highlights = db.Column(db.Text)
+    # Set from `region` / `category` on every write (facets.py); the names stay
+    # on the row for display, search and ordering.
+    region_id = db.Column(db.Integer, db.ForeignKey("regions.id"))
+    category_id = db.Column(db.Integer, db.ForeignKey("categories.id"))
+    # Bumped on any change to the destination, its images or its reviews (versioning.py)
+    version = db.Column(db.Integer, nullable=False, default=1)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Review aggregates, maintained incrementally by ratings.py
+    rating_count = db.Column(db.Integer, nullable=False, default=0)
+    rating_sum = db.Column(db.Integer, nullable=False, default=0)
+    rating_avg = db.Column(db.Float)
+    stars_1 = db.Column(db.Integer, nullable=False, default=0)
+    stars_2 = db.Column(db.Integer, nullable=False, default=0)
+    stars_3 = db.Column(db.Integer, nullable=False, default=0)
+    stars_4 = db.Column(db.Integer, nullable=False, default=0)
+    stars_5 = db.Column(db.Integer, nullable=False, default=0)
+
     images = db.relationship("DestinationImage", backref="destination", lazy=True)
 
 
     reviews = db.relationship("Review", backref="destination", lazy=True)
     itinerary_items = db.relationship("ItineraryItem", backref="destination", lazy=True)
 
+    @property
+    def rating_histogram(self):
+        """Review counts for 1..5 stars."""
+        return [self.stars_1, self.stars_2, self.stars_3, self.stars_4, self.stars_5]
+
+class Region(db.Model):
+    """Facet lookup; `destination_count` is maintained by facets.py."""
+    __tablename__ = "regions"
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), unique=True, nullable=False)
+    destination_count = db.Column(db.Integer, nullable=False, default=0)
+
+class Category(db.Model):
+    """Facet lookup; `destination_count` is maintained by facets.py."""
+    __tablename__ = "categories"
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), unique=True, nullable=False)
+    destination_count = db.Column(db.Integer, nullable=False, default=0)
+
 class DestinationImage(db.Model):
     __tablename__ = "destination_images"
 
     id = db.Column(db.Integer, primary_key=True)
-    destination_id = db.Column(db.Integer, db.ForeignKey("destinations.id"), nullable=False)
+    destination_id = db.Column(db.Integer, db.ForeignKey("destinations.id"), nullable=False, index=True)
     filename = db.Column(db.String(255), nullable=False)
     is_primary = db.Column(db.Boolean, default=False)
 
+    variants = db.relationship("ImageVariant", backref="image", lazy=True,
+                               cascade="all, delete-orphan", order_by="ImageVariant.width")
+
+class ImageVariant(db.Model):
+    """A resized/re-encoded copy of a DestinationImage (see images.py)."""
+    __tablename__ = "image_variants"
+
+    id = db.Column(db.Integer, primary_key=True)
+    image_id = db.Column(db.Integer, db.ForeignKey("destination_images.id"), nullable=False, index=True)
+    width = db.Column(db.Integer, nullable=False)
+    height = db.Column(db.Integer, nullable=False)
+    format = db.Column(db.String(10), nullable=False)
+    filename = db.Column(db.String(255), nullable=False)
+
 class Itinerary(db.Model):
     __tablename__ = "itineraries"
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False, index=True)
     title = db.Column(db.String(150), nullable=False)
     start_date = db.Column(db.Date)
     end_date = db.Column(db.Date)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Bumped on any change to the itinerary or its items (versioning.py)
+    version = db.Column(db.Integer, nullable=False, default=1)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     items = db.relationship("ItineraryItem", backref="itinerary", lazy=True, cascade="all, delete-orphan")
 
 class ItineraryItem(db.Model):
     __tablename__ = "itinerary_items"
+    __table_args__ = (db.Index("ix_itinerary_items_itinerary_day", "itinerary_id", "day_number"),)
+
     id = db.Column(db.Integer, primary_key=True)
     itinerary_id = db.Column(db.Integer, db.ForeignKey("itineraries.id"), nullable=False)
     day_number = db.Column(db.Integer, nullable=False)
     destination_id = db.Column(db.Integer, db.ForeignKey("destinations.id"), nullable=False)
     notes = db.Column(db.Text)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 class Review(db.Model):
     __tablename__ = "reviews"
+    __table_args__ = (
+        # A destination's reviews, newest first (loaders.NEWEST_FIRST)
+        db.Index("ix_reviews_destination_created", "destination_id", "created_at", "id"),
+        # Natural key used by bulk imports (bulk.py)
+        db.Index("ix_reviews_natural_key", "created_at", "user_id", "destination_id"),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False, index=True)
     destination_id = db.Column(db.Integer, db.ForeignKey("destinations.id"), nullable=False)
     rating = db.Column(db.Integer, nullable=False)
     comment = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class Job(db.Model):
+    """A unit of background work, run by `flask run-worker` (see jobs.py)."""
+    __tablename__ = "jobs"
+    __table_args__ = (db.Index("ix_jobs_status_run_at", "status", "run_at"),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(64), nullable=False)
+    payload = db.Column(db.Text, nullable=False, default="{}")
+    status = db.Column(db.String(16), nullable=False, default="queued")  # queued, running, done, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_by = db.Column(db.String(64))
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+class SchemaMigration(db.Model):
+    """An applied step from migrations.MIGRATIONS."""
+    __tablename__ = "schema_migrations"
+    version = db.Column(db.String(32), primary_key=True)
+    description = db.Column(db.String(200))
+    applied_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+class RateLimitBucket(db.Model):
+    """A token bucket for ratelimit.SQLStore."""
+    __tablename__ = "rate_limit_buckets"
+    key = db.Column(db.String(255), primary_key=True)
+    tokens = db.Column(db.Float, nullable=False)
+    updated_at = db.Column(db.Float, nullable=False)  # unix time
+
+class DestinationNeighbour(db.Model):
+    """One of a destination's precomputed "travellers also visited" entries (recommend.py)."""
+    __tablename__ = "destination_neighbours"
+    destination_id = db.Column(db.Integer, db.ForeignKey("destinations.id", ondelete="CASCADE"),
+                               primary_key=True)
+    rank = db.Column(db.Integer, primary_key=True)  # 0 = most similar
+    neighbour_id = db.Column(db.Integer, db.ForeignKey("destinations.id", ondelete="CASCADE"),
+                             nullable=False)
+    score = db.Column(db.Float, nullable=False)
+    support = db.Column(db.Integer, nullable=False)  # travellers with both destinations
+    computed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+class TableVersion(db.Model):
+    """Change counter per table, for cheap whole-listing ETags."""
+    __tablename__ = "table_versions"
+    name = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
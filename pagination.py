@@ -0,0 +1,149 @@
+"""Keyset (cursor) pagination.
+
+A page is fetched with `WHERE (k1, k2, ...) > (last k1, last k2, ...)` on the
+query's own ordering instead of OFFSET, so every page costs the same no matter
+how deep it is. The cursor handed to clients is the last row's key values,
+JSON-encoded and base64'd.
+
+Keys may be nullable: ascending keys sort NULLs first and descending keys
+sort NULLs last, on every database, and the predicate accounts for that.
+"""
+import base64
+import binascii
+import json
+from collections import namedtuple
+from datetime import datetime
+
+from flask import current_app, request, url_for
+from sqlalchemy import and_, false, or_
+from werkzeug.exceptions import BadRequest
+
+Key = namedtuple("Key", "expr attr desc load")
+
+
+class InvalidCursor(BadRequest):
+    description = "Invalid pagination cursor."
+
+
+def key(expr, attr=None, desc=False, load=None):
+    """An ordering key: column expression plus how to read it off a row."""
+    return Key(expr, attr or expr.key, desc, load)
+
+
+def _dump(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def encode_cursor(values):
+    raw = json.dumps([_dump(v) for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token, keys):
+    """Parse a cursor for `keys`; raises InvalidCursor (a 400) if it is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError) as exc:
+        raise InvalidCursor() from exc
+    if not isinstance(values, list) or len(values) != len(keys):
+        raise InvalidCursor()
+    try:
+        return [k.load(v) if k.load and v is not None else v for k, v in zip(keys, values)]
+    except (TypeError, ValueError) as exc:
+        raise InvalidCursor() from exc
+
+
+def _order_by(k):
+    return k.expr.desc().nulls_last() if k.desc else k.expr.asc().nulls_first()
+
+
+def _equal(k, value):
+    return k.expr.is_(None) if value is None else k.expr == value
+
+
+def _beyond(k, value):
+    if k.desc:
+        return false() if value is None else or_(k.expr < value, k.expr.is_(None))
+    return k.expr.isnot(None) if value is None else k.expr > value
+
+
+def after_predicate(keys, values):
+    """Rows strictly after `values` in the ordering given by `keys`."""
+    clauses = []
+    for i, k in enumerate(keys):
+        prefix = [_equal(prev, v) for prev, v in zip(keys[:i], values[:i])]
+        clauses.append(and_(*prefix, _beyond(k, values[i])))
+    return or_(*clauses)
+
+
+class KeysetPage:
+    """One page of `query` ordered by `keys`, starting after cursor `after`.
+
+    With `stream=True` rows are pulled from the database in batches while the
+    page is iterated (for `stream_template`); `next_cursor` is then only
+    known once iteration has finished, which is fine for a link rendered
+    after the loop.
+    """
+
+    def __init__(self, query, keys, after=None, limit=20, stream=False, batch_size=100):
+        self.keys = keys
+        self.limit = limit
+        self.stream = stream
+        query = query.order_by(*(_order_by(k) for k in keys))
+        if after:
+            query = query.filter(after_predicate(keys, decode_cursor(after, keys)))
+        self._query = query.limit(limit + 1)
+        self._batch_size = batch_size
+        self._last = None
+        self.has_more = False
+        self._items = None if stream else self._collect(self._query.all())
+
+    def _collect(self, rows):
+        rows = list(rows)
+        self.has_more = len(rows) > self.limit
+        rows = rows[:self.limit]
+        self._last = rows[-1] if rows else None
+        return rows
+
+    def _stream(self):
+        for n, row in enumerate(self._query.yield_per(self._batch_size)):
+            if n == self.limit:
+                self.has_more = True
+                break
+            self._last = row
+            yield row
+
+    def __iter__(self):
+        return iter(self._items) if self._items is not None else self._stream()
+
+    def __bool__(self):
+        return bool(self._items) if self._items is not None else True
+
+    @property
+    def next_cursor(self):
+        if not self.has_more or self._last is None:
+            return None
+        return encode_cursor([getattr(self._last, k.attr) for k in self.keys])
+
+
+def page_args():
+    """Read `after`, `limit` and `stream` from the query string."""
+    config = current_app.config
+    stream = request.args.get("stream") == "1"
+    max_size = config["MAX_STREAM_PAGE_SIZE"] if stream else config["MAX_PAGE_SIZE"]
+    try:
+        limit = int(request.args.get("limit", config["PAGE_SIZE"]))
+    except ValueError:
+        limit = config["PAGE_SIZE"]
+    return request.args.get("after") or None, max(1, min(limit, max_size)), stream
+
+
+def next_page_url(page):
+    """URL of the page after `page`, keeping the other query arguments."""
+    cursor = page.next_cursor
+    if not cursor:
+        return None
+    args = request.args.to_dict()
+    args["after"] = cursor
+    return url_for(request.endpoint, **(request.view_args or {}), **args)
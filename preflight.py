@@ -0,0 +1,69 @@
+"""Worker start-up: template bytecode cache and pre-traffic warm-up.
+
+Jinja compiles a template to Python source and then to bytecode the first
+time it is rendered in a process, so every fresh worker pays that on its
+first requests. With TEMPLATE_CACHE_DIR set, compiled bytecode is kept on
+disk and shared by every worker (entries are keyed on the template source,
+so an edited template is simply recompiled).
+
+`run()` compiles every template into that cache and then requests
+PREFLIGHT_PATHS in-process, which opens database connections, compiles the
+hot queries' SQL, pages the database file into the OS cache and fills the
+page cache. Run it once per deploy with `flask preflight` before starting
+the server (shared caches: bytecode, filesystem or Redis page cache), or
+from the server's post-fork hook so each worker also warms its own
+in-process caches, e.g. for gunicorn:
+
+    def post_worker_init(worker):
+        import preflight
+        preflight.run(worker.wsgi)
+"""
+import os
+import time
+
+from jinja2 import FileSystemBytecodeCache
+
+import auth
+
+
+def init_app(app):
+    directory = app.config["TEMPLATE_CACHE_DIR"]
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory)
+
+
+def compile_templates(app):
+    """Load every template once, writing its bytecode cache entry; returns the count."""
+    names = app.jinja_env.list_templates()
+    for name in names:
+        app.jinja_env.get_template(name)
+    return len(names)
+
+
+def warm(app, paths=None):
+    """GET each path in-process; returns [(path, status code, seconds)]."""
+    client = app.test_client()
+    results = []
+    for path in paths if paths is not None else app.config["PREFLIGHT_PATHS"]:
+        started = time.perf_counter()
+        response = client.get(path)
+        response.get_data()
+        results.append((path, response.status_code, time.perf_counter() - started))
+    return results
+
+
+def run(app, paths=None):
+    """Compile templates and warm up; returns [(step, detail, seconds)]."""
+    steps = []
+    with app.app_context():
+        started = time.perf_counter()
+        count = compile_templates(app)
+        steps.append(("templates", f"{count} compiled", time.perf_counter() - started))
+
+        started = time.perf_counter()
+        auth.get_hasher().burn("")  # starts the pool and makes the unknown-email hash
+        steps.append(("password hasher", "ready", time.perf_counter() - started))
+
+        steps += [(f"GET {path}", status, seconds) for path, status, seconds in warm(app, paths)]
+    return steps
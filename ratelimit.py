@@ -0,0 +1,217 @@
+"""Token-bucket rate limits for write-heavy and CPU-heavy routes.
+
+Each limit in RATE_LIMITS is "N/period" (second, minute, hour, day): a
+bucket holds up to N tokens, refills at N per period, and every request
+takes one. Buckets are keyed by the logged-in user, or by client address
+for anonymous requests (put the app behind werkzeug's ProxyFix if a proxy
+sets X-Forwarded-For). A request that finds its bucket empty gets a 429
+with a Retry-After header saying when the next token arrives.
+
+Buckets live in RATELIMIT_STORAGE:
+
+* `memory` - per process; fine for a single worker,
+* `sql` - the `rate_limit_buckets` table, one atomic upsert per check, so
+  every worker sharing the database shares the limits,
+* `redis` - any Redis-protocol server, one Lua call per check,
+* `null` - never limits.
+
+The check runs on its own connection and commits at once, so a request
+that later fails still spends its token.
+"""
+import math
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, request
+from flask_login import current_user
+from sqlalchemy import func, select
+from werkzeug.exceptions import TooManyRequests
+
+from models import db, RateLimitBucket
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+
+class Limit:
+    def __init__(self, capacity, period):
+        self.capacity = capacity
+        self.period = period
+        self.rate = capacity / period  # tokens per second
+
+    @classmethod
+    def parse(cls, spec):
+        count, _, period = spec.partition("/")
+        try:
+            return cls(int(count), PERIODS[period.strip().rstrip("s")])
+        except (KeyError, ValueError):
+            raise ValueError(f"Bad rate limit {spec!r}; expected e.g. '10/minute'") from None
+
+    def __repr__(self):
+        return f"<Limit {self.capacity} per {self.period}s>"
+
+
+def _refill(tokens, updated, limit, now):
+    return min(limit.capacity, tokens + (now - updated) * limit.rate)
+
+
+def _retry_after(tokens, limit):
+    return max(1, math.ceil(round((1 - tokens) / limit.rate, 6)))
+
+
+class Store:
+    """Token buckets; `hit(key, limit, now=None)` returns (allowed, retry_after seconds)."""
+
+    def reset(self):
+        pass
+
+
+class NullStore(Store):
+    def hit(self, key, limit, now=None):
+        return True, 0
+
+
+class MemoryStore(Store):
+    def __init__(self, max_keys=100_000):
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._buckets = {}  # key -> (tokens, updated)
+
+    def hit(self, key, limit, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (limit.capacity, now))
+            tokens = _refill(tokens, updated, limit, now)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            if len(self._buckets) >= self.max_keys and key not in self._buckets:
+                self._buckets.clear()  # crude, but bounded; a full bucket is the default anyway
+            self._buckets[key] = (tokens, now)
+        return allowed, 0 if allowed else _retry_after(tokens, limit)
+
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class SQLStore(Store):
+    """Buckets in the `rate_limit_buckets` table (SQLite 3.24+ or PostgreSQL)."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        if engine.dialect.name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+            self._insert, self._min = insert, func.least
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+            self._insert, self._min = insert, func.min
+
+    def hit(self, key, limit, now=None):
+        now = time.time() if now is None else now
+        table = RateLimitBucket.__table__
+        refilled = self._min(limit.capacity, table.c.tokens + (now - table.c.updated_at) * limit.rate)
+        # Take a token in one statement: insert a new bucket, or update an
+        # existing one only if it has a token to give.
+        stmt = self._insert(table).values(key=key, tokens=limit.capacity - 1, updated_at=now)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.key],
+            set_={"tokens": refilled - 1, "updated_at": now},
+            where=refilled >= 1,
+        )
+        with self.engine.begin() as connection:
+            if connection.execute(stmt).rowcount:
+                return True, 0
+            tokens, updated = connection.execute(
+                select(table.c.tokens, table.c.updated_at).where(table.c.key == key)).one()
+        return False, _retry_after(_refill(tokens, updated, limit, now), limit)
+
+    def reset(self):
+        with self.engine.begin() as connection:
+            connection.execute(RateLimitBucket.__table__.delete())
+
+
+class RedisStore(Store):
+    """Any server speaking the Redis protocol; the bucket logic runs as a Lua script."""
+
+    SCRIPT = """
+    local capacity, rate, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+    local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+    local tokens = tonumber(bucket[1]) or capacity
+    local updated = tonumber(bucket[2]) or now
+    tokens = math.min(capacity, tokens + (now - updated) * rate)
+    local allowed = 0
+    if tokens >= 1 then tokens = tokens - 1; allowed = 1 end
+    redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+    redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+    return {allowed, tostring(tokens)}
+    """
+
+    def __init__(self, url, prefix="yatra:ratelimit:"):
+        import redis  # only needed for this backend
+
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self._script = self.client.register_script(self.SCRIPT)
+
+    def hit(self, key, limit, now=None):
+        now = time.time() if now is None else now
+        allowed, tokens = self._script(keys=[self.prefix + key], args=[limit.capacity, limit.rate, now])
+        if allowed:
+            return True, 0
+        return False, _retry_after(float(tokens), limit)
+
+    def reset(self):
+        for key in self.client.scan_iter(self.prefix + "*"):
+            self.client.delete(key)
+
+
+def make_store(config, engine=None):
+    kind = config["RATELIMIT_STORAGE"]
+    if kind == "memory":
+        return MemoryStore()
+    if kind == "sql":
+        return SQLStore(engine if engine is not None else db.engine)
+    if kind == "redis":
+        return RedisStore(config["RATELIMIT_REDIS_URL"])
+    if kind == "null":
+        return NullStore()
+    raise ValueError(f"Unknown RATELIMIT_STORAGE {kind!r}")
+
+
+def get_store(app=None):
+    app = app or current_app
+    store = app.extensions.get("ratelimit")
+    if store is None:
+        store = app.extensions["ratelimit"] = make_store(app.config)
+    return store
+
+
+def client_key():
+    if current_user.is_authenticated:
+        return f"user:{current_user.get_id()}"
+    return f"ip:{request.remote_addr}"
+
+
+def check(name, key=None):
+    """Spend a token from limit `name` for this client; raises 429 when out of tokens."""
+    spec = current_app.config["RATE_LIMITS"].get(name)
+    if not spec:
+        return
+    limit = Limit.parse(spec)
+    allowed, retry_after = get_store().hit(f"{name}:{key or client_key()}", limit)
+    if not allowed:
+        raise TooManyRequests(f"Too many requests; try again in {retry_after} seconds.",
+                              retry_after=retry_after)
+
+
+def limit(name, methods=("POST",), key=None):
+    """Apply limit `name` to the view for `methods`; `key()` overrides the client key."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method in methods:
+                check(name, key() if key else None)
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,101 @@
+"""Stored rating aggregates for destinations.
+
+Each destination row carries its review count, rating sum, mean and a 1-5 star
+histogram. Review mapper events adjust them with a single UPDATE inside the
+flush that writes or deletes the review, so the aggregate commits (or rolls
+back) together with it. `reconcile()` recomputes everything from the reviews
+table for backfills and drift repair.
+"""
+from sqlalchemy import case, event, func, inspect, update
+
+from models import db, Destination, Review
+
+STARS = range(1, 6)
+
+
+def _star_column(rating):
+    return getattr(Destination.__table__.c, f"stars_{rating}")
+
+
+def _adjust(connection, dest_id, rating, delta):
+    table = Destination.__table__
+    values = {
+        table.c.rating_count: table.c.rating_count + delta,
+        table.c.rating_sum: table.c.rating_sum + delta * rating,
+        table.c.rating_avg: case(
+            (table.c.rating_count + delta > 0,
+             (table.c.rating_sum + delta * rating) * 1.0 / (table.c.rating_count + delta)),
+            else_=None,
+        ),
+    }
+    if rating in STARS:
+        star = _star_column(rating)
+        values[star] = star + delta
+    connection.execute(update(table).where(table.c.id == dest_id).values(values))
+
+
+@event.listens_for(Review, "after_insert")
+def _review_added(mapper, connection, target):
+    _adjust(connection, target.destination_id, target.rating, 1)
+
+
+@event.listens_for(Review, "after_delete")
+def _review_removed(mapper, connection, target):
+    _adjust(connection, target.destination_id, target.rating, -1)
+
+
+@event.listens_for(Review, "after_update")
+def _review_changed(mapper, connection, target):
+    state = inspect(target)
+    rating = state.attrs.rating.history
+    dest = state.attrs.destination_id.history
+    if not (rating.has_changes() or dest.has_changes()):
+        return
+    old_rating = rating.deleted[0] if rating.deleted else target.rating
+    old_dest = dest.deleted[0] if dest.deleted else target.destination_id
+    _adjust(connection, old_dest, old_rating, -1)
+    _adjust(connection, target.destination_id, target.rating, 1)
+
+
+def reconcile():
+    """Recompute every destination's aggregate from the reviews table.
+
+    Returns the number of destinations whose stored values were wrong.
+    """
+    aggregates = db.session.execute(
+        db.select(
+            Review.destination_id,
+            func.count(Review.id),
+            func.coalesce(func.sum(Review.rating), 0),
+            *(func.sum(case((Review.rating == s, 1), else_=0)) for s in STARS),
+        ).group_by(Review.destination_id)
+    )
+    expected = {row[0]: tuple(row[1:]) for row in aggregates}
+
+    stored = db.session.execute(
+        db.select(
+            Destination.id,
+            Destination.rating_avg,
+            Destination.rating_count,
+            Destination.rating_sum,
+            *(_star_column(s) for s in STARS),
+        )
+    )
+    empty = (0, 0) + (0,) * len(STARS)
+    fixes = []
+    for dest_id, avg, *current in stored:
+        want = expected.get(dest_id, empty)
+        count, total, *stars = want
+        want_avg = total / count if count else None
+        avg_ok = avg == want_avg or (avg is not None and want_avg is not None
+                                     and abs(avg - want_avg) < 1e-9)
+        if tuple(current) == want and avg_ok:
+            continue
+        row = {"id": dest_id, "rating_count": count, "rating_sum": total, "rating_avg": want_avg}
+        row.update({f"stars_{s}": n for s, n in zip(STARS, stars)})
+        fixes.append(row)
+
+    if fixes:
+        db.session.execute(update(Destination), fixes)
+    db.session.commit()
+    return len(fixes)
@@ -0,0 +1,229 @@
+"""Item-item "travellers also visited" recommendations.
+
+Each traveller is a sparse vector over destinations: 1 for a destination on
+any of their itineraries, plus (rating - 2) / 3 for their review of it (a
+5-star review adds 1, a 1-star review takes a third off); entries that end
+up at or below zero are dropped. Two destinations are as similar as the
+cosine of their columns, and only count once RECOMMEND_MIN_SUPPORT
+travellers share them. The RECOMMEND_TOP_K most similar destinations are
+stored per destination in `destination_neighbours`, so the detail page
+reads them with one primary-key range scan.
+
+The matrix product is computed over sparse (traveller, destination, weight)
+arrays with NumPy: entries are sorted by traveller, each entry is paired
+with the other entries of its traveller, and the pair products are summed
+per destination pair with `bincount`. Pairs are generated in chunks of
+PAIR_CHUNK so memory stays bounded however prolific a traveller is.
+
+`flask recommend` is meant to run on a schedule. By default it only
+recomputes the rows of destinations held by travellers whose reviews or
+itineraries changed since the last run (when it started, kept as the
+`destination_neighbours` entry in `table_versions`, so a run that writes
+no rows still counts); other
+rows keep their scores, which may drift slightly as norms change, and a
+deleted review or itinerary is only reflected by a `--full` run, e.g.
+nightly. Destinations whose list changed get their version bumped so their
+cached pages and ETags are refreshed. Deleting a destination removes its
+rows, and the rows naming it, at once.
+"""
+from datetime import datetime
+
+import numpy as np
+from flask import current_app
+from sqlalchemy import delete, event, func, insert, or_, select
+
+import cache
+import versioning
+from models import (db, Destination, DestinationNeighbour, Itinerary, ItineraryItem, Review,
+                    TableVersion)
+
+PAIR_CHUNK = 2_000_000
+IN_CHUNK = 500  # ids per IN (...) list
+
+
+def _chunks(ids, size=IN_CHUNK):
+    ids = [int(i) for i in ids]
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+# -- computation ---------------------------------------------------------------
+
+def signals():
+    """(traveller ids, destination ids, weights), sorted by traveller then destination."""
+    planned = db.session.execute(
+        select(Itinerary.user_id, ItineraryItem.destination_id)
+        .join(Itinerary, Itinerary.id == ItineraryItem.itinerary_id)
+        .distinct()
+    ).all()
+    rated = db.session.execute(
+        select(Review.user_id, Review.destination_id, func.avg(Review.rating))
+        .group_by(Review.user_id, Review.destination_id)
+    ).all()
+    if not planned and not rated:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, np.empty(0)
+
+    users = np.array([row[0] for row in planned] + [row[0] for row in rated], dtype=np.int64)
+    items = np.array([row[1] for row in planned] + [row[1] for row in rated], dtype=np.int64)
+    weights = np.concatenate([np.ones(len(planned)),
+                              (np.array([row[2] for row in rated], dtype=float) - 2) / 3])
+
+    stride = int(items.max()) + 1
+    keys, inverse = np.unique(users * stride + items, return_inverse=True)
+    totals = np.bincount(inverse, weights=weights)
+    keep = totals > 0
+    return keys[keep] // stride, keys[keep] % stride, totals[keep]
+
+
+def _pairs(users, items, rows):
+    """Yield index arrays (i, j) of entries with the same traveller and i != j.
+
+    Only entries whose destination is in `rows` (every entry if None) are
+    used as `i`. Each yield holds at most about PAIR_CHUNK pairs.
+    """
+    starts = np.flatnonzero(np.r_[True, users[1:] != users[:-1]])
+    sizes = np.diff(np.r_[starts, len(users)])
+    left = np.arange(len(users))
+    if rows is not None:
+        left = left[np.isin(items, rows)]
+    group = np.searchsorted(starts, left, side="right") - 1
+    counts = sizes[group]
+    ends = np.cumsum(counts)
+    lo = 0
+    while lo < len(left):
+        hi = max(lo + 1, int(np.searchsorted(ends, ends[lo] - counts[lo] + PAIR_CHUNK, side="right")))
+        n = counts[lo:hi]
+        i = np.repeat(left[lo:hi], n)
+        offsets = np.arange(len(i)) - np.repeat(np.cumsum(n) - n, n)
+        j = np.repeat(starts[group[lo:hi]], n) + offsets
+        keep = i != j
+        yield i[keep], j[keep]
+        lo = hi
+
+
+def similarities(users, items, weights, rows=None, min_support=2, top_k=10):
+    """Top-k neighbours of each destination in `rows` (every destination if None).
+
+    Takes the arrays from `signals()`. Returns arrays (destination,
+    neighbour, score, support) ordered by destination, then rank.
+    """
+    stride = int(items.max()) + 1 if len(items) else 1
+    norms = np.sqrt(np.bincount(items, weights=weights ** 2, minlength=stride))
+    keys, dots, support = [], [], []
+    for i, j in _pairs(users, items, rows):
+        chunk_keys, inverse = np.unique(items[i] * stride + items[j], return_inverse=True)
+        keys.append(chunk_keys)
+        dots.append(np.bincount(inverse, weights=weights[i] * weights[j]))
+        support.append(np.bincount(inverse))
+    if not keys:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, np.empty(0), empty
+
+    # Chunks can repeat a pair; merge them.
+    keys, inverse = np.unique(np.concatenate(keys), return_inverse=True)
+    dots = np.bincount(inverse, weights=np.concatenate(dots))
+    support = np.bincount(inverse, weights=np.concatenate(support)).astype(np.int64)
+
+    a, b = keys // stride, keys % stride
+    score = dots / (norms[a] * norms[b])
+    keep = support >= min_support
+    a, b, score, support = a[keep], b[keep], score[keep], support[keep]
+
+    order = np.lexsort((b, -score, a))
+    a, b, score, support = a[order], b[order], score[order], support[order]
+    starts = np.flatnonzero(np.r_[True, a[1:] != a[:-1]]) if len(a) else np.empty(0, dtype=np.int64)
+    rank = np.arange(len(a)) - np.repeat(starts, np.diff(np.r_[starts, len(a)]))
+    keep = rank < top_k
+    return a[keep], b[keep], score[keep], support[keep]
+
+
+# -- storage -------------------------------------------------------------------
+
+def _changed_travellers(since):
+    reviewed = select(Review.user_id).where(Review.updated_at > since)
+    planned = select(Itinerary.user_id).where(or_(Itinerary.updated_at > since,
+                                                  Itinerary.created_at > since))
+    return np.array(db.session.execute(reviewed.union(planned)).scalars().all(), dtype=np.int64)
+
+
+def _last_run():
+    versions = TableVersion.__table__
+    return db.session.scalar(select(versions.c.updated_at).where(
+        versions.c.name == DestinationNeighbour.__tablename__))
+
+
+def _stored(connection, rows):
+    """{destination id: [neighbour ids]} as stored, for `rows` (all if None)."""
+    table = DestinationNeighbour.__table__
+    stmt = select(table.c.destination_id, table.c.neighbour_id).order_by(
+        table.c.destination_id, table.c.rank)
+    batches = [stmt] if rows is None else [stmt.where(table.c.destination_id.in_(ids))
+                                           for ids in _chunks(rows)]
+    stored = {}
+    for batch in batches:
+        for dest_id, neighbour_id in connection.execute(batch):
+            stored.setdefault(dest_id, []).append(neighbour_id)
+    return stored
+
+
+def refresh(full=False):
+    """Recompute stored neighbours (only for changed travellers' destinations unless `full`).
+
+    Returns (destinations whose list changed, neighbour rows written).
+    """
+    config = current_app.config
+    table = DestinationNeighbour.__table__
+    started = datetime.utcnow()
+    since = None if full else _last_run()
+
+    users, items, weights = signals()
+    rows = None
+    if since is not None:
+        rows = np.unique(items[np.isin(users, _changed_travellers(since))])
+        if not len(rows):
+            versioning.bump_table(db.session.connection(), table.name, now=started)
+            db.session.commit()
+            return 0, 0
+    dest, neighbour, score, support = similarities(
+        users, items, weights, rows, config["RECOMMEND_MIN_SUPPORT"], config["RECOMMEND_TOP_K"])
+
+    connection = db.session.connection()
+    before = _stored(connection, rows)
+    if rows is None:
+        connection.execute(delete(table))
+    else:
+        for ids in _chunks(rows):
+            connection.execute(delete(table).where(table.c.destination_id.in_(ids)))
+
+    after = {}
+    records = []
+    for d, n, s, c in zip(dest.tolist(), neighbour.tolist(), score.tolist(), support.tolist()):
+        ranked = after.setdefault(d, [])
+        records.append({"destination_id": d, "rank": len(ranked), "neighbour_id": n,
+                        "score": s, "support": c, "computed_at": started})
+        ranked.append(n)
+    if records:
+        connection.execute(insert(table), records)
+
+    changed = [d for d in before.keys() | after.keys() if before.get(d) != after.get(d)]
+    for ids in _chunks(changed):
+        versioning.bump_rows(connection, Destination, ids)
+    versioning.bump_table(connection, table.name, now=started)  # records this run
+    db.session.commit()
+    if changed:
+        cache.invalidate()
+    return len(changed), len(records)
+
+
+@event.listens_for(Destination, "after_delete")
+def _destination_deleted(mapper, connection, target):
+    # The foreign keys cascade on PostgreSQL; SQLite doesn't enforce them.
+    table = DestinationNeighbour.__table__
+    listed_by = connection.execute(
+        select(table.c.destination_id).where(table.c.neighbour_id == target.id)).scalars().all()
+    connection.execute(delete(table).where(
+        or_(table.c.destination_id == target.id, table.c.neighbour_id == target.id)))
+    listed_by = set(listed_by) - {target.id}
+    if listed_by:
+        versioning.bump_rows(connection, Destination, listed_by)
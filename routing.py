@@ -0,0 +1,118 @@
+"""Itinerary route optimisation.
+
+Stops are reordered to shorten the total travel distance of an open route
+that starts at the itinerary's current first stop: a nearest-neighbour tour
+is improved with 2-opt until no reversal helps or the time budget runs out.
+Each 2-opt sweep evaluates all reversals for a given start position in one
+NumPy expression, which keeps 100+ stop itineraries interactive.
+
+The existing day numbers are kept as a multiset and handed out in the new
+order, so an itinerary with two stops on day 1 still has two stops on day 1.
+Stops without coordinates keep their relative order at the end.
+"""
+import time
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+
+import geo
+
+Proposal = namedtuple("Proposal", "assignments km_before km_after")
+
+
+def route_length(matrix, route):
+    route = np.asarray(route)
+    return float(matrix[route[:-1], route[1:]].sum()) if len(route) > 1 else 0.0
+
+
+def nearest_neighbour(matrix, start=0):
+    n = len(matrix)
+    visited = np.zeros(n, dtype=bool)
+    route = [start]
+    visited[start] = True
+    for _ in range(n - 1):
+        distances = np.where(visited, np.inf, matrix[route[-1]])
+        nxt = int(np.argmin(distances))
+        route.append(nxt)
+        visited[nxt] = True
+    return route
+
+
+def two_opt(matrix, route, deadline=None):
+    """Improve an open route with a fixed first stop, in place of `route`.
+
+    A phantom stop at zero distance from everything is appended so the open
+    end needs no special case.
+    """
+    n = len(route)
+    if n < 4:
+        return list(route)
+    padded = np.zeros((n + 1, n + 1))
+    padded[:n, :n] = matrix
+    r = np.array(list(route) + [n])
+
+    improved = True
+    while improved:
+        improved = False
+        for i in range(1, n - 1):
+            if deadline is not None and time.perf_counter() > deadline:
+                return [int(x) for x in r[:-1]]
+            j = np.arange(i + 1, n)
+            a, b = r[i - 1], r[i]
+            c, d = r[j], r[j + 1]
+            delta = padded[a, c] + padded[b, d] - padded[a, b] - padded[c, d]
+            best = int(np.argmin(delta))
+            if delta[best] < -1e-9:
+                k = j[best]
+                r[i:k + 1] = r[i:k + 1][::-1].copy()
+                improved = True
+    return [int(x) for x in r[:-1]]
+
+
+@lru_cache(maxsize=256)
+def _solve(points, time_budget):
+    """Visiting order (indices into `points`) starting from points[0]."""
+    lats, lons = zip(*points)
+    matrix = geo.pairwise_km(lats, lons)
+    deadline = time.perf_counter() + time_budget if time_budget else None
+    return tuple(two_opt(matrix, nearest_neighbour(matrix), deadline))
+
+
+def solve(points, time_budget=None):
+    """Order (lat, lon) points for a short open route starting at points[0].
+
+    Results are memoised on the exact point sequence.
+    """
+    if len(points) < 3:
+        return list(range(len(points)))
+    return list(_solve(tuple(points), time_budget))
+
+
+def propose(itinerary, time_budget=None):
+    """Suggested day numbers for an itinerary's items.
+
+    Returns a Proposal whose `assignments` is a list of (item, new_day) in
+    the new visiting order.
+    """
+    items = sorted(itinerary.items, key=lambda it: (it.day_number, it.id))
+    located = [it for it in items
+               if it.destination.latitude is not None and it.destination.longitude is not None]
+    unlocated = [it for it in items if it not in located]
+
+    # Canonical order (start first, then by destination) so the memo key only
+    # depends on which destinations are in the itinerary.
+    start, rest = located[:1], sorted(located[1:], key=lambda it: (it.destination_id, it.id))
+    located = start + rest
+    points = [(float(it.destination.latitude), float(it.destination.longitude)) for it in located]
+    order = solve(points, time_budget)
+
+    matrix = geo.pairwise_km(*zip(*points)) if len(points) > 1 else np.zeros((1, 1))
+    before = [located.index(it) for it in items if it in located]
+    new_order = [located[i] for i in order] + unlocated
+    days = sorted(it.day_number for it in items)
+    return Proposal(
+        assignments=list(zip(new_order, days)),
+        km_before=route_length(matrix, before),
+        km_after=route_length(matrix, order),
+    )
@@ -0,0 +1,140 @@
+"""Full-text search over destinations.
+
+On SQLite the catalogue is mirrored into an FTS5 virtual table whose rowid is
+the destination id. Mapper events keep it in step with every insert, update
+and delete that goes through the ORM; `rebuild_index()` repopulates it from
+scratch (used by the `rebuild-search-index` CLI command).
+
+Other databases fall back to the old ILIKE filter.
+"""
+import re
+
+from sqlalchemy import DDL, event, inspect, text
+
+from models import db, Destination
+
+FTS_TABLE = "destinations_fts"
+INDEXED_FIELDS = ("name", "description", "region")
+
+# bm25() weights, in INDEXED_FIELDS order: a hit in the name counts most.
+RANK_WEIGHTS = (10.0, 1.0, 5.0)
+
+_CREATE_FTS = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "name, description, region, "
+    "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+)
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+event.listen(Destination.__table__, "after_create", DDL(_CREATE_FTS).execute_if(dialect="sqlite"))
+event.listen(
+    Destination.__table__,
+    "before_drop",
+    DDL(f"DROP TABLE IF EXISTS {FTS_TABLE}").execute_if(dialect="sqlite"),
+)
+
+
+def _is_sqlite(connection):
+    return connection.dialect.name == "sqlite"
+
+
+def _row(target):
+    return {
+        "id": target.id,
+        "name": target.name or "",
+        "description": target.description or "",
+        "region": target.region or "",
+    }
+
+
+def _insert_row(connection, target):
+    connection.execute(
+        text(
+            f"INSERT INTO {FTS_TABLE} (rowid, name, description, region) "
+            "VALUES (:id, :name, :description, :region)"
+        ),
+        _row(target),
+    )
+
+
+def _delete_row(connection, dest_id):
+    connection.execute(text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :id"), {"id": dest_id})
+
+
+@event.listens_for(Destination, "after_insert")
+def _index_inserted(mapper, connection, target):
+    if _is_sqlite(connection):
+        _insert_row(connection, target)
+
+
+@event.listens_for(Destination, "after_update")
+def _index_updated(mapper, connection, target):
+    if not _is_sqlite(connection):
+        return
+    state = inspect(target)
+    if not any(state.attrs[field].history.has_changes() for field in INDEXED_FIELDS):
+        return
+    _delete_row(connection, target.id)
+    _insert_row(connection, target)
+
+
+@event.listens_for(Destination, "after_delete")
+def _index_deleted(mapper, connection, target):
+    if _is_sqlite(connection):
+        _delete_row(connection, target.id)
+
+
+def match_expression(q):
+    """Turn free text into an FTS5 query: every word must match as a prefix."""
+    tokens = _TOKEN_RE.findall(q.lower())
+    return " ".join(f'"{token}"*' for token in tokens)
+
+
+def search(query, q):
+    """Restrict a Destination query to matches for `q`, best matches first."""
+    if db.session.get_bind().dialect.name != "sqlite":
+        like = f"%{q}%"
+        return query.filter(
+            (Destination.name.ilike(like)) |
+            (Destination.description.ilike(like)) |
+            (Destination.region.ilike(like))
+        ).order_by(Destination.region, Destination.name)
+
+    expression = match_expression(q)
+    if not expression:
+        return query.filter(db.false())
+
+    weights = ", ".join(str(w) for w in RANK_WEIGHTS)
+    hits = (
+        text(
+            f"SELECT rowid AS destination_id, bm25({FTS_TABLE}, {weights}) AS score "
+            f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match"
+        )
+        .bindparams(match=expression)
+        .columns(destination_id=db.Integer, score=db.Float)
+        .subquery("search_hits")
+    )
+    return (
+        query.join(hits, hits.c.destination_id == Destination.id)
+        .order_by(hits.c.score, Destination.name)
+    )
+
+
+def rebuild_index():
+    """Recreate the FTS table from the destinations table. Returns the row count."""
+    connection = db.session.connection()
+    if not _is_sqlite(connection):
+        return 0
+    connection.execute(text(_CREATE_FTS))
+    connection.execute(text(f"DELETE FROM {FTS_TABLE}"))
+    connection.execute(
+        text(
+            f"INSERT INTO {FTS_TABLE} (rowid, name, description, region) "
+            "SELECT id, name, coalesce(description, ''), coalesce(region, '') FROM destinations"
+        )
+    )
+    connection.execute(text(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')"))
+    count = connection.execute(text(f"SELECT count(*) FROM {FTS_TABLE}")).scalar()
+    db.session.commit()
+    return count
@@ -5,7 +5,14 @@ PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 if PROJECT_ROOT not in sys.path:
     sys.path.insert(0, PROJECT_ROOT)
 
+# Engines are created when the app module is imported, so the test database
+# has to be chosen before that rather than in the fixture.
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
 from app import app as flask_app, db
+import auth
+import cache
+import ratelimit
 
 
 @pytest.fixture
@@ -15,10 +22,12 @@ def app():
     Returns a Flask app configured for testing with an in-memory SQLite DB.
     """
     flask_app.config["TESTING"] = True
-    flask_app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
 
     with flask_app.app_context():
         db.create_all()
+        cache.get_cache().clear()
+        auth.get_identity_cache().clear()
+        ratelimit.get_store().reset()
         yield flask_app
         db.session.remove()
         db.drop_all()
@@ -30,3 +39,26 @@ def client(app):
     Test client that uses the app fixture.
     """
     return app.test_client()
+
+
+@pytest.fixture
+def login(client):
+    """
+    Creates a user and logs the test client in as them.
+    """
+    from werkzeug.security import generate_password_hash
+    from models import User
+
+    def _login(email="traveller@example.com", password="secret123", is_admin=False):
+        user = User(
+            name=email.split("@")[0],
+            email=email,
+            password_hash=generate_password_hash(password),
+            is_admin=is_admin,
+        )
+        db.session.add(user)
+        db.session.commit()
+        client.post("/login", data={"email": email, "password": password})
+        return user
+
+    return _login
@@ -0,0 +1,116 @@
+from app import db
+from instrumentation import count_queries
+from models import Destination, Itinerary
+
+
+def _destinations():
+    rows = [Destination(name=n, region=r, category="Heritage", description="...", latitude=lat, longitude=lon)
+            for n, r, lat, lon in [("Bhaktapur", "Kathmandu Valley", 27.67, 85.43),
+                                   ("Patan", "Kathmandu Valley", 27.67, 85.32),
+                                   ("Sarangkot", "Pokhara", 28.24, 83.95)]]
+    db.session.add_all(rows)
+    db.session.commit()
+    return rows
+
+
+def test_destination_list_sparse_fields_and_paging(app, client):
+    _destinations()
+    with count_queries() as counter:
+        resp = client.get("/api/v1/destinations?fields=name,latitude&limit=2")
+    assert resp.json["data"] == [{"id": 1, "name": "Bhaktapur", "latitude": 27.67},
+                                 {"id": 2, "name": "Patan", "latitude": 27.67}]
+    listing = [s for s in counter.statements if "FROM destinations" in s][-1]
+    assert "description" not in listing
+
+    resp = client.get(f"/api/v1/destinations?fields=name&limit=2&after={resp.json['next']}")
+    assert resp.json == {"data": [{"id": 3, "name": "Sarangkot"}], "next": None}
+
+    resp = client.get("/api/v1/destinations?ids=3,99,1&fields=name")
+    assert [d["name"] for d in resp.json["data"]] == ["Sarangkot", "Bhaktapur"]
+
+    resp = client.get("/api/v1/destinations?fields=name,password")
+    assert resp.status_code == 400
+    assert "password" in resp.json["error"]["message"]
+
+
+def test_destination_detail_with_reviews(app, client, login):
+    _destinations()
+    assert client.post("/api/v1/destinations/2/reviews", json={"rating": 5}).status_code == 401
+
+    login()
+    resp = client.post("/api/v1/destinations/2/reviews", json={"rating": 4, "comment": "Lovely"})
+    assert resp.status_code == 201
+    assert resp.json["data"]["user"]["name"] == "traveller"
+    assert client.post("/api/v1/destinations/2/reviews", json={"rating": 9}).status_code == 400
+
+    resp = client.get("/api/v1/destinations/2?include=reviews&fields=name,rating_avg,rating_histogram")
+    assert resp.json["data"] == {"id": 2, "name": "Patan", "rating_avg": 4.0,
+                                 "rating_histogram": [0, 0, 0, 1, 0]}
+    assert [r["comment"] for r in resp.json["reviews"]["data"]] == ["Lovely"]
+
+    # Anonymous clients (no pending flash messages) get validators.
+    anonymous = app.test_client()
+    etag = anonymous.get("/api/v1/destinations/2?include=reviews&fields=name,rating_avg,rating_histogram").headers["ETag"]
+    again = anonymous.get("/api/v1/destinations/2?include=reviews&fields=name,rating_avg,rating_histogram",
+                       headers={"If-None-Match": etag})
+    assert again.status_code == 304
+
+
+def test_itinerary_title_is_coerced_to_text(app, client, login):
+    login()
+    resp = client.post("/api/v1/itineraries", json={"title": 123})
+    assert resp.status_code == 201
+    assert resp.json["data"]["title"] == "123"
+
+
+def test_itinerary_batch_items(app, client, login):
+    _destinations()
+    login()
+    resp = client.post("/api/v1/itineraries", json={
+        "title": "Valley loop", "start_date": "2025-03-01",
+        "items": [{"day_number": 1, "destination_id": 1}, {"day_number": 2, "destination_id": 2}],
+    })
+    assert resp.status_code == 201
+    it_id = resp.json["data"]["id"]
+    assert [i["destination_name"] for i in resp.json["data"]["items"]] == ["Bhaktapur", "Patan"]
+
+    # One bad entry rejects the whole batch.
+    resp = client.post(f"/api/v1/itineraries/{it_id}/items",
+                       json={"items": [{"day_number": 3, "destination_id": 3},
+                                       {"day_number": 4, "destination_id": 42}]})
+    assert resp.status_code == 400
+    assert resp.json["error"]["errors"] == [{"index": 1, "message": "unknown destination 42"}]
+    assert len(db.session.get(Itinerary, it_id).items) == 2
+
+    with count_queries() as counter:
+        resp = client.post(f"/api/v1/itineraries/{it_id}/items",
+                           json=[{"day_number": 3, "destination_id": 3, "notes": "Sunrise"},
+                                 {"day_number": 4, "destination_id": 1}])
+    assert resp.status_code == 201
+    assert [i["day_number"] for i in resp.json["data"]] == [3, 4]
+    assert sum(s.startswith("INSERT INTO itinerary_items") for s in counter.statements) <= 2
+
+    resp = client.get("/api/v1/itineraries?fields=title,items")
+    (itinerary,) = resp.json["data"]
+    assert itinerary["title"] == "Valley loop"
+    assert [i["destination_name"] for i in itinerary["items"]] == ["Bhaktapur", "Patan", "Sarangkot", "Bhaktapur"]
+
+
+def test_api_login_and_ownership(app, client, login):
+    _destinations()
+    other = login(email="other@example.com")
+    db.session.add(Itinerary(user_id=other.id, title="Theirs"))
+    db.session.commit()
+    client.get("/logout")
+
+    resp = client.post("/api/v1/login", json={"email": "traveller@example.com", "password": "nope"})
+    assert resp.status_code == 401
+    login()  # creates the user through the HTML form
+    client.post("/api/v1/logout")
+    assert client.get("/api/v1/me").status_code == 401
+    resp = client.post("/api/v1/login", json={"email": "traveller@example.com", "password": "secret123"})
+    assert resp.json["data"]["email"] == "traveller@example.com"
+
+    resp = client.post("/api/v1/itineraries/1/items", json=[{"destination_id": 1}])
+    assert resp.status_code == 403
+    assert resp.json["error"]["status"] == 403
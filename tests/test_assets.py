@@ -0,0 +1,53 @@
+import gzip
+import shutil
+
+import pytest
+from flask import url_for
+
+import assets
+
+
+@pytest.fixture
+def built(app, tmp_path):
+    """Build fingerprinted assets from a copy of static/ and serve from it."""
+    static = tmp_path / "static"
+    shutil.copytree(app.static_folder, static)
+    previous = app.static_folder
+    app.static_folder = str(static)
+    app.extensions["asset_manifest"] = assets.build(str(static))
+    yield static
+    app.static_folder = previous
+    app.extensions["asset_manifest"] = assets.load_manifest(previous)
+
+
+def test_manifest_fingerprints_by_content(built):
+    manifest = assets.load_manifest(str(built))
+    hashed = manifest["css/style.css"]
+    assert hashed.startswith("dist/css/style.") and hashed.endswith(".css")
+    assert (built / hashed).read_bytes() == (built / "css/style.css").read_bytes()
+    assert gzip.decompress((built / (hashed + ".gz")).read_bytes()) == (built / hashed).read_bytes()
+    assert not any(k.startswith("dist/") for k in manifest)
+
+
+def test_url_for_and_serving(app, client, built):
+    with app.test_request_context():
+        url = url_for("static", filename="css/style.css")
+    assert "/static/dist/css/style." in url
+    assert url in client.get("/").get_data(as_text=True)
+
+    resp = client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert resp.status_code == 200
+    assert resp.headers["Content-Encoding"] == "gzip"
+    assert resp.mimetype == "text/css"
+    assert "immutable" in resp.headers["Cache-Control"]
+    assert "max-age=31536000" in resp.headers["Cache-Control"]
+
+    plain = client.get(url)
+    assert "Content-Encoding" not in plain.headers
+    assert plain.data == (built / "css/style.css").read_bytes()
+
+
+def test_unfingerprinted_files_keep_default_headers(app, client):
+    resp = client.get("/static/css/style.css")
+    assert resp.status_code == 200
+    assert "immutable" not in resp.headers.get("Cache-Control", "")
@@ -0,0 +1,64 @@
+from werkzeug.security import generate_password_hash
+
+import auth
+from app import db
+from instrumentation import count_queries
+from models import User
+
+
+def test_identity_is_cached_until_user_changes(app, login):
+    user = login()
+    user_id = str(user.id)
+    auth.get_identity_cache().clear()
+
+    with count_queries() as counter:
+        first = auth.load_user(user_id)
+        again = auth.load_user(user_id)
+    assert counter.count == 1
+    assert again is first and not first.is_admin
+    assert not hasattr(first, "password_hash")
+
+    user.is_admin = True
+    db.session.commit()
+    with count_queries() as counter:
+        assert auth.load_user(user_id).is_admin
+    assert counter.count == 1
+
+
+def test_identity_expires(app):
+    identities = auth.IdentityCache(ttl=-1)
+    identities.put(auth.SessionUser(1, "a", "a@example.com", False))
+    assert identities.get(1) is None
+
+
+def test_login_upgrades_hash(app, client):
+    db.session.add(User(name="a", email="a@example.com",
+                        password_hash=generate_password_hash("secret", "pbkdf2:sha256:1000")))
+    db.session.commit()
+
+    resp = client.post("/login", data={"email": "a@example.com", "password": "secret"})
+    assert resp.status_code == 302
+    user = User.query.filter_by(email="a@example.com").one()
+    assert user.password_hash.startswith(app.config["PASSWORD_HASH_METHOD"] + "$")
+
+    client.get("/logout")
+    resp = client.post("/login", data={"email": "a@example.com", "password": "wrong"})
+    assert b"Invalid email or password" in resp.data
+
+
+def test_method_without_parameters_does_not_rehash_every_time():
+    hasher = auth.Hasher("pbkdf2", workers=1, queue=1)
+    assert not hasher.needs_rehash(hasher.hash("secret"))
+    assert hasher.needs_rehash(generate_password_hash("secret", "pbkdf2:sha256:1000"))
+
+
+def test_login_burst_is_turned_away(app, client, monkeypatch):
+    hasher = auth.Hasher(app.config["PASSWORD_HASH_METHOD"], workers=1, queue=0)
+    monkeypatch.setitem(app.extensions, "password_hasher", hasher)
+    hasher._slots.acquire()  # the only slot is busy
+    try:
+        resp = client.post("/login", data={"email": "a@example.com", "password": "secret"})
+    finally:
+        hasher._slots.release()
+    assert resp.status_code == 503
+    assert resp.headers["Retry-After"]
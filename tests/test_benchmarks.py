@@ -0,0 +1,33 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "benchmarks"))
+
+import datagen  # noqa: E402
+import harness  # noqa: E402
+from models import Destination, Itinerary, ItineraryItem, Review, User  # noqa: E402
+
+
+def test_datagen_is_seeded(app):
+    volumes = datagen.Volumes(users=5, destinations=20, reviews=100, itineraries=3, items=4)
+    datagen.generate(volumes, seed=7)
+
+    assert User.query.count() == 5
+    assert Destination.query.count() == 20
+    assert Review.query.count() == 100
+    assert ItineraryItem.query.count() == 12
+    assert Itinerary.query.order_by(Itinerary.id).first().user.email == datagen.BENCH_EMAIL
+    assert sum(d.rating_count for d in Destination.query) == 100
+
+    rng_a, rng_b = (datagen.np.random.default_rng(7) for _ in range(2))
+    assert list(datagen.destination_records(3, rng_a)) == list(datagen.destination_records(3, rng_b))
+
+
+def test_baseline_comparison():
+    baseline = {"home": {"p50_ms": 2.0, "queries": 1}, "all": {"rps": 100.0}}
+    assert harness.compare({"home": {"p50_ms": 2.4, "queries": 1}, "all": {"rps": 90.0}},
+                           baseline, 1.25) == []
+    problems = harness.compare({"home": {"p50_ms": 3.0, "queries": 2}, "all": {"rps": 70.0},
+                                "new": {"p50_ms": 99.0}}, baseline, 1.25)
+    assert len(problems) == 3
+    assert all(p.startswith(("home:", "all:")) for p in problems)
@@ -0,0 +1,130 @@
+import json
+from datetime import datetime
+
+from app import db
+from models import Destination, DestinationImage, Review, User
+import bulk
+import search
+
+
+def _write(path, text):
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def test_import_destinations_upserts_by_name(app, tmp_path):
+    csv_path = _write(tmp_path / "dest.csv", (
+        "name,region,category,description,latitude,longitude,images,primary_image\n"
+        "Phewa Lake,Pokhara,Lake,Boating,28.2153,83.9456,phewa.jpg;phewa2.jpg,phewa2.jpg\n"
+        "Rara Lake,Karnali,Lake,Remote,29.5272,82.0850,,\n"
+        ",Nowhere,,,,,,\n"
+    ))
+    result, errors = bulk.import_destinations(bulk.read_records(csv_path), chunk_size=2)
+    assert result == bulk.ImportResult(inserted=2, updated=0, skipped=1)
+    assert errors == [(3, "name is required")]
+
+    phewa = Destination.query.filter_by(name="Phewa Lake").one()
+    assert {(i.filename, i.is_primary) for i in phewa.images} == {("phewa.jpg", False), ("phewa2.jpg", True)}
+    # Core inserts bypass mapper events; the import rebuilds the indexes.
+    assert [d.name for d in search.search(Destination.query, "rara")] == ["Rara Lake"]
+
+    jsonl_path = _write(tmp_path / "dest.jsonl", json.dumps(
+        {"name": "Phewa Lake", "region": "Pokhara", "description": "Sunset boating",
+         "images": ["phewa.jpg", "phewa3.jpg"]}) + "\n")
+    result, _ = bulk.import_destinations(bulk.read_records(jsonl_path))
+    assert result == bulk.ImportResult(inserted=0, updated=1, skipped=0)
+    db.session.expire_all()
+    assert phewa.description == "Sunset boating" and phewa.version == 2
+    assert DestinationImage.query.filter_by(destination_id=phewa.id).count() == 3
+
+
+def test_reviews_roundtrip_and_aggregates(app, tmp_path):
+    user = User(name="A", email="a@example.com", password_hash="x")
+    dest = Destination(name="Lumbini", description="...")
+    db.session.add_all([user, dest])
+    db.session.commit()
+
+    jsonl = "".join(json.dumps(r) + "\n" for r in [
+        {"user_email": "A@example.com", "destination": "Lumbini", "rating": 5,
+         "comment": "Calm", "created_at": "2024-03-01T10:00:00"},
+        {"user_email": "a@example.com", "destination": "Lumbini", "rating": 3,
+         "created_at": "2024-03-02T10:00:00Z"},
+        {"user_email": "ghost@example.com", "destination": "Lumbini", "rating": 4,
+         "created_at": "2024-03-03T10:00:00"},
+        {"user_email": "a@example.com", "destination": "Lumbini", "rating": 9,
+         "created_at": "2024-03-04T10:00:00"},
+    ])
+    path = _write(tmp_path / "reviews.jsonl", jsonl)
+    result, errors = bulk.import_reviews(bulk.read_records(path))
+    assert result == bulk.ImportResult(inserted=2, updated=0, skipped=2)
+    assert len(errors) == 1
+    db.session.expire_all()
+    assert (dest.rating_count, dest.rating_avg, dest.stars_5) == (2, 4.0, 1)
+
+    # Re-importing the same file changes nothing but counts updates.
+    result, _ = bulk.import_reviews(bulk.read_records(path))
+    assert (result.inserted, result.updated) == (0, 2)
+    assert Review.query.count() == 2
+
+    out = str(tmp_path / "out.csv")
+    assert bulk.write_records(bulk.export_reviews(batch_size=1), out, bulk.REVIEW_FIELDS) == 2
+    exported = list(bulk.read_records(out))
+    assert [(r["user_email"], r["rating"]) for r in exported] == [("a@example.com", "5"), ("a@example.com", "3")]
+
+
+def test_review_timestamps_with_an_offset_are_stored_as_utc(app, tmp_path):
+    db.session.add_all([User(name="A", email="a@example.com", password_hash="x"),
+                        Destination(name="Lumbini", description="...")])
+    db.session.commit()
+    path = _write(tmp_path / "reviews.jsonl", json.dumps(
+        {"user_email": "a@example.com", "destination": "Lumbini", "rating": 4,
+         "created_at": "2024-01-01T10:00+05:45"}) + "\n")
+    bulk.import_reviews(bulk.read_records(path))
+    assert Review.query.one().created_at == datetime(2024, 1, 1, 4, 15)
+
+
+def test_cli_export_import_destinations(app, tmp_path):
+    db.session.add(Destination(name="Chitwan", region="Terai", latitude=27.5, longitude=84.4,
+                               description="Jungle"))
+    db.session.commit()
+    runner = app.test_cli_runner()
+    out = str(tmp_path / "d.jsonl")
+    runner.invoke(args=["export-destinations", out])
+    record = json.loads(open(out).read())
+    assert record["name"] == "Chitwan" and record["latitude"] == 27.5 and record["images"] == []
+
+    result = runner.invoke(args=["import-destinations", out])
+    assert "Inserted 0, updated 1, skipped 0." in result.output
+
+
+def test_malformed_lines_are_reported_and_the_rest_imported(app, tmp_path):
+    path = _write(tmp_path / "dest.jsonl", "\n".join([
+        json.dumps({"name": "Gosaikunda", "region": "Langtang"}),
+        '{"name": "Tilicho",',
+        "[1, 2]",
+        '"Mustang"',
+        json.dumps({"name": "Rara Lake", "region": "Karnali"}),
+    ]) + "\n")
+    result, errors = bulk.import_destinations(bulk.read_records(path), chunk_size=1)
+    assert result == bulk.ImportResult(inserted=2, updated=0, skipped=3)
+    assert [n for n, _ in errors] == [2, 3, 4]
+    assert errors[0][1].startswith("invalid JSON") and errors[1][1] == "each record must be an object"
+    assert [d.name for d in search.search(Destination.query, "rara")] == ["Rara Lake"]
+
+
+def test_partial_records_only_update_their_fields(app, tmp_path):
+    db.session.add(Destination(name="Bandipur", region="Tanahun", category="Town",
+                               latitude=27.93, longitude=84.41, description="Hilltop bazaar"))
+    db.session.commit()
+    path = _write(tmp_path / "dest.jsonl", "".join(json.dumps(r) + "\n" for r in [
+        {"name": "Bandipur", "description": "Newar hill town"},
+        {"name": "Bandipur", "highlights": "Tundikhel"},
+        {"name": "Ghandruk", "region": "Kaski"},
+    ]))
+    result, _ = bulk.import_destinations(bulk.read_records(path))
+    assert result == bulk.ImportResult(inserted=1, updated=1, skipped=0)
+
+    bandipur = Destination.query.filter_by(name="Bandipur").one()
+    assert (bandipur.description, bandipur.highlights) == ("Newar hill town", "Tundikhel")
+    assert (bandipur.category, float(bandipur.latitude), bandipur.region) == ("Town", 27.93, "Tanahun")
+    assert Destination.query.filter_by(name="Ghandruk").one().category is None
@@ -0,0 +1,88 @@
+import time
+
+from app import db
+from instrumentation import count_queries
+from models import Destination, Review
+import cache
+
+
+def test_anonymous_pages_cached_until_data_changes(app, client):
+    db.session.add(Destination(name="Pokhara", region="Gandaki", description="..."))
+    db.session.commit()
+
+    assert client.get("/destinations").headers["X-Cache"] == "MISS"
+    with count_queries() as counter:
+        resp = client.get("/destinations")
+    assert resp.headers["X-Cache"] == "HIT"
+    assert counter.count == 1  # just the ETag version stamp
+
+    db.session.add(Destination(name="Chitwan", region="Bagmati", description="..."))
+    db.session.commit()
+    resp = client.get("/destinations")
+    assert resp.headers["X-Cache"] == "MISS"
+    assert b"Chitwan" in resp.data
+
+
+def test_query_args_are_normalised(app, client):
+    client.get("/destinations?region=Gandaki&q=")
+    assert client.get("/destinations?q=&region=Gandaki").headers["X-Cache"] == "HIT"
+    assert client.get("/destinations?region=Bagmati").headers["X-Cache"] == "MISS"
+
+
+def test_review_invalidates_detail_page(app, client, login):
+    dest = Destination(name="Lumbini", description="...")
+    db.session.add(dest)
+    db.session.commit()
+    client.get(f"/destinations/{dest.id}")
+
+    user = login()
+    db.session.add(Review(user_id=user.id, destination_id=dest.id, rating=5, comment="Peaceful"))
+    db.session.commit()
+    client.get("/logout")
+    client.get("/")  # consume the "Logged out." flash
+
+    resp = client.get(f"/destinations/{dest.id}")
+    assert resp.headers["X-Cache"] == "MISS"
+    assert b"Peaceful" in resp.data
+
+
+def test_logged_in_users_bypass_page_cache_but_share_fragments(app, client, login):
+    db.session.add(Destination(name="Bhaktapur", description="..."))
+    db.session.commit()
+    login()
+    client.get("/")
+
+    with count_queries() as counter:
+        resp = client.get("/")
+    assert "X-Cache" not in resp.headers
+    assert b"Bhaktapur" in resp.data
+    assert not any("FROM destinations" in s for s in counter.statements)
+
+
+def test_memory_backend_lru_and_ttl():
+    backend = cache.MemoryBackend(max_entries=2)
+    backend.set("a", b"1", ttl=60)
+    backend.set("b", b"2", ttl=60)
+    backend.get("a")
+    backend.set("c", b"3", ttl=60)
+    assert backend.get("b") is None
+    assert backend.get("a") == b"1"
+
+    backend.set("d", b"4", ttl=-1)
+    assert backend.get("d") is None
+    assert backend.stats() == {"hits": 2, "misses": 2, "evictions": 3}
+
+
+def test_filesystem_backend(tmp_path):
+    backend = cache.FileSystemBackend(str(tmp_path), max_entries=2)
+    backend.set("a", b"<html>", ttl=60)
+    assert backend.get("a") == b"<html>"
+
+    generation = backend.generation()
+    time.sleep(0.001)
+    backend.bump_generation()
+    assert backend.generation() != generation
+
+    backend.set("b", b"x", ttl=60)
+    backend.set("c", b"y", ttl=60)
+    assert backend.stats()["evictions"] == 1
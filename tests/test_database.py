@@ -0,0 +1,65 @@
+from flask import Flask, flash
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import text
+
+from config import Config
+import database
+
+
+def test_engine_options_by_backend():
+    assert database.normalise_url("postgres://u:p@h/db") == "postgresql://u:p@h/db"
+    opts = database.engine_options("postgresql://u:p@h/db", Config.__dict__)
+    assert opts["pool_pre_ping"] is True and opts["pool_size"] == Config.DB_POOL_SIZE
+    assert "pool_size" not in database.engine_options("sqlite:///x.db", Config.__dict__)
+
+
+def _make_app(tmp_path):
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{tmp_path / 'primary.db'}"
+    app.config["DATABASE_REPLICA_URL"] = f"sqlite:///{tmp_path / 'replica.db'}"
+    db = SQLAlchemy(session_options={"class_": database.RoutingSession})
+    database.init_app(app, db)
+    with app.app_context():
+        for engine, where in ((db.engine, "primary"), (db.engines[database.REPLICA], "replica")):
+            with engine.begin() as conn:
+                conn.execute(text("CREATE TABLE place (name TEXT)"))
+                conn.execute(text("INSERT INTO place VALUES (:n)"), {"n": where})
+    return app, db
+
+
+def test_sqlite_pragmas(tmp_path):
+    app, db = _make_app(tmp_path)
+    with app.app_context():
+        pragmas = {p: db.session.execute(text(f"PRAGMA {p}")).scalar()
+                   for p in ("journal_mode", "synchronous", "busy_timeout")}
+    assert pragmas == {"journal_mode": "wal", "synchronous": 1,
+                       "busy_timeout": Config.SQLITE_BUSY_TIMEOUT_MS}
+
+
+def test_read_replica_routing(tmp_path):
+    app, db = _make_app(tmp_path)
+    app.secret_key = "test"
+
+    @app.route("/where", methods=["GET", "POST"])
+    @database.read_replica
+    def where():
+        return db.session.execute(text("SELECT name FROM place")).scalar()
+
+    @app.route("/written")
+    def written():
+        flash("Saved.")
+        return "ok"
+
+    @app.route("/orm")
+    @database.read_replica
+    def orm():
+        return db.session.execute(db.select(text("name")).select_from(text("place"))).scalar()
+
+    client = app.test_client()
+    assert client.get("/orm").text == "replica"
+    # Raw SQL strings and non-GET requests stay on the primary.
+    assert client.get("/where").text == "primary"
+    assert client.post("/where").text == "primary"
+    client.get("/written")
+    assert client.get("/orm").text == "primary"
@@ -0,0 +1,89 @@
+from sqlalchemy import text
+
+import facets
+import migrations
+from app import db
+from models import Category, Destination, Region
+
+
+def _add(name, region, category):
+    d = Destination(name=name, region=region, category=category, description="...")
+    db.session.add(d)
+    db.session.commit()
+    return d
+
+
+def _counts(model):
+    return {r.name: r.destination_count for r in model.query}
+
+
+def test_counts_follow_destination_writes(app):
+    a = _add("Phewa Lake", "Gandaki", "Lake")
+    _add("Sarangkot", " gandaki ", "Viewpoint")
+    b = _add("Chitwan", "Bagmati", "Wildlife")
+    assert _counts(Region) == {"Gandaki": 2, "Bagmati": 1}
+    assert Destination.query.filter_by(name="Sarangkot").one().region == "Gandaki"
+    assert a.region_id == Region.query.filter_by(name="Gandaki").one().id
+
+    b.region = "Gandaki"
+    a.category = None
+    db.session.commit()
+    assert _counts(Region) == {"Gandaki": 3, "Bagmati": 0}
+    assert _counts(Category) == {"Lake": 0, "Viewpoint": 1, "Wildlife": 1}
+    assert a.category_id is None
+
+    db.session.delete(b)
+    db.session.commit()
+    assert _counts(Region)["Gandaki"] == 2
+
+    # Drift from Core writes is repaired by rebuild().
+    db.session.execute(text("UPDATE destinations SET region = 'Lumbini', region_id = NULL WHERE name = 'Phewa Lake'"))
+    facets.rebuild()
+    assert _counts(Region) == {"Gandaki": 1, "Bagmati": 0, "Lumbini": 1}
+    assert migrations.drift() == []
+
+
+def test_facet_counts_respect_the_other_filter(app):
+    for name, region, category in [("A", "Gandaki", "Lake"), ("B", "Gandaki", "Trek"),
+                                   ("C", "Bagmati", "Lake"), ("D", "Bagmati", "Temple"),
+                                   ("E", "Bagmati", "Temple")]:
+        _add(name, region, category)
+
+    unfiltered = facets.counts()
+    assert [(v.name, v.count) for v in unfiltered.regions] == [("Bagmati", 3), ("Gandaki", 2)]
+
+    lake = facets.selected_ids(Category, "lake")
+    result = facets.counts(None, lake)
+    assert [(v.name, v.count) for v in result.regions] == [("Bagmati", 1), ("Gandaki", 1)]
+    # Category counts ignore the category filter itself.
+    assert [(v.name, v.count, v.selected) for v in result.categories] == [
+        ("Lake", 2, True), ("Temple", 2, False), ("Trek", 1, False)]
+
+    gandaki = facets.selected_ids(Region, "Gandaki")
+    assert [v.name for v in facets.counts(gandaki, None).categories] == ["Lake", "Trek"]
+
+
+def test_listing_filters_by_facet(app, client):
+    _add("Phewa Lake", "Gandaki", "Lake")
+    _add("Chitwan", "Bagmati", "Wildlife")
+    _add("Rara", "Karnali", "Lake")
+
+    page = client.get("/destinations?category=Lake").text
+    assert "Phewa Lake" in page and "Rara" in page and "Chitwan" not in page
+    assert "Gandaki (1)" in page and "Lake (2)" in page and "Wildlife (1)" in page
+
+    # Free text that is not a facet name still matches as before.
+    page = client.get("/destinations?region=gand").text
+    assert "Phewa Lake" in page and "Rara" not in page
+    assert "Chitwan" not in client.get("/destinations?region=Nowhere").text
+
+    body = client.get("/api/v1/destinations?category=Lake&facets=1&fields=name").json
+    assert [d["name"] for d in body["data"]] == ["Phewa Lake", "Rara"]
+    assert {v["name"]: v["count"] for v in body["facets"]["regions"]} == {"Gandaki": 1, "Karnali": 1}
+
+
+def test_grouped_counts_use_covering_index(app):
+    plan = db.session.execute(text(
+        "EXPLAIN QUERY PLAN SELECT region_id, category_id, count(*) FROM destinations "
+        "GROUP BY region_id, category_id")).all()
+    assert any("COVERING INDEX ix_destinations_category_region" in row[3] for row in plan)
@@ -0,0 +1,60 @@
+import math
+
+from app import db
+from models import Destination
+import geo
+
+
+def _seed():
+    places = {
+        "Kathmandu Durbar Square": (27.704590, 85.307600),
+        "Pashupatinath Temple": (27.710440, 85.348890),
+        "Bhaktapur Durbar Square": (27.672900, 85.429800),
+        "Pokhara Lakeside": (28.209600, 83.985600),
+        "No Coordinates": (None, None),
+    }
+    dests = {name: Destination(name=name, latitude=lat, longitude=lon, description="...")
+             for name, (lat, lon) in places.items()}
+    db.session.add_all(dests.values())
+    db.session.commit()
+    return dests
+
+
+def test_haversine_matches_known_distance():
+    # Kathmandu -> Pokhara is roughly 140 km as the crow flies.
+    km = geo.haversine_km(27.7046, 85.3076, [28.2096], [83.9856])[0]
+    assert 135 < km < 145
+    assert math.isclose(geo.haversine_km(10, 20, [10], [20])[0], 0, abs_tol=1e-9)
+
+
+def test_nearby_sorted_and_bounded(app, client):
+    dests = _seed()
+    origin = dests["Kathmandu Durbar Square"]
+
+    results = geo.nearby(27.704590, 85.307600, 20, exclude_id=origin.id)
+    assert [d.name for d, _ in results] == ["Pashupatinath Temple", "Bhaktapur Durbar Square"]
+    assert results[0][1] < results[1][1] < 20
+
+    resp = client.get(f"/destinations/{origin.id}/nearby?km=200")
+    names = [d["name"] for d in resp.json["destinations"]]
+    assert names == ["Pashupatinath Temple", "Bhaktapur Durbar Square", "Pokhara Lakeside"]
+
+    resp = client.get("/nearby?lat=28.2&lon=83.98&km=5")
+    assert [d["name"] for d in resp.json["destinations"]] == ["Pokhara Lakeside"]
+    assert client.get("/nearby?lat=200&lon=0").status_code == 400
+    for km in ("nan", "inf", "-5", "0"):
+        assert client.get(f"/nearby?lat=28.2&lon=83.98&km={km}").status_code == 400
+
+
+def test_index_follows_moves_and_rebuild(app):
+    dests = _seed()
+    pokhara = dests["Pokhara Lakeside"]
+    pokhara.latitude, pokhara.longitude = 27.70, 85.31
+    db.session.commit()
+    assert "Pokhara Lakeside" in [d.name for d, _ in geo.nearby(27.7046, 85.3076, 5)]
+
+    db.session.execute(db.text(f"DELETE FROM {geo.RTREE_TABLE}"))
+    db.session.commit()
+    assert geo.nearby(27.7046, 85.3076, 5) == []
+    assert geo.rebuild_index() == 4
+    assert len(geo.nearby(27.7046, 85.3076, 5)) == 3
@@ -0,0 +1,86 @@
+import io
+import os
+
+import pytest
+from PIL import Image
+
+from app import db
+from models import Destination, DestinationImage
+import images
+import jobs
+
+
+@pytest.fixture
+def upload_folder(app, tmp_path):
+    previous = app.config["UPLOAD_FOLDER"]
+    app.config["UPLOAD_FOLDER"] = str(tmp_path)
+    yield tmp_path
+    app.config["UPLOAD_FOLDER"] = previous
+
+
+def _jpeg(width=1000, height=600, color=(200, 120, 40)):
+    buf = io.BytesIO()
+    Image.new("RGB", (width, height), color).save(buf, "JPEG")
+    return buf.getvalue()
+
+
+def test_process_file_builds_width_ladder(tmp_path):
+    path = tmp_path / "photo.jpg"
+    path.write_bytes(_jpeg(1000, 600))
+
+    variants = images.process_file(str(path))
+    widths = sorted({v["width"] for v in variants})
+    assert widths == [320, 640, 960, 1000]
+    assert {v["format"] for v in variants} == set(images.formats())
+    for v in variants:
+        assert (tmp_path / images.VARIANT_DIR / v["filename"]).exists()
+
+
+def test_upload_and_delete(app, client, login, upload_folder):
+    login(is_admin=True)
+    dest = Destination(name="Pokhara", description="...")
+    db.session.add(dest)
+    db.session.commit()
+
+    data = _jpeg()
+    resp = client.post(f"/admin/destinations/{dest.id}/images",
+                       data={"file": (io.BytesIO(data), "photo.jpg")})
+    assert resp.status_code == 302
+
+    img = DestinationImage.query.one()
+    assert img.filename == images.content_hash(data) + ".jpg"
+    assert (upload_folder / img.filename).exists()
+    assert not img.variants  # encoding is left to the worker
+
+    assert jobs.run_pending() == 1
+    db.session.refresh(img)
+    assert img.variants
+
+    html = client.get(f"/destinations/{dest.id}").get_data(as_text=True)
+    assert 'type="image/webp"' in html and "320w" in html
+
+    variant_paths = [upload_folder / images.VARIANT_DIR / v.filename for v in img.variants]
+    client.post(f"/admin/destinations/{dest.id}/images/{img.id}/delete")
+    assert DestinationImage.query.count() == 0
+    assert (upload_folder / img.filename).exists()
+
+    assert jobs.run_pending() == 1
+    assert not (upload_folder / img.filename).exists()
+    assert not any(p.exists() for p in variant_paths)
+
+
+def test_reprocess_all(app, upload_folder):
+    (upload_folder / "kathmandu.jpg").write_bytes(_jpeg(400, 300))
+    dest = Destination(name="Kathmandu", description="...")
+    db.session.add(dest)
+    db.session.flush()
+    db.session.add_all([
+        DestinationImage(destination_id=dest.id, filename="kathmandu.jpg"),
+        DestinationImage(destination_id=dest.id, filename="missing.jpg"),
+    ])
+    db.session.commit()
+
+    assert images.reprocess_all(str(upload_folder), workers=2) == (1, 1)
+    img = DestinationImage.query.filter_by(filename="kathmandu.jpg").one()
+    assert sorted({v.width for v in img.variants}) == [320, 400]
+    assert os.listdir(upload_folder / images.VARIANT_DIR)
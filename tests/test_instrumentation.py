@@ -0,0 +1,62 @@
+import time
+
+from app import db
+from models import Destination
+import instrumentation
+
+
+def test_server_timing_and_metrics(app, client):
+    db.session.add(Destination(name="Gorkha", description="..."))
+    db.session.commit()
+
+    resp = client.get("/destinations")
+    timing = resp.headers["Server-Timing"]
+    assert timing.startswith("app;dur=") and "db;dur=" in timing and "tpl;dur=" in timing
+    assert f'desc="{resp.headers["X-Query-Count"]} queries"' in timing
+
+    body = client.get("/metrics").text
+    assert 'yatra_http_requests_total{endpoint="destinations",method="GET",status="200"}' in body
+    assert 'yatra_http_request_duration_seconds_bucket{endpoint="destinations",le="+Inf"}' in body
+    assert "# TYPE yatra_sql_queries_total counter" in body
+    assert "yatra_page_cache_misses_total" in body
+
+    app.config["METRICS_TOKEN"] = "s3cret"
+    try:
+        assert client.get("/metrics").status_code == 401
+        assert client.get("/metrics", headers={"Authorization": "Bearer s3cret"}).status_code == 200
+    finally:
+        app.config["METRICS_TOKEN"] = None
+
+
+def test_histogram_buckets_are_cumulative():
+    metrics = instrumentation.Metrics(buckets=(0.1, 1.0))
+    for seconds in (0.05, 0.5, 5.0):
+        metrics.observe("x", "GET", 200, seconds, 1, 0.01, 0.0, 10)
+    text = metrics.render()
+    assert 'yatra_http_request_duration_seconds_bucket{endpoint="x",le="0.1"} 1' in text
+    assert 'yatra_http_request_duration_seconds_bucket{endpoint="x",le="1.0"} 2' in text
+    assert 'yatra_http_request_duration_seconds_bucket{endpoint="x",le="+Inf"} 3' in text
+    assert 'yatra_response_bytes_total{endpoint="x"} 30' in text
+
+
+def test_profiling_is_admin_only(app, client, login, monkeypatch):
+    view = app.view_functions["destinations"]
+
+    def slow_view(*args, **kwargs):
+        time.sleep(0.02)  # long enough for the sampler to see it
+        return view(*args, **kwargs)
+
+    monkeypatch.setitem(app.view_functions, "destinations", slow_view)
+    resp = client.get("/destinations?_profile=stacks")
+    assert resp.mimetype == "text/html"
+
+    login(is_admin=True)
+    app.config["PROFILE_SAMPLE_INTERVAL"] = 0.0001
+    resp = client.get("/destinations?_profile=stacks")
+    assert resp.mimetype == "text/plain"
+    lines = resp.text.splitlines()
+    assert lines and all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+    assert any("full_dispatch_request" in line and "slow_view" in line for line in lines)
+
+    resp = client.get("/destinations?_profile=cprofile")
+    assert "cumulative" in resp.text and "function calls" in resp.text
@@ -0,0 +1,101 @@
+from werkzeug.security import generate_password_hash
+
+from app import db
+from instrumentation import count_queries
+from models import Destination, Itinerary, ItineraryItem, User
+
+
+def _itinerary(user):
+    dests = [Destination(name=n, region="Valley", description="...") for n in ("Patan", "Bhaktapur", "Nagarkot")]
+    db.session.add_all(dests)
+    it = Itinerary(user_id=user.id, title="Valley loop")
+    it.items = [ItineraryItem(day_number=1, destination=dests[0]), ItineraryItem(day_number=2, destination=dests[1])]
+    db.session.add(it)
+    db.session.commit()
+    return it, dests
+
+
+def _state(it_id):
+    db.session.expire_all()
+    it = db.session.get(Itinerary, it_id)
+    return it.version, sorted((i.day_number, i.destination.name, i.notes or "") for i in it.items)
+
+
+def test_batch_applies_in_one_transaction_and_returns_fragment(app, client, login):
+    it, (patan, bhaktapur, nagarkot) = _itinerary(login())
+    it_id, version = it.id, it.version
+    first, second = sorted(it.items, key=lambda i: i.day_number)
+    ops = [
+        {"op": "add", "destination_id": nagarkot.id, "day_number": 3, "notes": "Sunrise"},
+        {"op": "move", "item_id": second.id, "day_number": 1},
+        {"op": "notes", "item_id": second.id, "notes": "Durbar Square"},
+        {"op": "remove", "item_id": first.id},
+    ]
+
+    with count_queries() as counter:
+        resp = client.post(f"/itineraries/{it_id}/edit", json={"version": version, "ops": ops})
+    assert resp.status_code == 200
+    assert sum(s.startswith("UPDATE itineraries") for s in counter.statements) == 1
+    html = resp.get_data(as_text=True)
+    assert f'id="itinerary-{it_id}-days"' in html
+    assert "Nagarkot" in html and "Patan" not in html and "<html" not in html
+
+    new_version, items = _state(it_id)
+    assert items == [(1, "Bhaktapur", "Durbar Square"), (3, "Nagarkot", "Sunrise")]
+    assert new_version == version + 1  # one step per batch, not per operation
+    assert f'data-version="{new_version}"' in html
+
+
+def test_stale_version_and_bad_ops_change_nothing(app, client, login):
+    it, (patan, _, nagarkot) = _itinerary(login())
+    it_id, version = it.id, it.version
+    item_id = it.items[0].id
+    before = _state(it_id)
+
+    resp = client.post(f"/itineraries/{it_id}/edit",
+                       json={"version": version - 1, "ops": [{"op": "remove", "item_id": item_id}]})
+    assert resp.status_code == 409
+    assert f'data-version="{version}"' in resp.get_data(as_text=True)
+    assert _state(it_id) == before
+
+    resp = client.post(f"/itineraries/{it_id}/edit", json={"version": version, "ops": [
+        {"op": "add", "destination_id": nagarkot.id, "day_number": 3},
+        {"op": "remove", "item_id": item_id},
+        {"op": "notes", "item_id": item_id, "notes": "gone"},
+        {"op": "move", "item_id": item_id, "day_number": 0},
+        {"op": "teleport"},
+        {"op": ["add"]},
+    ]})
+    assert resp.status_code == 400
+    assert [e["index"] for e in resp.json["error"]["errors"]] == [2, 3, 4, 5]
+    assert _state(it_id) == before
+
+    assert client.post(f"/itineraries/{it_id}/edit", json={"ops": []}).status_code == 400
+
+
+def test_edit_is_owner_only_and_shared_with_api(app, client, login):
+    it, (_, _, nagarkot) = _itinerary(login())
+    it_id, version = it.id, it.version
+
+    resp = client.post(f"/api/v1/itineraries/{it_id}/edit",
+                       json={"version": version, "ops": [{"op": "add", "destination_id": nagarkot.id,
+                                                          "day_number": 3}]})
+    assert resp.status_code == 200
+    assert [i["destination_name"] for i in resp.json["data"]["items"]][-1] == "Nagarkot"
+
+    resp = client.post(f"/api/v1/itineraries/{it_id}/edit",
+                       json={"version": version, "ops": [{"op": {"kind": "add"}}]})
+    assert resp.status_code == 400
+    assert resp.json["error"]["errors"][0]["index"] == 0
+
+    resp = client.post(f"/api/v1/itineraries/{it_id}/edit",
+                       json={"version": version, "ops": [{"op": "remove", "item_id": 1}]})
+    assert resp.status_code == 409
+    assert resp.json["error"]["version"] == _state(it_id)[0]
+
+    other = User(name="other", email="other@example.com", password_hash=generate_password_hash("x"))
+    db.session.add(other)
+    db.session.commit()
+    theirs, _ = _itinerary(other)
+    resp = client.post(f"/itineraries/{theirs.id}/edit", json={"version": theirs.version, "ops": []})
+    assert resp.status_code == 403
@@ -0,0 +1,97 @@
+from datetime import datetime, timedelta
+
+from app import db
+from models import Job
+import jobs
+
+calls = []
+
+
+@jobs.task("test_flaky")
+def flaky(fail_times):
+    calls.append(fail_times)
+    if len(calls) <= fail_times:
+        raise RuntimeError("boom")
+
+
+def _enqueue(**payload):
+    calls.clear()
+    job = jobs.enqueue("test_flaky", **payload)
+    db.session.commit()
+    return job
+
+
+def _make_due(job):
+    job.run_at = datetime.utcnow()
+    db.session.commit()
+
+
+def _expire_lease(app, job):
+    db.session.refresh(job)
+    job.locked_at = datetime.utcnow() - timedelta(seconds=app.config["JOBS_LEASE_SECONDS"] + 1)
+    db.session.commit()
+
+
+def test_retry_with_backoff_then_succeed(app):
+    job = _enqueue(fail_times=1)
+
+    assert jobs.run_pending() == 1
+    db.session.refresh(job)
+    assert (job.status, job.attempts) == ("queued", 1)
+    assert "boom" in job.last_error
+    assert job.run_at > datetime.utcnow() + timedelta(seconds=3)
+    assert jobs.run_pending() == 0  # not due yet
+
+    _make_due(job)
+    assert jobs.run_pending() == 1
+    db.session.refresh(job)
+    assert (job.status, job.attempts, job.last_error) == ("done", 2, None)
+
+
+def test_gives_up_after_max_attempts(app):
+    job = _enqueue(fail_times=10)
+    job.max_attempts = 2
+    db.session.commit()
+
+    jobs.run_pending()
+    _make_due(job)
+    jobs.run_pending()
+    db.session.refresh(job)
+    assert (job.status, job.attempts) == ("failed", 2)
+    assert job.finished_at is not None
+
+
+def test_expired_lease_is_requeued(app):
+    job = _enqueue(fail_times=0)
+    assert jobs.claim("crashed-worker").id == job.id
+    assert jobs.claim("other-worker") is None
+
+    _expire_lease(app, job)
+    assert jobs.claim("other-worker") is None  # backing off
+    db.session.refresh(job)
+    assert (job.status, job.attempts) == ("queued", 1)
+    assert "Lease expired" in job.last_error
+
+    _make_due(job)
+    assert jobs.claim("other-worker").id == job.id
+
+
+def test_job_that_keeps_killing_its_worker_fails(app):
+    job = _enqueue(fail_times=0)
+    job.max_attempts = 1
+    db.session.commit()
+    jobs.claim("crashed-worker")
+
+    _expire_lease(app, job)
+    assert jobs.claim("other-worker") is None
+    db.session.refresh(job)
+    assert (job.status, job.attempts, job.locked_by) == ("failed", 1, None)
+    assert job.finished_at is not None
+
+
+def test_status_endpoint(app, client, login):
+    job = _enqueue(fail_times=0)
+    login(is_admin=True)
+    resp = client.get(f"/admin/jobs/{job.id}")
+    assert resp.json["status"] == "queued"
+    assert resp.json["kind"] == "test_flaky"
@@ -0,0 +1,53 @@
+from werkzeug.security import generate_password_hash
+
+from app import db
+from instrumentation import count_queries
+from models import Destination, DestinationImage, Itinerary, ItineraryItem, Review, User
+
+
+def _destinations(n):
+    dests = [Destination(name=f"Place {i}", region="Region", description="...") for i in range(n)]
+    db.session.add_all(dests)
+    db.session.commit()
+    return dests
+
+
+def test_itinerary_page_query_count_is_constant(app, client, login):
+    user = login()
+    dests = _destinations(12)
+    for t in range(3):
+        it = Itinerary(user_id=user.id, title=f"Trip {t}")
+        it.items = [ItineraryItem(day_number=i + 1, destination_id=d.id) for i, d in enumerate(dests)]
+        db.session.add(it)
+    db.session.commit()
+    db.session.expire_all()
+
+    with count_queries() as counter:
+        resp = client.get("/itineraries")
+    assert resp.status_code == 200
+    assert b"Place 11" in resp.data
+    # user, version stamps, itineraries, items + destinations, dropdown destinations
+    assert counter.count <= 6, counter.statements
+    assert resp.headers["X-Query-Count"] == str(counter.count)
+
+
+def test_destination_detail_query_count_is_constant(app, client):
+    dest = _destinations(1)[0]
+    for i in range(10):
+        user = User(name=f"Reviewer {i}", email=f"r{i}@example.com",
+                    password_hash=generate_password_hash("x"))
+        db.session.add(user)
+        db.session.flush()
+        db.session.add(Review(user_id=user.id, destination_id=dest.id, rating=4, comment="ok"))
+    db.session.add_all(DestinationImage(destination_id=dest.id, filename=f"{i}.jpg") for i in range(3))
+    db.session.commit()
+    dest_id = dest.id
+    db.session.expire_all()
+
+    with count_queries() as counter:
+        resp = client.get(f"/destinations/{dest_id}")
+    assert resp.status_code == 200
+    assert b"Reviewer 9" in resp.data
+    # version stamp, destination, images, image variants, reviews joined to users,
+    # similar destinations
+    assert counter.count <= 6, counter.statements
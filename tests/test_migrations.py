@@ -0,0 +1,66 @@
+from app import db
+from models import Destination
+import migrations
+import search
+
+# The schema as it shipped before models.py grew version stamps, rating
+# aggregates and indexes.
+LEGACY_SCHEMA = """
+CREATE TABLE users (id INTEGER PRIMARY KEY AUTOINCREMENT, name VARCHAR(100) NOT NULL,
+    email VARCHAR(120) NOT NULL UNIQUE, password_hash VARCHAR(255) NOT NULL,
+    is_admin INTEGER DEFAULT 0, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
+CREATE TABLE destinations (id INTEGER PRIMARY KEY AUTOINCREMENT, name VARCHAR(150) NOT NULL,
+    region VARCHAR(100), category VARCHAR(100), description TEXT, latitude DECIMAL(9,6),
+    longitude DECIMAL(9,6), image_url VARCHAR(255), highlights TEXT);
+CREATE TABLE destination_images (id INTEGER PRIMARY KEY AUTOINCREMENT,
+    destination_id INTEGER NOT NULL, filename VARCHAR(255) NOT NULL, is_primary INTEGER DEFAULT 0);
+CREATE TABLE itineraries (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL,
+    title VARCHAR(150) NOT NULL, start_date DATE, end_date DATE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
+CREATE TABLE itinerary_items (id INTEGER PRIMARY KEY AUTOINCREMENT, itinerary_id INTEGER NOT NULL,
+    day_number INTEGER NOT NULL, destination_id INTEGER NOT NULL, notes TEXT);
+CREATE TABLE reviews (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL,
+    destination_id INTEGER NOT NULL, rating INTEGER, comment TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
+-- stands in for the single-column rating index that 0003 replaces
+CREATE INDEX ix_destinations_rating_avg ON destinations (name);
+INSERT INTO users (name, email, password_hash) VALUES ('A', 'a@example.com', 'x');
+INSERT INTO destinations (name, region, latitude, longitude) VALUES ('Rara Lake', 'Karnali', 29.52, 82.08);
+INSERT INTO reviews (user_id, destination_id, rating) VALUES (1, 1, 4), (1, 1, 2);
+"""
+
+
+def _reset(statements=""):
+    db.session.remove()
+    db.drop_all()
+    db.session.execute(db.text("DROP TABLE IF EXISTS schema_migrations"))
+    for statement in filter(str.strip, statements.split(";")):
+        db.session.execute(db.text(statement))
+    db.session.commit()
+
+
+def test_fresh_database_is_created_from_models(app):
+    _reset()
+    assert [m.version for m in migrations.upgrade()] == [m.version for m in migrations.MIGRATIONS]
+    assert migrations.drift() == []
+    assert migrations.pending() == []
+
+
+def test_legacy_database_is_upgraded_to_match_models(app):
+    _reset(LEGACY_SCHEMA)
+    assert "missing column destinations.rating_avg" in migrations.drift()
+
+    assert len(migrations.upgrade()) == len(migrations.MIGRATIONS)
+    assert migrations.drift() == []
+    assert migrations.upgrade() == []
+
+    rara = db.session.get(Destination, 1)
+    assert (rara.version, rara.rating_count, rara.rating_avg) == (1, 2, 3.0)
+    assert [d.name for d in search.search(Destination.query, "rara")] == ["Rara Lake"]
+
+
+def test_seed_db(app):
+    result = app.test_cli_runner().invoke(args=["seed-db"])
+    assert "Inserted 8, updated 0, skipped 0." in result.output
+    boudha = Destination.query.filter_by(name="Boudhanath Stupa").one()
+    assert [img.filename for img in boudha.images] == ["boudhanath.jpg"]
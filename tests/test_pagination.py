@@ -0,0 +1,68 @@
+import re
+from datetime import datetime, timedelta
+
+from app import db
+from models import Destination, Review
+
+
+def _seed():
+    regions = [None, "Bagmati", "Bagmati", "Gandaki", None, "Karnali", "Bagmati"]
+    db.session.add_all(
+        Destination(name=f"Spot {i}", region=r, description="...") for i, r in enumerate(regions)
+    )
+    db.session.commit()
+
+
+def _walk(client, url):
+    """Follow "next" links, returning every page's HTML."""
+    pages = []
+    while url:
+        resp = client.get(url)
+        assert resp.status_code == 200
+        html = resp.get_data(as_text=True)
+        pages.append(html)
+        match = re.search(r'href="([^"]*after=[^"]*)"', html)
+        url = match.group(1).replace("&amp;", "&") if match else None
+    return pages
+
+
+def test_destination_pages_cover_everything_in_order(app, client):
+    _seed()
+    pages = _walk(client, "/destinations?limit=2")
+    assert len(pages) == 4
+
+    seen = [name for html in pages for name in re.findall(r"Spot \d+", html)]
+    expected = [d.name for d in sorted(
+        Destination.query.all(), key=lambda d: (d.region is not None, d.region or "", d.name))]
+    assert seen == expected
+
+
+def test_review_pages_newest_first(app, client, login):
+    user = login()
+    dest = Destination(name="Chitwan", description="...")
+    db.session.add(dest)
+    db.session.flush()
+    start = datetime(2024, 1, 1)
+    db.session.add_all(
+        Review(user_id=user.id, destination_id=dest.id, rating=4,
+               comment=f"visit-{i}", created_at=start + timedelta(days=i // 2))
+        for i in range(5)
+    )
+    db.session.commit()
+
+    pages = _walk(client, f"/destinations/{dest.id}?limit=2")
+    seen = [c for html in pages for c in re.findall(r"visit-\d", html)]
+    assert seen == ["visit-4", "visit-3", "visit-2", "visit-1", "visit-0"]
+
+
+def test_streamed_listing(app, client):
+    _seed()
+    resp = client.get("/destinations?stream=1&limit=3")
+    assert resp.is_streamed
+    html = resp.get_data(as_text=True)
+    assert len(re.findall(r"Spot \d+", html)) == 3
+    assert "stream=1" in html and "after=" in html
+
+
+def test_invalid_cursor_is_a_bad_request(app, client):
+    assert client.get("/destinations?after=not-a-cursor").status_code == 400
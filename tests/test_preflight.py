@@ -0,0 +1,34 @@
+import os
+import subprocess
+import sys
+
+from jinja2 import FileSystemBytecodeCache
+
+import preflight
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_compile_templates_fills_bytecode_cache(app, tmp_path, monkeypatch):
+    monkeypatch.setattr(app.jinja_env, "bytecode_cache", FileSystemBytecodeCache(str(tmp_path)))
+    app.jinja_env.cache.clear()
+
+    count = preflight.compile_templates(app)
+
+    assert count == len(app.jinja_env.list_templates()) > 0
+    assert len(os.listdir(tmp_path)) == count
+
+
+def test_run_warms_paths(app):
+    steps = preflight.run(app, paths=["/", "/destinations"])
+
+    assert [name for name, _, _ in steps] == ["templates", "password hasher",
+                                              "GET /", "GET /destinations"]
+    assert [detail for name, detail, _ in steps if name.startswith("GET")] == [200, 200]
+
+
+def test_app_import_leaves_pillow_unloaded():
+    env = dict(os.environ, DATABASE_URL="sqlite://")
+    out = subprocess.run([sys.executable, "-c", "import sys, app; print('PIL' in sys.modules)"],
+                         cwd=PROJECT_ROOT, env=env, capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "False"
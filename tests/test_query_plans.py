@@ -0,0 +1,70 @@
+"""Hot pages must not fall back to full table scans."""
+import re
+
+from werkzeug.security import generate_password_hash
+
+from app import db
+from models import Destination, DestinationImage, Itinerary, ItineraryItem, Review, User
+import instrumentation
+
+# Pages that list every destination by design.
+WHOLE_TABLE = [
+    "SELECT destinations.id AS destinations_id, destinations.name AS destinations_name FROM destinations ORDER BY",
+    # Facets: the small lookup tables, and grouped counts over a covering index (test_facets.py)
+    "SELECT ? AS kind,",
+    "SELECT regions.id, regions.name FROM regions",
+    "SELECT categories.id, categories.name FROM categories",
+    "SELECT destinations.region_id AS destinations_region_id, destinations.category_id AS destinations_category_id, count(*)",
+]
+
+
+def _seed():
+    user = User(name="a", email="plans@example.com", password_hash=generate_password_hash("pw"))
+    dests = [Destination(name=f"Place {i:02d}", region=f"Region {i % 4}", description="...",
+                         latitude=27 + i / 50, longitude=85 + i / 50) for i in range(40)]
+    db.session.add_all([user, *dests])
+    db.session.commit()
+    for d in dests[:5]:
+        db.session.add(Review(user_id=user.id, destination_id=d.id, rating=4))
+        db.session.add(DestinationImage(destination_id=d.id, filename="x.jpg"))
+    it = Itinerary(user_id=user.id, title="Trip")
+    it.items = [ItineraryItem(day_number=1, destination_id=dests[0].id)]
+    db.session.add(it)
+    db.session.commit()
+    return dests[0].id, it.id
+
+
+def _offenders(statements, parameters):
+    offenders = []
+    for statement, params in zip(statements, parameters):
+        flat = " ".join(statement.split())
+        if not flat.upper().startswith("SELECT") or flat.startswith(tuple(WHOLE_TABLE)):
+            continue
+        plan = [row[3] for row in db.session.connection().exec_driver_sql(
+            "EXPLAIN QUERY PLAN " + statement, params)]
+        full_scan = [p for p in plan if p.startswith("SCAN ") and "VIRTUAL TABLE" not in p]
+        sorted_all = any("TEMP B-TREE" in p for p in plan)
+        # A scan is only fine when it walks rows in the wanted order and stops at LIMIT.
+        if full_scan and (not re.search(r"\bLIMIT\b", statement) or sorted_all):
+            offenders.append((flat[:160], plan))
+    return offenders
+
+
+def test_hot_queries_use_indexes(app, client):
+    dest_id, it_id = _seed()
+    with instrumentation.count_queries() as queries:
+        for url in ["/", "/destinations", "/destinations?sort=rating", f"/destinations/{dest_id}",
+                    f"/destinations/{dest_id}/nearby", "/destinations?region=Region+1", "/api/v1/destinations?sort=rating",
+                    f"/api/v1/destinations/{dest_id}?include=reviews"]:
+            resp = client.get(url)
+            assert resp.status_code == 200
+        for sort in ("region", "rating"):
+            page = client.get(f"/destinations?sort={sort}&limit=5").text
+            next_url = re.search(r'href="(/destinations\?[^"]*after=[^"]+)"', page).group(1)
+            assert client.get(next_url.replace("&amp;", "&")).status_code == 200
+        client.post("/login", data={"email": "plans@example.com", "password": "pw"})
+        assert client.get("/itineraries").status_code == 200
+        assert client.get(f"/itineraries/{it_id}/optimize").status_code == 200
+        assert client.get("/api/v1/itineraries").status_code == 200
+
+    assert _offenders(queries.statements, queries.parameters) == []
@@ -0,0 +1,56 @@
+import pytest
+
+import ratelimit
+from app import db
+from models import Destination
+
+
+def test_limit_parsing():
+    limit = ratelimit.Limit.parse("30/minute")
+    assert (limit.capacity, limit.period, limit.rate) == (30, 60, 0.5)
+    assert ratelimit.Limit.parse("2/hours").period == 3600
+    with pytest.raises(ValueError):
+        ratelimit.Limit.parse("lots")
+
+
+@pytest.mark.parametrize("kind", ["memory", "sql"])
+def test_token_bucket(app, kind):
+    store = ratelimit.make_store({"RATELIMIT_STORAGE": kind}, db.engine)
+    limit = ratelimit.Limit.parse("2/minute")  # a token every 30 s
+    assert store.hit("k", limit, now=1000) == (True, 0)
+    assert store.hit("k", limit, now=1000) == (True, 0)
+    assert store.hit("k", limit, now=1010) == (False, 20)
+    assert store.hit("other", limit, now=1010) == (True, 0)
+    assert store.hit("k", limit, now=1031) == (True, 0)
+    assert store.hit("k", limit, now=1031)[0] is False
+    # Refills stop at capacity.
+    assert store.hit("k", limit, now=5000) == (True, 0)
+    assert store.hit("k", limit, now=5000) == (True, 0)
+    assert store.hit("k", limit, now=5000)[0] is False
+    store.reset()
+
+
+def test_login_flood_gets_429(app, client, monkeypatch):
+    monkeypatch.setitem(app.config["RATE_LIMITS"], "login", "3/minute")
+    form = {"email": "nobody@example.com", "password": "x"}
+    assert [client.post("/login", data=form).status_code for _ in range(3)] == [200, 200, 200]
+    resp = client.post("/login", data=form)
+    assert resp.status_code == 429
+    assert 1 <= int(resp.headers["Retry-After"]) <= 20
+    # Reading the page is not limited.
+    assert client.get("/login").status_code == 200
+
+    resp = client.post("/api/v1/login", json=form)
+    assert resp.status_code == 429
+    assert resp.json["error"]["status"] == 429 and resp.headers["Retry-After"]
+
+
+def test_reviews_are_limited_per_user(app, client, login, monkeypatch):
+    monkeypatch.setitem(app.config["RATE_LIMITS"], "review", "2/minute")
+    db.session.add(Destination(name="Gorkha", description="..."))
+    db.session.commit()
+    login()
+    codes = [client.post("/destinations/1", data={"rating": 5, "comment": "Great"}).status_code
+             for _ in range(3)]
+    assert codes == [302, 302, 429]
+    assert Destination.query.one().rating_count == 2
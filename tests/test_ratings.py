@@ -0,0 +1,64 @@
+from app import db
+from models import Destination, Review
+import ratings
+
+
+def _destination():
+    dest = Destination(name="Pokhara", region="Gandaki")
+    db.session.add(dest)
+    db.session.commit()
+    return dest
+
+
+def test_review_post_and_delete_update_aggregate(app, client, login):
+    user = login()
+    dest = _destination()
+
+    client.post(f"/destinations/{dest.id}", data={"rating": "4", "comment": "Nice"})
+    client.post(f"/destinations/{dest.id}", data={"rating": "1", "comment": "Rainy"})
+    db.session.refresh(dest)
+    assert (dest.rating_count, dest.rating_sum, dest.rating_avg) == (2, 5, 2.5)
+    assert dest.rating_histogram == [1, 0, 0, 1, 0]
+
+    review = Review.query.filter_by(user_id=user.id, rating=1).one()
+    client.post(f"/reviews/{review.id}/delete")
+    db.session.refresh(dest)
+    assert (dest.rating_count, dest.rating_sum, dest.rating_avg) == (1, 4, 4.0)
+    assert dest.rating_histogram == [0, 0, 0, 1, 0]
+
+
+def test_reconcile_repairs_drift(app, login):
+    user = login()
+    dest = _destination()
+    db.session.add_all([
+        Review(user_id=user.id, destination_id=dest.id, rating=5),
+        Review(user_id=user.id, destination_id=dest.id, rating=3),
+    ])
+    db.session.commit()
+    db.session.execute(
+        db.update(Destination).values(rating_count=0, rating_sum=0, rating_avg=None, stars_5=0)
+    )
+    db.session.commit()
+
+    assert ratings.reconcile() == 1
+    db.session.refresh(dest)
+    assert (dest.rating_count, dest.rating_avg) == (2, 4.0)
+    assert dest.rating_histogram == [0, 0, 1, 0, 1]
+    assert ratings.reconcile() == 0
+
+
+def test_sort_by_rating(app, client, login):
+    user = login()
+    low = Destination(name="Low", region="A", description="...")
+    high = Destination(name="High", region="B", description="...")
+    unrated = Destination(name="Unrated", region="C", description="...")
+    db.session.add_all([low, high, unrated])
+    db.session.flush()
+    db.session.add_all([
+        Review(user_id=user.id, destination_id=low.id, rating=2),
+        Review(user_id=user.id, destination_id=high.id, rating=5),
+    ])
+    db.session.commit()
+
+    html = client.get("/destinations?sort=rating").get_data(as_text=True)
+    assert html.index("High") < html.index("Low") < html.index("Unrated")
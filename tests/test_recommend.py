@@ -0,0 +1,124 @@
+import numpy as np
+from werkzeug.security import generate_password_hash
+
+import recommend
+from app import db
+from models import Destination, DestinationNeighbour, Itinerary, ItineraryItem, Review, User
+
+
+def _dense_neighbours(users, items, weights, min_support, top_k):
+    user_index = {u: i for i, u in enumerate(np.unique(users))}
+    matrix = np.zeros((len(user_index), items.max() + 1))
+    for u, d, w in zip(users, items, weights):
+        matrix[user_index[u], d] = w
+    dots = matrix.T @ matrix
+    support = (matrix > 0).T.astype(int) @ (matrix > 0).astype(int)
+    norms = np.sqrt(np.diag(dots))
+    expected = []
+    for a in range(matrix.shape[1]):
+        candidates = [(-dots[a, b] / (norms[a] * norms[b]), b) for b in range(matrix.shape[1])
+                      if b != a and support[a, b] >= min_support]
+        expected += [(a, b, -s) for s, b in sorted(candidates)[:top_k]]
+    return expected
+
+
+def test_similarities_match_dense_cosine(monkeypatch):
+    rng = np.random.default_rng(3)
+    keys = np.unique(rng.integers(0, 40, 300) * 30 + rng.integers(1, 30, 300))
+    users, items = keys // 30, keys % 30
+    weights = rng.uniform(0.1, 2.0, len(keys))
+    monkeypatch.setattr(recommend, "PAIR_CHUNK", 50)  # force many chunks
+
+    dest, neighbour, score, support = recommend.similarities(users, items, weights, min_support=2, top_k=3)
+
+    expected = _dense_neighbours(users, items, weights, 2, 3)
+    assert list(zip(dest.tolist(), neighbour.tolist())) == [(a, b) for a, b, _ in expected]
+    assert np.allclose(score, [s for _, _, s in expected])
+
+    rows = np.array([4, 7])
+    some = recommend.similarities(users, items, weights, rows, min_support=2, top_k=3)
+    assert list(zip(some[0].tolist(), some[1].tolist())) == [(a, b) for a, b, _ in expected if a in (4, 7)]
+
+
+def _traveller(name, plans=(), ratings=None):
+    user = User(name=name, email=f"{name}@example.com", password_hash=generate_password_hash("x"))
+    db.session.add(user)
+    db.session.flush()
+    if plans:
+        it = Itinerary(user_id=user.id, title=f"{name}'s trip")
+        it.items = [ItineraryItem(day_number=i + 1, destination_id=d.id) for i, d in enumerate(plans)]
+        db.session.add(it)
+    for dest, rating in (ratings or {}).items():
+        db.session.add(Review(user_id=user.id, destination_id=dest.id, rating=rating))
+    db.session.commit()
+    return user
+
+
+def test_refresh_stores_neighbours_and_updates_incrementally(app, client):
+    lake, hill, temple, jungle = dests = [Destination(name=n, region="R", description="...")
+                                          for n in ("Lake", "Hill", "Temple", "Jungle")]
+    db.session.add_all(dests)
+    db.session.commit()
+    _traveller("a", plans=[lake, hill, temple])
+    _traveller("b", plans=[lake, hill], ratings={temple: 1})
+    _traveller("c", ratings={lake: 5, hill: 4})
+    lake_version = lake.version
+
+    assert recommend.refresh(full=True) == (2, 2)
+    rows = DestinationNeighbour.query.order_by(DestinationNeighbour.destination_id).all()
+    assert [(r.destination_id, r.neighbour_id, r.support) for r in rows] == [
+        (lake.id, hill.id, 3), (hill.id, lake.id, 3)]
+    assert db.session.get(Destination, lake.id).version == lake_version + 1
+
+    page = client.get(f"/destinations/{lake.id}")
+    assert b"Travellers also visited" in page.data and b"Hill" in page.data
+    assert b"Travellers also visited" not in client.get(f"/destinations/{jungle.id}").data
+
+    assert recommend.refresh() == (0, 0)  # nothing changed since
+
+    _traveller("d", plans=[temple, jungle])
+    _traveller("e", plans=[temple, jungle, lake])
+    changed, _ = recommend.refresh()
+    assert changed == 3  # lake gains temple; temple and jungle gain each other
+    stored = {(r.destination_id, r.neighbour_id) for r in DestinationNeighbour.query}
+    assert {(temple.id, jungle.id), (jungle.id, temple.id), (lake.id, temple.id)} <= stored
+    assert (temple.id, lake.id) in stored
+
+
+def test_runs_that_write_nothing_still_move_the_checkpoint(app, monkeypatch):
+    lake, hill = dests = [Destination(name=n, region="R", description="...") for n in ("Lake", "Hill")]
+    db.session.add_all(dests)
+    db.session.commit()
+    recommend.refresh(full=True)
+    _traveller("a", plans=[lake, hill])  # below RECOMMEND_MIN_SUPPORT: no rows
+
+    computed = []
+    real = recommend.similarities
+
+    def similarities(*args, **kwargs):
+        computed.append(args[3])  # rows
+        return real(*args, **kwargs)
+
+    monkeypatch.setattr(recommend, "similarities", similarities)
+    assert recommend.refresh() == (0, 0)
+    assert recommend.refresh() == (0, 0)
+    assert len(computed) == 1  # the second run found nothing new
+
+
+def test_deleting_a_destination_drops_its_neighbour_rows(app):
+    lake, hill, temple = dests = [Destination(name=n, region="R", description="...")
+                                  for n in ("Lake", "Hill", "Temple")]
+    db.session.add_all(dests)
+    db.session.commit()
+    db.session.add_all([
+        DestinationNeighbour(destination_id=lake.id, rank=0, neighbour_id=hill.id, score=0.9, support=2),
+        DestinationNeighbour(destination_id=lake.id, rank=1, neighbour_id=temple.id, score=0.5, support=2),
+        DestinationNeighbour(destination_id=hill.id, rank=0, neighbour_id=lake.id, score=0.9, support=2),
+    ])
+    db.session.commit()
+    lake_version = lake.version
+
+    db.session.delete(hill)
+    db.session.commit()
+    assert [(r.destination_id, r.neighbour_id) for r in DestinationNeighbour.query] == [(lake.id, temple.id)]
+    assert db.session.get(Destination, lake.id).version == lake_version + 1
@@ -0,0 +1,69 @@
+import numpy as np
+
+from app import db
+from models import Destination, Itinerary, ItineraryItem
+import geo
+import routing
+
+
+def test_two_opt_untangles_and_keeps_start():
+    # Points along a line, listed out of order; the best open route from the
+    # first point simply walks the line.
+    lons = [0.0, 3.0, 1.0, 4.0, 2.0, 5.0]
+    points = [(0.0, lon) for lon in lons]
+    order = routing.solve(points)
+    assert order[0] == 0
+    assert [lons[i] for i in order] == sorted(lons)
+
+
+def test_solution_is_permutation_no_worse_than_nearest_neighbour():
+    rng = np.random.default_rng(7)
+    points = list(zip(rng.uniform(26, 30, 120).tolist(), rng.uniform(80, 88, 120).tolist()))
+    matrix = geo.pairwise_km(*zip(*points))
+    order = routing.solve(points, time_budget=2)
+    assert sorted(order) == list(range(120)) and order[0] == 0
+    assert routing.route_length(matrix, order) <= routing.route_length(
+        matrix, routing.nearest_neighbour(matrix)) + 1e-6
+    assert np.allclose(matrix, matrix.T)
+
+
+def _itinerary(user):
+    stops = [("Kathmandu", 27.70, 85.31), ("Pokhara", 28.21, 83.99),
+             ("Bhaktapur", 27.67, 85.43), ("Bandipur", 27.94, 84.41),
+             ("Nowhere", None, None)]
+    dests = [Destination(name=n, latitude=lat, longitude=lon, description="...")
+             for n, lat, lon in stops]
+    it = Itinerary(user_id=user.id, title="Loop")
+    it.items = [ItineraryItem(day_number=day, destination=d)
+                for day, d in zip([1, 2, 2, 3, 4], dests)]
+    db.session.add(it)
+    db.session.commit()
+    return it
+
+
+def test_propose_keeps_day_slots(app, login):
+    it = _itinerary(login())
+    proposal = routing.propose(it)
+    names = [item.destination.name for item, _ in proposal.assignments]
+    assert names == ["Kathmandu", "Bhaktapur", "Bandipur", "Pokhara", "Nowhere"]
+    assert [day for _, day in proposal.assignments] == [1, 2, 2, 3, 4]
+    assert proposal.km_after < proposal.km_before
+
+
+def test_optimize_endpoints(app, client, login):
+    it = _itinerary(login())
+    it_id = it.id
+    resp = client.get(f"/itineraries/{it_id}/optimize")
+    assert resp.status_code == 200
+    assert resp.json["km_after"] < resp.json["km_before"]
+    assert [i["destination"] for i in resp.json["items"]][:2] == ["Kathmandu", "Bhaktapur"]
+
+    resp = client.post(f"/itineraries/{it_id}/optimize")
+    assert resp.status_code == 302
+    db.session.expire_all()
+    days = {i.destination.name: i.day_number for i in db.session.get(Itinerary, it_id).items}
+    assert days == {"Kathmandu": 1, "Bhaktapur": 2, "Bandipur": 2, "Pokhara": 3, "Nowhere": 4}
+
+    client.get("/logout")
+    login(email="other@example.com")
+    assert client.get(f"/itineraries/{it_id}/optimize").status_code == 403
@@ -0,0 +1,53 @@
+from app import db
+from models import Destination
+import search
+
+
+def _add(**fields):
+    dest = Destination(**fields)
+    db.session.add(dest)
+    db.session.commit()
+    return dest
+
+
+def test_prefix_search_ranks_name_matches_first(app, client):
+    _add(name="Phewa Lake", region="Gandaki", description="Boating near Pokhara")
+    _add(name="Pokhara Lakeside", region="Gandaki", description="Lakeside town")
+    _add(name="Chitwan", region="Bagmati", description="Jungle safari")
+
+    results = search.search(Destination.query, "pokh").all()
+    assert [d.name for d in results] == ["Pokhara Lakeside", "Phewa Lake"]
+
+    resp = client.get("/destinations?q=pokh")
+    assert resp.status_code == 200
+    assert b"Pokhara Lakeside" in resp.data
+    assert b"Chitwan" not in resp.data
+
+
+def test_index_follows_updates_and_deletes(app):
+    dest = _add(name="Bhaktapur", region="Kathmandu Valley", description="Pottery square")
+    assert search.search(Destination.query, "pottery").count() == 1
+
+    dest.description = "Nyatapola Temple"
+    db.session.commit()
+    assert search.search(Destination.query, "pottery").count() == 0
+    assert search.search(Destination.query, "nyata").count() == 1
+
+    db.session.delete(dest)
+    db.session.commit()
+    assert search.search(Destination.query, "nyata").count() == 0
+
+
+def test_rebuild_index(app):
+    _add(name="Lumbini", region="Lumbini Province", description="Birthplace of Buddha")
+    db.session.execute(db.text(f"DELETE FROM {search.FTS_TABLE}"))
+    db.session.commit()
+    assert search.search(Destination.query, "buddha").count() == 0
+
+    assert search.rebuild_index() == 1
+    assert search.search(Destination.query, "buddha").count() == 1
+
+
+def test_punctuation_only_query_matches_nothing(app):
+    _add(name="Langtang")
+    assert search.search(Destination.query, "***").count() == 0
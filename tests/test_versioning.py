@@ -0,0 +1,81 @@
+from app import db
+from instrumentation import count_queries
+from models import Destination, Itinerary, ItineraryItem, Review
+
+
+def _destination(name="Pokhara"):
+    dest = Destination(name=name, region="Gandaki", description="...")
+    db.session.add(dest)
+    db.session.commit()
+    return dest
+
+
+def test_list_revalidation_is_answered_from_the_stamp(app, client):
+    _destination()
+    first = client.get("/destinations")
+    etag = first.headers["ETag"]
+    assert first.headers["Last-Modified"]
+
+    with count_queries() as counter:
+        resp = client.get("/destinations", headers={"If-None-Match": etag})
+    assert resp.status_code == 304
+    assert resp.data == b""
+    assert counter.count == 1
+
+    _destination("Chitwan")
+    resp = client.get("/destinations", headers={"If-None-Match": etag})
+    assert resp.status_code == 200
+    assert resp.headers["ETag"] != etag
+
+
+def test_review_changes_detail_etag(app, client, login):
+    dest = _destination()
+    etag = client.get(f"/destinations/{dest.id}").headers["ETag"]
+    assert client.get(f"/destinations/{dest.id}",
+                      headers={"If-None-Match": etag}).status_code == 304
+
+    user = login()
+    db.session.add(Review(user_id=user.id, destination_id=dest.id, rating=4))
+    db.session.commit()
+    client.get("/logout")
+    client.get("/")  # consume the flash
+
+    assert client.get(f"/destinations/{dest.id}",
+                      headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_itinerary_etag_follows_items_and_user(app, client, login):
+    dest = _destination()
+    user = login()
+    it = Itinerary(user_id=user.id, title="Trek")
+    db.session.add(it)
+    db.session.commit()
+    client.get("/")  # consume the login flash
+
+    etag = client.get("/itineraries").headers["ETag"]
+    assert client.get("/itineraries", headers={"If-None-Match": etag}).status_code == 304
+
+    db.session.add(ItineraryItem(itinerary_id=it.id, day_number=1, destination_id=dest.id))
+    db.session.commit()
+    resp = client.get("/itineraries", headers={"If-None-Match": etag})
+    assert resp.status_code == 200
+    assert resp.headers["Cache-Control"] == "private, no-cache"
+
+
+def test_if_modified_since(app, client):
+    dest = _destination()
+    resp = client.get(f"/destinations/{dest.id}")
+    since = resp.headers["Last-Modified"]
+    assert client.get(f"/destinations/{dest.id}",
+                      headers={"If-Modified-Since": since}).status_code == 304
+
+
+def test_unchanged_destination_keeps_its_version(app):
+    dest = _destination()
+    version = dest.version
+    dest.name = dest.name
+    db.session.commit()
+    assert dest.version == version
+    dest.name = "Pokhara Lakeside"
+    db.session.commit()
+    assert dest.version == version + 1
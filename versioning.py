@@ -0,0 +1,200 @@
+"""Data version stamps and HTTP conditional requests.
+
+Three kinds of stamp are maintained from mapper events, inside the flush that
+makes the change:
+
+* `table_versions` holds a counter per table, bumped on every insert, update
+  or delete (a child change also bumps its parent's table);
+* `Destination.version` is bumped when the destination, one of its images
+  (or their variants) or one of its reviews changes;
+* `Itinerary.version` is bumped when the itinerary or one of its items changes.
+
+`conditional()` turns a stamp into a strong ETag plus Last-Modified and
+answers matching revalidations with 304 before the view runs.
+"""
+import hashlib
+import os
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import current_app, make_response, request, session
+from flask_login import current_user
+from sqlalchemy import event, func, insert, select, update
+from sqlalchemy.orm import object_session
+
+from models import (db, Destination, DestinationImage, ImageVariant, Itinerary,
+                    ItineraryItem, Review, TableVersion)
+
+_versions = TableVersion.__table__
+
+
+@event.listens_for(_versions, "after_create")
+def _seed_versions(table, connection, **kw):
+    names = [Destination.__tablename__, Itinerary.__tablename__]
+    connection.execute(insert(table), [{"name": n, "version": 0} for n in names])
+
+
+def bump_table(connection, name, now=None):
+    now = now or datetime.utcnow()
+    result = connection.execute(
+        update(_versions)
+        .where(_versions.c.name == name)
+        .values(version=_versions.c.version + 1, updated_at=now)
+    )
+    if result.rowcount == 0:
+        connection.execute(insert(_versions).values(name=name, version=1, updated_at=now))
+
+
+def _bump_row(connection, model, row_id):
+    table = model.__table__
+    connection.execute(
+        update(table)
+        .where(table.c.id == row_id)
+        .values(version=table.c.version + 1, updated_at=datetime.utcnow())
+    )
+
+
+def bump_rows(connection, model, row_ids):
+    """Bump `row_ids` and their table after a Core-level change that alters their pages."""
+    table = model.__table__
+    connection.execute(
+        update(table)
+        .where(table.c.id.in_(row_ids))
+        .values(version=table.c.version + 1, updated_at=datetime.utcnow())
+    )
+    bump_table(connection, model.__tablename__)
+
+
+def _track_parent(child, model, parent_id):
+    """Changing a `child` row bumps the `model` row `parent_id(child)` points at."""
+    def touch(mapper, connection, target):
+        _bump_row(connection, model, parent_id(target))
+        bump_table(connection, model.__tablename__)
+
+    for name in ("after_insert", "after_update", "after_delete"):
+        event.listen(child, name, touch)
+
+
+def _track_self(model):
+    def before_update(mapper, connection, target):
+        if not object_session(target).is_modified(target, include_collections=False):
+            return
+        # SQL expression, not `target.version + 1`: child events may have
+        # bumped the row since it was loaded.
+        target.version = model.version + 1
+
+    def touch(mapper, connection, target):
+        bump_table(connection, model.__tablename__)
+
+    event.listen(model, "before_update", before_update)
+    for name in ("after_insert", "after_update", "after_delete"):
+        event.listen(model, name, touch)
+
+
+_track_self(Destination)
+_track_self(Itinerary)
+_track_parent(Review, Destination, lambda review: review.destination_id)
+_track_parent(DestinationImage, Destination, lambda img: img.destination_id)
+_track_parent(ImageVariant, Destination, lambda variant: (
+    select(DestinationImage.destination_id)
+    .where(DestinationImage.id == variant.image_id)
+    .scalar_subquery()
+))
+_track_parent(ItineraryItem, Itinerary, lambda item: item.itinerary_id)
+
+
+# -- stamps ---------------------------------------------------------------
+
+def table_stamp(*names):
+    rows = db.session.execute(
+        select(TableVersion.name, TableVersion.version, TableVersion.updated_at)
+        .where(TableVersion.name.in_(names))
+    ).all()
+    token = tuple(sorted((name, version) for name, version, _ in rows))
+    modified = max((row.updated_at for row in rows if row.updated_at), default=None)
+    return token, modified
+
+
+def destination_list_stamp():
+    return table_stamp(Destination.__tablename__)
+
+
+def destination_stamp(dest_id):
+    row = db.session.execute(
+        select(Destination.version, Destination.updated_at).where(Destination.id == dest_id)
+    ).first()
+    if row is None:
+        return None
+    return (dest_id, row.version), row.updated_at
+
+
+def user_itineraries_stamp():
+    count, total, modified = db.session.execute(
+        select(func.count(Itinerary.id), func.sum(Itinerary.version), func.max(Itinerary.updated_at))
+        .where(Itinerary.user_id == current_user.id)
+    ).one()
+    # The page also lists every destination in the "add a day" dropdowns.
+    dest_token, dest_modified = destination_list_stamp()
+    modified = max(filter(None, [modified, dest_modified]), default=None)
+    return (count, total, dest_token), modified
+
+
+# -- conditional responses ---------------------------------------------------
+
+def _template_fingerprint(app):
+    """Changes whenever a deploy changes a template or an asset, so old ETags stop matching."""
+    salt = app.config.get("ETAG_SALT")
+    if salt:
+        return salt
+    digest = hashlib.sha1()
+    digest.update(repr(sorted(app.extensions.get("asset_manifest", {}).items())).encode())
+    for root, _, files in sorted(os.walk(os.path.join(app.root_path, app.template_folder))):
+        for name in sorted(files):
+            with open(os.path.join(root, name), "rb") as f:
+                digest.update(f.read())
+    salt = app.config["ETAG_SALT"] = digest.hexdigest()
+    return salt
+
+
+def _http_date(value):
+    return value.replace(microsecond=0, tzinfo=timezone.utc) if value else None
+
+
+def conditional(stamp):
+    """Answer If-None-Match / If-Modified-Since from `stamp(**view_args)`.
+
+    `stamp` returns `(token, last_modified)` or None when the view should
+    just run (e.g. to produce its 404).
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method not in ("GET", "HEAD") or "_flashes" in session:
+                return view(*args, **kwargs)
+            version = stamp(**kwargs)
+            if version is None:
+                return view(*args, **kwargs)
+
+            token, modified = version
+            viewer = (current_user.get_id(), getattr(current_user, "is_admin", False))
+            identity = repr((_template_fingerprint(current_app), request.endpoint, viewer, token))
+            etag = hashlib.sha1(identity.encode()).hexdigest()
+            modified = _http_date(modified)
+
+            if request.if_none_match:
+                fresh = request.if_none_match.contains(etag)
+            else:
+                since = request.if_modified_since
+                fresh = bool(since and modified and modified <= since)
+
+            response = make_response("", 304) if fresh else make_response(view(*args, **kwargs))
+            if response.status_code in (200, 304):
+                response.set_etag(etag)
+                if modified:
+                    response.last_modified = modified
+                visibility = "private" if current_user.is_authenticated else "public"
+                response.headers["Cache-Control"] = f"{visibility}, no-cache"
+                response.vary.add("Cookie")
+            return response
+        return wrapper
+    return decorator